@@ -0,0 +1,62 @@
+"""
+Compare loading the scrape log as CSV (csv.DictReader plus per-row parsing) with loading it as typed Parquet and Arrow IPC
+
+    python benchmarks/bench_columnar_load.py --copies 100
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from duns_bradstreet_scraper.columnar import DUNS_RESULT_SCHEMA, read_table, write_records
+from duns_bradstreet_scraper.reconciliation import parse_bool, parse_timestamp
+
+
+def load_csv(path: str) -> list[dict]:
+    with open(path, "r") as infile:
+        records = list(csv.DictReader(infile))
+    for record in records:
+        record["email_success"] = parse_bool(record["email_success"])
+        record["from_retry"] = parse_bool(record["from_retry"])
+        record["time_email_requested"] = parse_timestamp(record["time_email_requested"]) if record["time_email_requested"] else None
+    return records
+
+
+def best_of(repeats: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default="toy_outputs/duns_log_take_2.csv")
+    parser.add_argument("--copies", type=int, default=100, help="Concatenate this many copies of the log to get a bigger table")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.log, "r") as infile:
+        records = list(csv.DictReader(infile)) * args.copies
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "duns_log.csv")
+        with open(csv_path, "w", newline="") as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=records[0].keys())
+            writer.writeheader()
+            writer.writerows(records)
+        parquet_path = os.path.join(tmp_dir, "duns_log.parquet")
+        arrow_path = os.path.join(tmp_dir, "duns_log.arrow")
+        write_records(records, parquet_path, DUNS_RESULT_SCHEMA)
+        write_records(records, arrow_path, DUNS_RESULT_SCHEMA)
+
+        print(f"{len(records)} rows")
+        for label, func, path in [("csv + parsing", load_csv, csv_path), ("parquet", read_table, parquet_path), ("arrow ipc (mmap)", read_table, arrow_path)]:
+            print(f"{label:>18}: {best_of(args.repeats, func, path):.4f}s  ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
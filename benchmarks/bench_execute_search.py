@@ -0,0 +1,107 @@
+"""
+End-to-end benchmark for DBScraper.execute_search against the local D&B fixture server (no network needed)
+
+Reports searches per hour, seconds per search and seconds per result card, plus the per-phase latency table.
+Needs Chrome, same as a real scrape.
+
+    python benchmarks/bench_execute_search.py --searches 25 --search-latency 0.5
+"""
+import argparse
+import csv
+import json
+import logging
+import time
+
+from duns_bradstreet_scraper.duns_bradstreet_scraper import DBScraper, DNBServerException
+from duns_bradstreet_scraper.fixture_server import DNBFixtureServer, FixtureConfig
+from duns_bradstreet_scraper.instrumentation import PhaseTimer
+from duns_bradstreet_scraper.network_blocking import BlockList
+
+
+def load_search_terms(num_searches: int) -> list[tuple[str, str, str]]:
+    with open("toy_inputs/state_identifiers.csv", "r") as infile:
+        reader = csv.DictReader(infile)
+        state_initial_map = {row["state_abbr"]: row["state_name"] for row in reader}
+
+    search_terms = []
+    with open("toy_inputs/duns_to_scrape_take_2.csv", "r") as infile:
+        for row in csv.DictReader(infile):
+            company_state = state_initial_map.get(row["emp_1_state"])
+            if not company_state or not row["clean_name_1"]:
+                continue
+            search_terms.append((row["clean_name_1"], row["emp_1_city"], company_state))
+            if len(search_terms) >= num_searches:
+                break
+    return search_terms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--page-latency", type=float, default=FixtureConfig.page_latency)
+    parser.add_argument("--search-latency", type=float, default=FixtureConfig.search_latency)
+    parser.add_argument("--email-latency", type=float, default=FixtureConfig.email_latency)
+    parser.add_argument("--max-results", type=int, default=FixtureConfig.max_results)
+    parser.add_argument("--server-error-rate", type=float, default=FixtureConfig.server_error_rate)
+    parser.add_argument("--access-denied-rate", type=float, default=FixtureConfig.access_denied_rate)
+    parser.add_argument("--email-failure-rate", type=float, default=FixtureConfig.email_failure_rate)
+    parser.add_argument("--no-form-reset", action="store_true", help="Reload the lookup page before every search")
+    parser.add_argument("--user-data-dir", help="Chrome profile directory to reuse between benchmark runs")
+    parser.add_argument("--block-resources", action="store_true", help="Block images, fonts, media and third-party scripts (see network_blocking.py)")
+    parser.add_argument("--spans-out", help="Write per-phase timing spans to this JSONL file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("bench_execute_search")
+
+    config = FixtureConfig(
+        page_latency=args.page_latency,
+        search_latency=args.search_latency,
+        email_latency=args.email_latency,
+        max_results=args.max_results,
+        server_error_rate=args.server_error_rate,
+        access_denied_rate=args.access_denied_rate,
+        email_failure_rate=args.email_failure_rate,
+    )
+    search_terms = load_search_terms(args.searches)
+
+    with DNBFixtureServer(config) as server:
+        phase_timer = PhaseTimer()
+        scraper = DBScraper(logger=logger, phase_timer=phase_timer, dnb_url=server.url,
+                            form_reset=not args.no_form_reset, user_data_dir=args.user_data_dir,
+                            blocklist=BlockList() if args.block_resources else None)
+
+        num_results = 0
+        num_server_errors = 0
+        start = time.perf_counter()
+        for company_name, company_city, company_state in search_terms:
+            try:
+                duns_results = scraper.execute_search(company_name=company_name, company_state=company_state, company_city=company_city)
+            except DNBServerException:
+                num_server_errors += 1
+                continue
+            num_results += len(duns_results)
+        elapsed = time.perf_counter() - start
+
+    num_searches = len(search_terms)
+    summary = {
+        "searches": num_searches,
+        "results": num_results,
+        "server_errors": num_server_errors,
+        "elapsed_s": elapsed,
+        "searches_per_hour": num_searches / elapsed * 3600,
+        "s_per_search": elapsed / num_searches,
+        "s_per_result": elapsed / num_results if num_results else None,
+        "bytes_transferred": sum(stats["bytes_transferred"] for stats in scraper.network_stats),
+        "requests_blocked": sum(stats["blocked"] for stats in scraper.network_stats),
+        "fixture": {"page_loads": server.stats.page_loads, "searches": server.stats.searches, "email_requests": server.stats.email_requests},
+    }
+    print(json.dumps(summary, indent=2))
+    print(phase_timer.summary_table())
+
+    if args.spans_out:
+        phase_timer.dump_jsonl(args.spans_out)
+
+
+if __name__ == "__main__":
+    main()
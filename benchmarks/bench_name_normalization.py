@@ -0,0 +1,69 @@
+"""
+Benchmark employer-name normalization on the real worklist and on a synthetic 1M-row column
+
+    python benchmarks/bench_name_normalization.py --rows 1000000
+"""
+import argparse
+import csv
+import random
+import time
+
+from duns_bradstreet_scraper import name_normalization
+from duns_bradstreet_scraper.name_normalization import normalize_employer_names
+
+SUFFIXES = ["", ", Inc.", " LLC", " L.L.C.", " Ltd", " Corporation", " (Main Campus)", " - East", " a subsidiary of Acme"]
+DBA_FORMS = [" d/b/a ", " dba ", " D.B.A. "]
+
+
+def load_worklist_names(path: str) -> list[str]:
+    with open(path, "r") as infile:
+        return [row["company_name"] for row in csv.DictReader(infile)]
+
+
+"""
+Real names recombined with suffixes and d/b/a trade names, so roughly `unique_fraction` of the rows are distinct
+"""
+def synthetic_names(base_names: list[str], num_rows: int, unique_fraction: float, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    num_unique = max(int(num_rows * unique_fraction), 1)
+    unique_names = []
+    for _ in range(num_unique):
+        name = rng.choice(base_names) + rng.choice(SUFFIXES)
+        if rng.random() < 0.1:
+            name += rng.choice(DBA_FORMS) + rng.choice(base_names)
+        unique_names.append(name)
+    return [rng.choice(unique_names) for _ in range(num_rows)]
+
+
+def clear_caches() -> None:
+    name_normalization._strip_name.cache_clear()
+    name_normalization._name_variants.cache_clear()
+    name_normalization.truncate_employer_name.cache_clear()
+
+
+def time_normalization(label: str, names: list[str]) -> None:
+    clear_caches()
+    start = time.perf_counter()
+    normalize_employer_names(names)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normalize_employer_names(names)
+    warm = time.perf_counter() - start
+    print(f"{label:<40}{len(names):>10} rows{len(set(names)):>10} unique   cold {cold:7.3f}s   warm {warm:7.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worklist", default="toy_inputs/duns_to_scrape_take_2.csv")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--unique-fraction", type=float, default=0.05)
+    args = parser.parse_args()
+
+    worklist_names = load_worklist_names(args.worklist)
+    time_normalization(args.worklist, worklist_names)
+    time_normalization(f"synthetic ({args.unique_fraction:.0%} unique)", synthetic_names(worklist_names, args.rows, args.unique_fraction))
+
+
+if __name__ == "__main__":
+    main()
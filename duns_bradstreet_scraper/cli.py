@@ -0,0 +1,64 @@
+import importlib
+import sys
+
+
+"""
+`dnb` console entry point (see setup.py). Each subcommand lives in its own module, which is only imported once that
+subcommand is picked, so the offline commands never load Selenium, undetected_chromedriver, arrow or pyarrow unless they
+need them. Everything after the subcommand goes to the module's own argument parser: `dnb export --help`
+"""
+
+
+# subcommand -> (module, function, description)
+COMMANDS = {
+    "scrape": ("duns_bradstreet_scraper.cli", "scrape", "Run a scrape script (toy_doover.py by default)"),
+    "reconcile": ("duns_bradstreet_scraper.reconciliation", "main", "Match D&B emails to scrape log entries and attach their DUNS numbers"),
+    "normalize": ("duns_bradstreet_scraper.name_normalization", "main", "Clean employer names for D&B searches"),
+    "export": ("duns_bradstreet_scraper.columnar", "main", "Convert a scrape/reconciliation CSV to typed Parquet or Arrow IPC"),
+    "stats": ("duns_bradstreet_scraper.event_log", "main", "Summarize a JSONL scrape event log"),
+    "index": ("duns_bradstreet_scraper.company_index", "main", "Index harvested D&B records and look companies up in them"),
+    "simulate": ("duns_bradstreet_scraper.simulation", "main", "Simulate a scrape run against a fake D&B site"),
+}
+
+
+def _usage() -> str:
+    width = max(map(len, COMMANDS))
+    lines = ["usage: dnb <command> [args...]", "", "commands:"]
+    lines += [f"  {command:<{width}}  {description}" for command, (_, _, description) in COMMANDS.items()]
+    lines += ["", "Run `dnb <command> --help` for a command's arguments"]
+    return "\n".join(lines)
+
+
+"""
+The scrape scripts keep their state in module globals and read toy_inputs/ relative to the working directory, so they're
+run as scripts (from the repo checkout) rather than imported
+"""
+def scrape(argv: list[str] | None = None):
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser(description=COMMANDS["scrape"][2])
+    parser.add_argument("--script", default="toy_doover.py", help="Scrape script to run, relative to the working directory")
+    args = parser.parse_args(argv)
+
+    sys.argv = [args.script]
+    runpy.run_path(args.script, run_name="__main__")
+
+
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ["-h", "--help"]:
+        print(_usage())
+        return 0
+    if argv[0] not in COMMANDS:
+        print(f"dnb: unknown command {argv[0]!r}\n\n{_usage()}", file=sys.stderr)
+        return 2
+
+    module_name, function_name, _ = COMMANDS[argv[0]]
+    sys.argv = [f"dnb {argv[0]}", *argv[1:]]  # so the command's --help reads "usage: dnb <command> ..."
+    command = getattr(importlib.import_module(module_name), function_name)
+    return command(argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import argparse
+import csv
+import os
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+# DUNS numbers are 9-digit codes, about half of them with leading zeros, so they're stored as text like ZIP codes
+DUNS_FIELDS = frozenset(["duns_code", "duns_number"])
+DUNS_LENGTH = 9
+
+# One row per result card, as written to duns_log by the scraper
+DUNS_RESULT_SCHEMA = pa.schema([
+    ("duns_name", pa.string()),
+    ("duns_address", pa.string()),
+    ("duns_phone", pa.string()),
+    ("duns_type", pa.string()),
+    ("company_status", pa.string()),
+    ("email_success", pa.bool_()),
+    ("time_email_requested", TIMESTAMP),
+    ("company_name_search_term", pa.string()),
+    ("case_number", pa.string()),
+    ("from_retry", pa.bool_()),
+    ("result_index", pa.int32()),
+    ("card_error", pa.string()),
+    ("error_kind", pa.string()),
+])
+
+# One row per worklist case (duns_to_scrape). ZIP codes stay text: they've already lost leading zeros once
+CASE_SCHEMA = pa.schema([
+    ("case_number", pa.string()),
+    ("company_name", pa.string()),
+    ("clean_name_1", pa.string()),
+    ("clean_name_2", pa.string()),
+    ("emp_1_city", pa.string()),
+    ("emp_1_state", pa.string()),
+    ("emp_1_zip", pa.string()),
+    ("scrape_status", pa.int8()),
+])
+
+# One row per D&B email (dnb_emails.csv)
+EMAIL_SCHEMA = pa.schema([
+    ("sent_at", TIMESTAMP),
+    ("company_name", pa.string()),
+    ("duns_code", pa.string()),
+])
+
+# duns_log joined to emails by write_reconciliation
+RECONCILED_SCHEMA = pa.schema(list(DUNS_RESULT_SCHEMA) + [
+    ("duns_number", pa.string()),
+    ("email_sent_at", TIMESTAMP),
+    ("email_delay_s", pa.float64()),
+    ("match_score", pa.float64()),
+])
+
+SCHEMAS = {
+    "duns_results": DUNS_RESULT_SCHEMA,
+    "cases": CASE_SCHEMA,
+    "emails": EMAIL_SCHEMA,
+    "reconciled": RECONCILED_SCHEMA,
+}
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _to_bool(value) -> bool | None:
+    if _is_blank(value):
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() == "true"
+
+
+"""
+ISO strings, datetimes and arrow.Arrow objects all become timezone-aware datetimes in UTC
+"""
+def _to_timestamp(value) -> datetime | None:
+    if _is_blank(value):
+        return None
+    if hasattr(value, "datetime") and not isinstance(value, datetime):  # arrow.Arrow
+        value = value.datetime
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).strip())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _to_int(value) -> int | None:
+    if _is_blank(value):
+        return None
+    return int(float(value)) if isinstance(value, str) and "." in value else int(value)
+
+
+def _to_float(value) -> float | None:
+    return None if _is_blank(value) else float(value)
+
+
+def _to_str(value) -> str | None:
+    return None if value is None else str(value)
+
+
+"""
+DUNS numbers as 9-digit text. Puts back leading zeros that went missing along the way (ints, spreadsheet-mangled CSVs)
+"""
+def _to_duns(value) -> str | None:
+    if _is_blank(value):
+        return None
+    value = str(_to_int(value)) if isinstance(value, (int, float)) else str(value).strip()
+    return value.zfill(DUNS_LENGTH) if value.isdigit() else value
+
+
+def _converter(arrow_type: pa.DataType):
+    if pa.types.is_boolean(arrow_type):
+        return _to_bool
+    if pa.types.is_timestamp(arrow_type):
+        return _to_timestamp
+    if pa.types.is_integer(arrow_type):
+        return _to_int
+    if pa.types.is_floating(arrow_type):
+        return _to_float
+    return _to_str
+
+
+"""
+Build a typed table from record dicts (CSV rows or scraper records)
+Columns in the schema are parsed to its types. Blank strings become nulls. Columns the schema doesn't know about are kept as text,
+after the schema's columns
+"""
+def to_table(records: list[dict], schema: pa.Schema) -> pa.Table:
+    extra_fields = list(dict.fromkeys(key for record in records for key in record if key not in schema.names))
+    schema = pa.schema(list(schema) + [(name, pa.string()) for name in extra_fields])
+
+    columns = []
+    for field in schema:
+        convert = _to_duns if field.name in DUNS_FIELDS and pa.types.is_string(field.type) else _converter(field.type)
+        columns.append(pa.array([convert(record.get(field.name)) for record in records], type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _format_for(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return "parquet"
+    if extension in ARROW_EXTENSIONS:
+        return "arrow"
+    raise ValueError(f"Can't tell the format of {path}. Use one of {PARQUET_EXTENSIONS + ARROW_EXTENSIONS}")
+
+
+"""
+Write records to Parquet or Arrow IPC, picked by the file extension
+params:
+    records(list[dict])
+    path(str): .parquet/.pq for Parquet, .arrow/.feather/.ipc for Arrow IPC (the file format, which can be memory-mapped)
+    schema(pa.Schema): one of the schemas above, or a key of SCHEMAS
+"""
+def write_records(records: list[dict], path: str, schema: pa.Schema | str) -> pa.Table:
+    if isinstance(schema, str):
+        schema = SCHEMAS[schema]
+    table = to_table(records, schema)
+    if _format_for(path) == "parquet":
+        pq.write_table(table, path, compression="zstd")
+    else:
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return table
+
+
+"""
+Read a table written by write_records. Arrow IPC files are memory-mapped, so columns are read straight from the page cache
+without copying. Parquet files are memory-mapped too, but still have to be decoded
+"""
+def read_table(path: str, columns: list[str] | None = None) -> pa.Table:
+    if _format_for(path) == "parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+"""
+Read a table back as a list of dicts, with bools, datetimes and ints instead of strings
+DUNS numbers come back as 9-digit text, including from older files that stored them as integers
+"""
+def read_records(path: str) -> list[dict]:
+    table = read_table(path)
+    records = table.to_pylist()
+    duns_fields = [name for name in table.column_names if name in DUNS_FIELDS]
+    for record in records:
+        for name in duns_fields:
+            record[name] = _to_duns(record[name])
+    return records
+
+
+"""
+Convert one of the repo's CSVs (duns_log, duns_to_scrape, dnb_emails, a reconciliation output) to a typed table
+"""
+def convert_csv(csv_path: str, output_path: str, schema: pa.Schema | str) -> pa.Table:
+    with open(csv_path, "r") as infile:
+        records = list(csv.DictReader(infile))
+    return write_records(records, output_path, schema)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Convert a scrape/reconciliation CSV to typed Parquet or Arrow IPC")
+    parser.add_argument("kind", choices=list(SCHEMAS), help="Which schema the CSV follows")
+    parser.add_argument("csv_path")
+    parser.add_argument("output_path", help=".parquet for Parquet, .arrow for Arrow IPC")
+    args = parser.parse_args(argv)
+
+    table = convert_csv(args.csv_path, args.output_path, args.kind)
+    print(f"Wrote {table.num_rows} rows x {table.num_columns} columns to {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+from duns_bradstreet_scraper.fuzzy_matching import canonicalize_company_name, char_ngrams
+
+
+WHITESPACE_RE = re.compile(r"\s+")
+FTS_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# D&B addresses look like "885 S Main St,Mansfield,MA 02048-3148"
+STATE_ZIP_RE = re.compile(r"^([A-Za-z]{2})\s*([0-9-]*)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    id              INTEGER PRIMARY KEY,
+    record_key      TEXT NOT NULL UNIQUE,
+    source          TEXT NOT NULL,
+    name            TEXT NOT NULL,
+    name_key        TEXT NOT NULL,
+    address         TEXT,
+    city            TEXT,
+    state           TEXT,
+    zip             TEXT,
+    phone           TEXT,
+    company_type    TEXT,
+    company_status  TEXT,
+    duns_number     TEXT,
+    updated_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS companies_name_key ON companies (name_key);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS companies_fts USING fts5(name, content='companies', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS companies_ai AFTER INSERT ON companies BEGIN
+    INSERT INTO companies_fts (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS companies_ad AFTER DELETE ON companies BEGIN
+    INSERT INTO companies_fts (companies_fts, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS companies_au AFTER UPDATE OF name ON companies BEGIN
+    INSERT INTO companies_fts (companies_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO companies_fts (rowid, name) VALUES (new.id, new.name);
+END;
+
+CREATE TABLE IF NOT EXISTS sources (
+    path          TEXT PRIMARY KEY,
+    offset        INTEGER NOT NULL,
+    fingerprint   TEXT,
+    indexed_at    REAL NOT NULL
+);
+"""
+
+# How much of a file's start (header included) and of the bytes just before the resume point go into its fingerprint
+FINGERPRINT_HEAD_BYTES = 64 * 1024
+FINGERPRINT_TAIL_BYTES = 4 * 1024
+
+# Empty values in a new row never overwrite what's already known about a company
+UPSERT = """
+INSERT INTO companies (record_key, source, name, name_key, address, city, state, zip, phone, company_type, company_status, duns_number, updated_at)
+VALUES (:record_key, :source, :name, :name_key, :address, :city, :state, :zip, :phone, :company_type, :company_status, :duns_number, :updated_at)
+ON CONFLICT (record_key) DO UPDATE SET
+    phone = COALESCE(excluded.phone, phone),
+    company_type = COALESCE(excluded.company_type, company_type),
+    company_status = COALESCE(excluded.company_status, company_status),
+    duns_number = COALESCE(excluded.duns_number, duns_number),
+    updated_at = excluded.updated_at
+"""
+
+# How much a candidate's location shifts its name score
+LOCATION_WEIGHTS = {
+    "city_and_state": 1.0,
+    "state": 0.85,
+    "unknown": 0.75,  # email-only records carry no address
+    "other_state": 0.3,
+}
+
+
+def _clean(value: str | None) -> str | None:
+    value = WHITESPACE_RE.sub(" ", value or "").strip()
+    return value or None
+
+
+"""
+Split a D&B address into (city, state, zip). Anything that doesn't look like "street,city,ST zip" gives Nones
+"""
+def parse_address(address: str | None) -> tuple[str | None, str | None, str | None]:
+    parts = [part.strip() for part in (address or "").split(",")]
+    if len(parts) < 2:
+        return None, None, None
+    state_zip = STATE_ZIP_RE.match(parts[-1])
+    if state_zip is None:
+        return None, None, None
+    return _clean(parts[-2]), state_zip.group(1).upper(), state_zip.group(2) or None
+
+
+"""
+Fingerprint of a CSV as it was read up to `offset`: its first bytes (header included) and the bytes just before offset.
+If either changed, the file was rewritten (export_csvs regenerates logs, sometimes with new columns) rather than
+appended to, and offset may no longer fall on a row boundary
+Return: hex digest, or None if the file is shorter than offset or offset isn't at the start of a line
+"""
+def _fingerprint(path: str, offset: int) -> str | None:
+    if offset > os.path.getsize(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, "rb") as infile:
+        digest.update(infile.read(min(offset, FINGERPRINT_HEAD_BYTES)))
+        tail_start = max(offset - FINGERPRINT_TAIL_BYTES, 0)
+        infile.seek(tail_start)
+        tail = infile.read(offset - tail_start)
+    if tail and not tail.endswith(b"\n"):
+        return None
+    digest.update(tail)
+    return digest.hexdigest()
+
+
+"""
+Yield (row, end offset) for the rows of a CSV past `offset` (0 = from the start), so an appended file is only read from
+where the last update stopped. Reads in binary so the offsets are exact byte positions. A last line without its newline
+is still being written, and is left for the next update
+"""
+def _iter_new_rows(path: str, offset: int):
+    with open(path, "rb") as infile:
+        header = next(csv.reader([infile.readline().decode("utf-8-sig")]), None)
+        if not header:
+            return
+        if offset:
+            infile.seek(offset)
+
+        def lines():
+            for line in iter(infile.readline, b""):
+                if not line.endswith(b"\n"):
+                    return
+                yield line.decode("utf-8")
+
+        for row in csv.reader(lines()):
+            if row:
+                yield dict(zip(header, row)), infile.tell()
+
+
+"""
+Local full-text index of every company D&B has shown us: result cards from scrape logs (name, address, phone, type,
+status, plus the DUNS number in reconciliation outputs) and the companies named in D&B emails (name and DUNS number)
+
+Backed by SQLite FTS5. update() only reads rows appended to each file since the last update, and re-reading rows is
+harmless, since a company's record is keyed by its canonical name and address (or DUNS number, for emails). A file that
+was rewritten instead of appended to is noticed by its fingerprint and read again from the top
+"""
+class CompanyIndex:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        source_columns = {column[1] for column in self._conn.execute("PRAGMA table_info(sources)")}
+        if "fingerprint" not in source_columns:  # Indexes built before fingerprints. Their offsets get re-checked
+            self._conn.execute("ALTER TABLE sources ADD COLUMN fingerprint TEXT")
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "CompanyIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+
+    """
+    Index whatever was added to these files since the last update. Missing files are skipped
+    params:
+        log_paths(list[str]): scrape logs (duns_log_*.csv) or reconciliation outputs
+        email_paths(list[str]): D&B email CSVs (sent_at, company_name, duns_code)
+    Return: number of rows read
+    """
+    def update(self, log_paths: list[str] = (), email_paths: list[str] = ()) -> int:
+        num_rows = 0
+        for path in log_paths:
+            num_rows += self._index_file(path, self._log_record)
+        for path in email_paths:
+            num_rows += self._index_file(path, self._email_record)
+        return num_rows
+
+    def _index_file(self, path: str, to_record) -> int:
+        if not os.path.exists(path):
+            return 0
+        path_key = os.path.abspath(path)
+        row = self._conn.execute("SELECT offset, fingerprint FROM sources WHERE path = ?", (path_key,)).fetchone()
+        offset = row[0] if row else 0
+        if offset and _fingerprint(path, offset) != row[1]:
+            offset = 0  # The file was rewritten, not appended to. Read it again from the top
+
+        num_rows = 0
+        now = time.time()
+        with self._conn:
+            for csv_row, end_offset in _iter_new_rows(path, offset):
+                record = to_record(csv_row)
+                if record is not None:
+                    self._conn.execute(UPSERT, record | {"updated_at": now})
+                num_rows += 1
+                offset = end_offset
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (path, offset, fingerprint, indexed_at) VALUES (?, ?, ?, ?)",
+                (path_key, offset, _fingerprint(path, offset), now),
+            )
+        return num_rows
+
+    def _log_record(self, row: dict) -> dict | None:
+        name = _clean(row.get("duns_name"))
+        if name is None:
+            return None
+        address = _clean(row.get("duns_address"))
+        city, state, zip_code = parse_address(address)
+        name_key = canonicalize_company_name(name)
+        return {
+            "record_key": f"log|{name_key}|{(address or '').lower()}",
+            "source": "log",
+            "name": name,
+            "name_key": name_key,
+            "address": address,
+            "city": city,
+            "state": state,
+            "zip": zip_code,
+            "phone": _clean(row.get("duns_phone")),
+            "company_type": _clean(row.get("duns_type")),
+            "company_status": _clean(row.get("company_status")),
+            "duns_number": _clean(row.get("duns_number")),
+        }
+
+    def _email_record(self, row: dict) -> dict | None:
+        name, duns_number = _clean(row.get("company_name")), _clean(row.get("duns_code"))
+        if name is None or duns_number is None:
+            return None
+        name_key = canonicalize_company_name(name)
+        return {
+            "record_key": f"email|{duns_number}|{name_key}",
+            "source": "email",
+            "name": name,
+            "name_key": name_key,
+            "address": None, "city": None, "state": None, "zip": None,
+            "phone": None, "company_type": None, "company_status": None,
+            "duns_number": duns_number,
+        }
+
+    """
+    Ranked candidate records for a company
+    params:
+        company_name(str): name as it would be searched
+        company_city(str)
+        company_state(str): two-letter abbreviation, as D&B addresses have it
+        limit(int): most candidates to return
+        pool_size(int): full-text matches to re-rank
+    Return: list of dicts (name, address, city, state, zip, phone, company_type, company_status, duns_number, duns_source,
+        source, name_score, location, score), best first. score is the name's Dice similarity (see fuzzy_matching.py)
+        scaled by LOCATION_WEIGHTS. Log records without a DUNS number borrow one from the emails when every email under
+        the same canonical name carries the same one (duns_source "email_name")
+    """
+    def lookup(self, company_name: str, company_city: str, company_state: str, limit: int = 10, pool_size: int = 200) -> list[dict]:
+        name_key = canonicalize_company_name(company_name)
+        tokens = list(dict.fromkeys(FTS_TOKEN_RE.findall(name_key)))
+        if not tokens:
+            return []
+
+        fts_query = " OR ".join(f'"{token}"' for token in tokens)
+        rows = self._conn.execute(
+            "SELECT c.* FROM companies_fts JOIN companies c ON c.id = companies_fts.rowid "
+            "WHERE companies_fts MATCH ? ORDER BY bm25(companies_fts) LIMIT ?", (fts_query, pool_size))
+        columns = [column[0] for column in rows.description]
+
+        query_ngrams = char_ngrams(name_key)
+        city, state = (_clean(company_city) or "").lower(), (_clean(company_state) or "").upper()
+        candidates = []
+        for row in rows:
+            candidate = dict(zip(columns, row))
+            candidate_ngrams = char_ngrams(candidate["name_key"])
+            name_score = 2 * len(query_ngrams & candidate_ngrams) / (len(query_ngrams) + len(candidate_ngrams))
+            if candidate["state"] is None:
+                location = "unknown"
+            elif candidate["state"] != state:
+                location = "other_state"
+            elif (candidate["city"] or "").lower() == city:
+                location = "city_and_state"
+            else:
+                location = "state"
+            candidate |= {"name_score": name_score, "location": location, "score": name_score * LOCATION_WEIGHTS[location]}
+            candidates.append(candidate)
+
+        for candidate in candidates:
+            candidate["duns_source"] = candidate["source"] if candidate["duns_number"] else None
+            if candidate["duns_number"] is None:
+                email_duns = self._email_duns_numbers(candidate["name_key"])
+                if len(email_duns) == 1:
+                    candidate["duns_number"], candidate["duns_source"] = email_duns[0], "email_name"
+
+        # One candidate per DUNS number: an address-bearing log record beats the email that named the same company
+        candidates.sort(key=lambda candidate: -candidate["score"])
+        seen_duns, ranked = set(), []
+        for candidate in candidates:
+            if candidate["duns_number"] is not None:
+                if candidate["duns_number"] in seen_duns:
+                    continue
+                seen_duns.add(candidate["duns_number"])
+            for column in ["id", "record_key", "name_key", "updated_at"]:
+                del candidate[column]
+            ranked.append(candidate)
+        return ranked[:limit]
+
+    def _email_duns_numbers(self, name_key: str) -> list[str]:
+        rows = self._conn.execute("SELECT DISTINCT duns_number FROM companies WHERE source = 'email' AND name_key = ?", (name_key,))
+        return [duns_number for (duns_number,) in rows]
+
+    def stats(self) -> dict:
+        counts = dict(self._conn.execute("SELECT source, COUNT(*) FROM companies GROUP BY source"))
+        with_duns = self._conn.execute("SELECT COUNT(*) FROM companies WHERE duns_number IS NOT NULL").fetchone()[0]
+        return {"records": sum(counts.values()), "by_source": counts, "with_duns_number": with_duns}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Index harvested D&B records for full-text lookup, then optionally look a company up")
+    parser.add_argument("--db", default="toy_outputs/company_index.sqlite3")
+    parser.add_argument("--log", action="append", default=[], help="Scrape log or reconciliation output to index (repeatable)")
+    parser.add_argument("--emails", action="append", default=[], help="D&B email CSV to index (repeatable)")
+    parser.add_argument("--lookup", nargs=3, metavar=("NAME", "CITY", "STATE"), help="Company to look up after indexing")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with CompanyIndex(args.db) as company_index:
+        num_rows = company_index.update(args.log, args.emails)
+        print(f"Read {num_rows} new rows. Index: {company_index.stats()}")
+        if args.lookup:
+            print(json.dumps(company_index.lookup(*args.lookup, limit=args.limit), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,61 +2,218 @@ import csv
 import logging
 import time
 import re
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import timedelta
 
 import arrow
 import undetected_chromedriver as uc
-from selenium.common.exceptions import ElementClickInterceptedException, NoSuchElementException, StaleElementReferenceException, WebDriverException
+from selenium.common.exceptions import ElementClickInterceptedException, StaleElementReferenceException, TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select, WebDriverWait
 
+from duns_bradstreet_scraper.event_log import log_event
+from duns_bradstreet_scraper.instrumentation import NullPhaseTimer, PhaseTimer
+from duns_bradstreet_scraper.network_blocking import BlockList, NetworkMonitor
+from duns_bradstreet_scraper.rate_limiting import TokenBucket
+from duns_bradstreet_scraper.email_requests import email_request_id
+from duns_bradstreet_scraper.records import DunsResult
+from duns_bradstreet_scraper.retry_policy import ErrorKind, RetryPolicy, classify_error
+from duns_bradstreet_scraper.search_cache import SearchCache
+from duns_bradstreet_scraper.snapshots import SnapshotArchive
+
+
+DNB_LOOKUP_URL = "https://www.dnb.com/duns-number/lookup.html"
+
+# Reads every result card in one WebDriver round-trip. Keys match _extract_company_info
+EXTRACT_ALL_CARDS_SCRIPT = """
+function cardText(card, className) {
+    var elem = card.getElementsByClassName(className)[0];
+    return elem ? elem.innerText.trim() : "";
+}
+return Array.from(document.getElementsByClassName("search-results-card-container")).map(function (card) {
+    return {
+        duns_name: cardText(card, "name"),
+        duns_address: cardText(card, "address"),
+        duns_phone: cardText(card, "phone"),
+        duns_type: cardText(card, "type"),
+        company_status: cardText(card, "status"),
+        has_email_link: Array.from(card.getElementsByTagName("a")).some(function (a) { return a.textContent.indexOf("Email D-U-N-S") !== -1; })
+    };
+});
+"""
+
+# Clicks the email request modal's close button, if there is one, without going through WebDriver's click checks
+FORCE_CLOSE_MODAL_SCRIPT = """
+var close_button = document.querySelector(".requestform__close");
+if (close_button) { close_button.click(); }
+"""
+
+# Finds the nth result card and scrolls it to the middle of the viewport in one round-trip
+SCROLL_TO_CARD_SCRIPT = """
+var card = document.getElementsByClassName("search-results-card-container")[arguments[0]];
+card.scrollIntoView({block: "center", inline: "nearest"});
+return card;
+"""
 
 # Aka they've caught us scraping
 class DNBServerException(RuntimeError):
-    pass
+    kind = ErrorKind.SERVER_ERROR
+
+# D&B served its "Access Denied" page. Still a DNBServerException, so existing handlers catch it
+class DNBAccessDeniedException(DNBServerException):
+    kind = ErrorKind.ACCESS_DENIED
 
 # immediately switch vpn servers...
 class DNBRejectionException(RuntimeError):
-    pass
+    kind = ErrorKind.ACCESS_DENIED
+
+"""
+Upper bounds (in seconds) for the page conditions DBScraper waits on.
+Each wait returns as soon as its condition holds, so these only cost time when the page is slow or the condition never appears
+"""
+@dataclass
+class TimingProfile:
+    implicit_wait: float = 3           # default driver wait before NoSuchElementException
+    page_load_timeout: float = 10      # search form (or an error/denied marker) to show up after driver.get
+    cookie_popup_timeout: float = 2    # GDPR popup to become clickable
+    popup_dismiss_timeout: float = 2   # GDPR popup to go away after clicking it
+    form_ready_timeout: float = 5      # search form inputs to become interactable
+    results_timeout: float = 2         # result cards or an error message to show up after submitting a search
+    poll_frequency: float = 0.1        # how often WebDriverWait re-checks a condition
+
 
 class DBScraper:
-    def __init__(self, logger=None):
-        self._duns_bradstreet_url = "https://www.dnb.com/duns-number/lookup.html"
+    """
+    params:
+        logger(logging.Logger): logger to report progress to. If None, log to the console
+        timing_profile(TimingProfile): upper bounds for page-condition waits
+        phase_timer(PhaseTimer): if given, record per-phase latency spans for every search. Off (no-op) by default
+        dnb_url(str): lookup page to scrape. Override to point at a local stand-in (see fixture_server.py)
+        bulk_extraction(bool): read all result cards with one script call instead of five WebDriver calls per card
+        search_cache(SearchCache): if given, execute_search returns cached results for searches it has already run
+        rate_limiter(TokenBucket): if given, every live (uncached) search waits for a token first. Share one between scrapers to cap their combined rate
+        form_reset(bool): between searches, clear and refill the search form already on the page instead of reloading the page
+        user_data_dir(str): Chrome profile directory to reuse across runs, so the browser cache (static assets, cookies) survives restarts
+        blocklist(BlockList): if given, block these resource types and URLs at the network level, and count bytes transferred
+            and requests blocked per search (see network_stats)
+        retry_policy(RetryPolicy): which failed search attempts to retry, and how long to back off in between
+        driver: WebDriver to use instead of starting Chrome, e.g. a simulation.FakeDriver
+        clock: where the scraper's pauses and search timings come from. Anything with sleep() and perf_counter(), the time
+            module by default. simulation.SimClock runs searches on simulated time. Give phase_timer the same clock
+    """
+    def __init__(self, logger=None, timing_profile: TimingProfile | None = None, phase_timer: PhaseTimer | None = None,
+                 dnb_url: str = DNB_LOOKUP_URL, bulk_extraction: bool = True, search_cache: SearchCache | None = None,
+                 rate_limiter: TokenBucket | None = None, form_reset: bool = True, user_data_dir: str | None = None,
+                 blocklist: BlockList | None = None, retry_policy: RetryPolicy | None = None, driver=None, clock=time):
+        self._duns_bradstreet_url = dnb_url
+        self._form_reset = form_reset
+        self._user_data_dir = user_data_dir
+        self._network_monitor = NetworkMonitor(blocklist) if blocklist is not None else None
+        self.network_stats = []  # one dict per live search, if a blocklist is set
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._search_cache = search_cache
+        self._bulk_extraction = bulk_extraction
         self._logger = logger
-        self._driver = None
+        self._timing = timing_profile or TimingProfile()
+        self._phase_timer = phase_timer or NullPhaseTimer()
+        self._try_number = None  # retry number of the search in progress, used to tag timing spans
+        self._clock = clock
+        self._driver = driver
         self._initialize()
 
     def _initialize(self):
         self._set_up_logger()
-        self._driver = uc.Chrome()
-        self._driver.implicitly_wait(3)  # Tell driver to wait 5 seconds before returning NoSuchElementException
-        
+        if self._driver is None:
+            self._driver = uc.Chrome(user_data_dir=self._user_data_dir, enable_cdp_events=self._network_monitor is not None)
+        if self._network_monitor is not None:
+            self._network_monitor.attach(self._driver)
+        self._driver.implicitly_wait(self._timing.implicit_wait)  # Tell driver how long to wait before returning NoSuchElementException
+
         self._load_dnb_search_page()
 
+    """
+    Wait up to `timeout` seconds for `condition` to return something truthy
+    Return: the condition's return value, or None if it never held
+    """
+    def _wait_for(self, condition, timeout: float):
+        try:
+            with self._implicit_wait_disabled():
+                return WebDriverWait(self._driver, timeout, poll_frequency=self._timing.poll_frequency).until(condition)
+        except TimeoutException:
+            return None
+
+    """
+    Temporarily turn off the driver's implicit wait, so lookups for elements that are usually absent return immediately
+    """
+    @contextmanager
+    def _implicit_wait_disabled(self):
+        self._driver.implicitly_wait(0)
+        try:
+            yield
+        finally:
+            self._driver.implicitly_wait(self._timing.implicit_wait)
+
     """
     Open Duns Bradstreet search page. Close cookie pop-up if shows up
     params:
         handle_cookie_popup (bool): If true, look for and close the GDPR cookie popup 
     """
     def _load_dnb_search_page(self, handle_cookie_popup: bool = True) -> None:
-        self._driver.get(self._duns_bradstreet_url)
-        time.sleep(2) 
+        with self._phase_timer.span("page_load", retry=self._try_number):
+            self._driver.get(self._duns_bradstreet_url)
+            # Wait for the search form, or for one of the markers that means it will never show up
+            self._wait_for(EC.any_of(
+                EC.presence_of_element_located((By.NAME, "primary-reason-dropdown-select-component")),
+                EC.presence_of_element_located((By.CLASS_NAME, "direct-plus-search-error-text")),
+                EC.text_to_be_present_in_element((By.TAG_NAME, "h1"), "Access Denied"),
+            ), self._timing.page_load_timeout)
+
         # Close cookie pop-up
-        self._handle_cookie_popup()
+        if handle_cookie_popup:
+            self._handle_cookie_popup()
+
+    """
+    Get the lookup page ready for a new search. Reuse the form already on the page if we can, else reload the page.
+    Retries always reload, since whatever went wrong may have left the page in a bad state
+    """
+    def _prepare_search_page(self, handle_cookie_popup: bool) -> None:
+        if self._form_reset and not handle_cookie_popup and self._try_number == 1 and self._reset_search_form():
+            return
+        self._load_dnb_search_page(handle_cookie_popup=handle_cookie_popup)
+
+    """
+    Clear the search form left over from the previous search, in place
+    Return: False (leaving the page untouched) if we aren't on the lookup page, it shows an error or access-denied marker,
+    or the form isn't usable. The caller should reload the page then
+    """
+    def _reset_search_form(self) -> bool:
+        with self._phase_timer.span("form_reset", retry=self._try_number):
+            if not self._driver.current_url.startswith(self._duns_bradstreet_url) or self._check_access_denied() or self._check_for_error():
+                return False
+            with self._implicit_wait_disabled():
+                form_inputs = self._driver.find_elements(By.NAME, "businessName") + self._driver.find_elements(By.NAME, "city")
+            if len(form_inputs) != 2 or not all(form_input.is_displayed() and form_input.is_enabled() for form_input in form_inputs):
+                return False
+
+            for form_input in form_inputs:
+                form_input.clear()
+            return True
 
     """
     Closes the GDPR cookie pop-up if it's present
     """
     def _handle_cookie_popup(self) -> None:
-        try:
-            cookie_close_button = self._driver.find_element(By.ID, "truste-consent-required")
-            cookie_close_button.click()
-        except NoSuchElementException:
-            pass
-        time.sleep(2)
-        
+        cookie_popup_locator = (By.ID, "truste-consent-required")
+        cookie_close_button = self._wait_for(EC.element_to_be_clickable(cookie_popup_locator), self._timing.cookie_popup_timeout)
+        if cookie_close_button is None:
+            return
+        cookie_close_button.click()
+        self._wait_for(EC.invisibility_of_element_located(cookie_popup_locator), self._timing.popup_dismiss_timeout)
+
 
     def _set_up_logger(self) -> None:
         if self._logger is not None: return
@@ -70,69 +227,185 @@ class DBScraper:
     """
     Check whether DNB is showing us an "access denied" screen
     """
-    def _check_access_denied(self) -> True:
-        try:
-            first_h1 = self._driver.find_element(By.TAG_NAME, "h1")
-            if "Access Denied" in first_h1.text:
-                return True
-        except NoSuchElementException:
-            pass
-        return False
+    def _check_access_denied(self) -> bool:
+        with self._implicit_wait_disabled():
+            h1s = self._driver.find_elements(By.TAG_NAME, "h1")
+        return len(h1s) > 0 and "Access Denied" in h1s[0].text
 
     """
     Entrypoint to DNB screaper. Searches for a company by name/city/state, then extracts information from search results and generates a DNB number email
+    Return: one record per result card. See iter_search to get them card by card as they finish
     params:
         company_name(str)
         company_state(str)
         company_cit(str)
         company_zip(str)
         new_vpn_server(bool): True if we've just switched VPN servers. After switching servers, we need to check for the cookie popup again
+        snapshot_archive(SnapshotArchive): if given, save the results page HTML to this archive before emailing results
+        bypass_cache(bool): search D&B even if the search cache has results for this query (the cache is still updated)
+        request_emails(bool): request a DUNS email for every card. If False, only extract the cards, leaving email_success
+            unset and tagging each card with its email_request_id, so a later email stage (iter_email_requests) can
+            request each company once across all searches. The two modes have separate search cache entries, so a
+            search that only extracted the cards never answers one that should request the emails
     """
-    def execute_search(self, company_name: str, company_state: str, company_city="", company_zip="", new_vpn_server=False) -> list[dict]:
+    def execute_search(self, company_name: str, company_state: str, company_city="", company_zip="", new_vpn_server=False,
+                       snapshot_archive: SnapshotArchive | None = None, bypass_cache: bool = False, request_emails: bool = True) -> list[DunsResult]:
+        return list(self.iter_search(company_name, company_state, company_city, company_zip, new_vpn_server, snapshot_archive, bypass_cache,
+                                     request_emails))
 
+    """
+    Streaming execute_search (same params). Yields each result card's record as soon as its email request is done,
+    so the caller can persist it before moving on
 
-        max_search_tries=3
-        try_number = 1
-        # This is ugly. I should just wrap a retry decorator around the reset_search_page and _search_for_company methods...
-        while try_number <= max_search_tries:
+    A card that fails is yielded as an error record instead of stopping the search: whatever company info was read,
+    email_success False, and card_error/error_kind describing the failure. Searches with error records aren't cached.
+    Failures before any card is reached (page load, server errors) still raise
+    """
+    def iter_search(self, company_name: str, company_state: str, company_city="", company_zip="", new_vpn_server=False,
+                    snapshot_archive: SnapshotArchive | None = None, bypass_cache: bool = False, request_emails: bool = True):
+        if self._search_cache is not None and not bypass_cache:
+            cached_results = self._search_cache.get(company_name, company_city, company_state, emails_requested=request_emails)
+            if cached_results is not None:
+                log_event(self._logger, "cache_hit", f"Search cache hit for '{company_name}' in {(company_city, company_state)}",
+                          company_name=company_name, city=company_city, state=company_state, num_results=len(cached_results))
+                for cached_result in cached_results:
+                    duns_result = DunsResult.from_dict(cached_result)
+                    duns_result.company_name_search_term = company_name
+                    yield duns_result
+                return
+
+        if self._rate_limiter is not None:
+            waited = self._rate_limiter.acquire()
+            if waited:
+                self._logger.info(f"Waited {waited:.1f}s for the search rate limit")
+
+        if self._network_monitor is not None:
+            self._network_monitor.take_stats()  # drop traffic from between searches
+
+        log_event(self._logger, "search_started", f"Searching for '{company_name}' in {(company_city, company_state)}",
+                  company_name=company_name, city=company_city, state=company_state)
+        search_start = self._clock.perf_counter()
+        num_spans_before = len(self._phase_timer.spans)
+
+        self._run_search_with_retries(company_name, company_city, company_zip, company_state, new_vpn_server)
+
+        if snapshot_archive is not None:
+            snapshot_archive.append(company_name, company_city, company_state, self._driver.page_source)
+
+        duns_results = []
+        for duns_result in self._iter_email_and_extract_duns_results(request_emails=request_emails):
+            duns_result.company_name_search_term = company_name
+            duns_results.append(duns_result)
+            yield duns_result
+
+        network_stats = None
+        if self._network_monitor is not None:
+            network_stats = self._network_monitor.take_stats()
+            self.network_stats.append(network_stats)
+            self._logger.info(f"Search network traffic: {network_stats['bytes_transferred']} bytes over {network_stats['requests']} requests, {network_stats['blocked']} blocked")
+
+        phases = {}
+        for span in self._phase_timer.spans[num_spans_before:]:
+            phases[span["phase"]] = phases.get(span["phase"], 0) + span["duration"]
+        log_event(self._logger, "search_done", f"Finished search for '{company_name}': {len(duns_results)} results",
+                  company_name=company_name, city=company_city, state=company_state, duration_s=self._clock.perf_counter() - search_start,
+                  num_results=len(duns_results), num_emails=sum(bool(duns_result.get("email_success")) for duns_result in duns_results),
+                  num_card_errors=sum("card_error" in duns_result for duns_result in duns_results), phases=phases, network=network_stats)
+        if self._search_cache is not None and not any("card_error" in duns_result for duns_result in duns_results):
+            self._search_cache.put(company_name, company_city, company_state, duns_results, emails_requested=request_emails)
+
+    """
+    Email stage of a two-stage run: re-run a search and request the DUNS email for only the cards whose email_request_id
+    is in request_ids, each once even if D&B lists it twice. Yields those cards' records, tagged with their email_request_id.
+    Never answered from the search cache. Failures before any card is reached raise, as in iter_search
+    params:
+        request_ids(set[str]): email_request_ids of the cards to request (see email_requests.py)
+    """
+    def iter_email_requests(self, company_name: str, company_state: str, company_city="", request_ids=(), new_vpn_server=False):
+        if self._rate_limiter is not None:
+            waited = self._rate_limiter.acquire()
+            if waited:
+                self._logger.info(f"Waited {waited:.1f}s for the search rate limit")
+
+        log_event(self._logger, "search_started", f"Searching for '{company_name}' in {(company_city, company_state)} to request {len(request_ids)} emails",
+                  company_name=company_name, city=company_city, state=company_state, stage="email")
+        search_start = self._clock.perf_counter()
+        self._run_search_with_retries(company_name, company_city, "", company_state, new_vpn_server)
+
+        duns_results = []
+        for duns_result in self._iter_email_and_extract_duns_results(request_ids=set(request_ids)):
+            duns_result.company_name_search_term = company_name
+            duns_results.append(duns_result)
+            yield duns_result
+
+        log_event(self._logger, "search_done", f"Requested {len(duns_results)}/{len(request_ids)} emails from the search for '{company_name}'",
+                  company_name=company_name, city=company_city, state=company_state, duration_s=self._clock.perf_counter() - search_start,
+                  num_results=len(duns_results), num_emails=sum(bool(duns_result.get("email_success")) for duns_result in duns_results),
+                  num_card_errors=sum("card_error" in duns_result for duns_result in duns_results), stage="email")
+
+    """
+    Load the search page, fill in the form and submit it, retrying failed attempts as the retry policy allows
+    Raises DNBServerException (or a subclass) once the policy gives up, with the last error as its cause
+    """
+    def _run_search_with_retries(self, company_name: str, company_city: str, company_zip: str, company_state: str, new_vpn_server: bool) -> None:
+        attempt = 1
+        while True:
+            self._try_number = attempt
             try:
-                self._load_dnb_search_page(handle_cookie_popup=False)
+                self._prepare_search_page(handle_cookie_popup=new_vpn_server)
                 if self._check_access_denied():
-                    raise DNBServerException("DNB Access Denied. Rotate VPN")
+                    raise DNBAccessDeniedException("DNB Access Denied. Rotate VPN")
                 self._search_for_company(company_name, company_city, company_zip, company_state)
-                break
-            except NoSuchElementException:
-                self._logger.error(f"Could not find search container on attempt {try_number}/{max_search_tries}")
-            except WebDriverException:
-                self._logger.error(f"Could not load search page on attemp {try_number}/{max_search_tries}")
-
-            try_number += 1
-
-        if try_number >= max_search_tries:
-            self._logger.error("Could not locate search container after {max_search_tries} tries. Rotate server?")
-            raise DNBServerException()
-
-
-        if self._check_for_error():
-            self._logger.error("DNB server error!!!! Rotate IP address?")
-            raise DNBServerException("DNB server error")
-
-        duns_results = self._email_and_extract_duns_results()
-        duns_results = [duns_result | {"company_name_search_term": company_name} for duns_result in duns_results]
-        return duns_results
+                if self._check_for_error():
+                    raise DNBServerException("DNB server error")
+                return
+            except (WebDriverException, DNBServerException) as e:
+                kind = classify_error(e)
+                if not self._retry_policy.should_retry(kind, attempt):
+                    log_event(self._logger, "server_error",
+                              f"Search attempt {attempt}/{self._retry_policy.max_attempts} failed ({kind.value}). Giving up. Rotate IP address?",
+                              level=logging.ERROR, company_name=company_name, error_kind=kind.value, attempt=attempt)
+                    if isinstance(e, DNBServerException):
+                        raise
+                    raise DNBServerException(f"Search failed after {attempt} attempts ({kind.value})") from e
+
+                delay = self._retry_policy.delay(attempt)
+                log_event(self._logger, "search_retry", f"Search attempt {attempt}/{self._retry_policy.max_attempts} failed ({kind.value}). Retrying in {delay:.1f}s",
+                          level=logging.WARNING, company_name=company_name, error_kind=kind.value, attempt=attempt, delay_s=delay)
+                self._clock.sleep(delay)
+                attempt += 1
 
     def _search_for_company(self, company_name: str, company_city: str, company_zip: str, company_state: str) -> None:
+        with self._phase_timer.span("form_fill", retry=self._try_number):
+            self._fill_search_form(company_name, company_city, company_zip, company_state)
+
+        # Submit search
+        with self._phase_timer.span("submit", retry=self._try_number):
+            search_box = self._driver.find_element(By.ID, 'submit-search')
+            self._center_element(search_box)
+            self._wait_for(EC.element_to_be_clickable(search_box), self._timing.form_ready_timeout)
+            with self._implicit_wait_disabled():
+                previous_cards = self._driver.find_elements(By.CLASS_NAME, "search-results-card-container")  # left over if the form was reset in place
+
+            search_box.submit() 
+            if previous_cards:
+                # Don't mistake the last search's cards for this one's results
+                self._wait_for(EC.staleness_of(previous_cards[0]), self._timing.results_timeout)
+            self._wait_for_search_results()
+
+    def _fill_search_form(self, company_name: str, company_city: str, company_zip: str, company_state: str) -> None:
         search_type_selector = Select(self._driver.find_element(By.NAME, "primary-reason-dropdown-select-component"))
         search_type_selector.select_by_visible_text("Other company")
         search_form_div = self._driver.find_element(By.CLASS_NAME, "container-search")  # business search container with inputs
 
+        # Picking a search reason reveals the business inputs. Wait until they accept input
+        self._wait_for(EC.element_to_be_clickable((By.NAME, "businessName")), self._timing.form_ready_timeout)
+
         # Fill in business name
         search_form_div.find_element(By.NAME, "businessName").send_keys(company_name)  
-        time.sleep(0.5)
 
         # Fill in business city
         search_form_div.find_element(By.NAME, "city").send_keys(company_city)
-        time.sleep(0.5)
 
         # Fill in business zip
         # search_form_div.find_element(By.NAME, "zip").send_keys(zip_code)
@@ -143,47 +416,138 @@ class DBScraper:
         state_selector = Select(final_input_div.find_element(By.TAG_NAME, "select"))
         state_selector.select_by_visible_text(company_state)
 
-        # Submit search
-        search_box = self._driver.find_element(By.ID, 'submit-search')
-        self._center_element(search_box)
-        time.sleep(0.2)
+    """
+    Wait until the search has settled: the loading spinner is gone and result cards (or an error message) are on the page.
+    Searches with no results never show a card, so they wait out the full results_timeout
+    """
+    def _wait_for_search_results(self) -> None:
+        def search_settled(driver):
+            if driver.find_elements(By.CLASS_NAME, "full-screen-loader"):
+                return False
+            return len(driver.find_elements(By.CLASS_NAME, "search-results-card-container")) > 0 \
+                or len(driver.find_elements(By.CLASS_NAME, "direct-plus-search-error-text")) > 0
 
-        search_box.submit() 
-        time.sleep(2)
+        self._wait_for(search_settled, self._timing.results_timeout)
 
-    def _email_and_extract_duns_results(self) -> list[dict]:
-        num_results_divs = len(self._driver.find_elements(By.CLASS_NAME, "search-results-card-container"))  # search results div
+    """
+    Email and extract every result card on the page, yielding each record as soon as it's done.
+    A card that raises is yielded as an error record (see iter_search), and any modal it left open is closed
+    params:
+        request_emails(bool): if False, only extract the cards (see iter_search)
+        request_ids(set[str]): if given, skip every card whose email_request_id isn't in it (see iter_email_requests)
+    """
+    def _iter_email_and_extract_duns_results(self, request_emails: bool = True, request_ids: set[str] | None = None):
+        if self._bulk_extraction:
+            with self._phase_timer.span("result_extraction", retry=self._try_number):
+                all_company_info = self._extract_all_company_info()
+            num_results_divs = len(all_company_info)
+        else:
+            all_company_info = None
+            num_results_divs = len(self._driver.find_elements(By.CLASS_NAME, "search-results-card-container"))  # search results div
         
-        all_duns_results = []
         self._logger.info(f"found {num_results_divs} results divs")
         for result_index in range(num_results_divs):
-            all_duns_results.append(self._email_and_extract_duns_result(result_index))
+            company_info = all_company_info[result_index] if all_company_info is not None else None
+            card_request_id = None
+            try:
+                if request_ids is not None:
+                    card = company_info if company_info is not None else self._extract_company_info(self._find_and_scroll_to_result_div(result_index))
+                    card_request_id = email_request_id(card)
+                    if card_request_id not in request_ids:
+                        continue
+                    request_ids = request_ids - {card_request_id}
+                if request_emails:
+                    duns_result = self._email_and_extract_duns_result(result_index, company_info)
+                else:
+                    duns_result = self._extract_duns_result(result_index, company_info)
+            except WebDriverException as e:
+                duns_result = self._card_error_record(result_index, company_info, e)
+                log_event(self._logger, "card_failed", f"Failed to process dnb result #{result_index+1}: {e!r}", level=logging.ERROR,
+                          result_index=result_index, error_kind=duns_result["error_kind"], card_error=duns_result["card_error"])
+                self._force_close_modal()
+
+            if card_request_id is not None:
+                duns_result.email_request_id = card_request_id
+            elif not request_emails and duns_result.email_success is None and duns_result.card_error is None:
+                duns_result.email_request_id = email_request_id(duns_result)
+            yield duns_result
 
-        return all_duns_results
+    """
+    Record standing in for a result card that couldn't be processed
+    """
+    def _card_error_record(self, result_index: int, company_info: dict | None, error: Exception) -> DunsResult:
+        duns_result = DunsResult(**{key: value for key, value in (company_info or {}).items() if key != "has_email_link"})
+        error_kind = classify_error(error)
+        duns_result.email_success = False
+        duns_result.result_index = result_index
+        duns_result.card_error = f"{type(error).__name__}: {str(error).strip()[:200]}"
+        duns_result.error_kind = error_kind.value if error_kind is not None else None
+        return duns_result
 
-    # Process an individual search result
-    def _email_and_extract_duns_result(self, result_index: int) -> None:
+    """
+    Process an individual search result
+    params:
+        result_index(int): position of the result card on the page
+        company_info(dict): the card's data, if it was already read by _extract_all_company_info. If None, read it from the card
+    """
+    def _email_and_extract_duns_result(self, result_index: int, company_info: dict | None = None) -> DunsResult:
         self._logger.info(f"Processing dnb result #{result_index+1}")
 
-        result_div = self._find_and_scroll_to_result_div(result_index)
-        duns_results = self._extract_company_info(result_div)
-        self._request_email_for_result(result_div)
-
-        success_modal = self._look_for_success_modal()
+        span_tags = {"result_index": result_index, "retry": self._try_number}
+        if company_info is None:
+            with self._phase_timer.span("result_extraction", **span_tags):
+                result_div = self._find_and_scroll_to_result_div(result_index)
+                duns_results = self._extract_company_info(result_div)
+            log_event(self._logger, "card_extracted", f"Extracted dnb result #{result_index+1}", result_index=result_index, duns_name=duns_results.duns_name)
+            with self._phase_timer.span("email_request", **span_tags):
+                self._request_email_for_result(result_div)
+        else:
+            duns_results = DunsResult(**{key: value for key, value in company_info.items() if key != "has_email_link"})
+            log_event(self._logger, "card_extracted", f"Extracted dnb result #{result_index+1}", result_index=result_index, duns_name=duns_results.duns_name)
+            if not company_info["has_email_link"]:
+                # Nothing to click, so don't touch the card at all
+                self._logger.warn(f"No Email D-U-N-S link on result #{result_index+1}")
+                duns_results.email_success = False
+                return duns_results
+            with self._phase_timer.span("email_request", **span_tags):
+                result_div = self._driver.execute_script(SCROLL_TO_CARD_SCRIPT, result_index)
+                self._request_email_for_result(result_div)
+
+        with self._phase_timer.span("success_modal", **span_tags):
+            success_modal = self._look_for_success_modal()
         if success_modal is not None:
-            self._logger.info(f"Succesfully triggered email for result #{result_index+1}")
-            duns_results["email_success"] = True
-            duns_results["time_email_requested"] = arrow.now() - timedelta(seconds=5)
+            duns_results.email_success = True
+            duns_results.time_email_requested = arrow.now() - timedelta(seconds=5)
+            log_event(self._logger, "email_requested", f"Succesfully triggered email for result #{result_index+1}",
+                      result_index=result_index, duns_name=duns_results.duns_name, email_success=True)
         else:
-            self._logger.warn(f"Could not trigger email for result #{result_index+1}")
-            time.sleep(1)  
-            duns_results["email_success"] = False
+            log_event(self._logger, "email_requested", f"Could not trigger email for result #{result_index+1}", level=logging.WARNING,
+                      result_index=result_index, duns_name=duns_results.duns_name, email_success=False)
+            self._clock.sleep(1)  
+            duns_results.email_success = False
 
-        # :). Sorry. Use retry decorator later
         try:
-            self._close_modal()
+            with self._phase_timer.span("modal_close", **span_tags):
+                self._close_modal()
         except (StaleElementReferenceException, ElementClickInterceptedException):
-            breakpoint()
+            # Used to drop into the debugger here, which hung unattended runs. The email went out either way
+            self._logger.warn(f"Could not click the modal closed for result #{result_index+1}. Closing it with a script")
+            self._force_close_modal()
+        return duns_results
+
+    """
+    Extract-only counterpart of _email_and_extract_duns_result, for the search stage of a two-stage run. Leaves
+    email_success unset, unless the card has no Email D-U-N-S link to request later
+    """
+    def _extract_duns_result(self, result_index: int, company_info: dict | None = None) -> DunsResult:
+        if company_info is None:
+            with self._phase_timer.span("result_extraction", result_index=result_index, retry=self._try_number):
+                duns_results = self._extract_company_info(self._find_and_scroll_to_result_div(result_index))
+        else:
+            duns_results = DunsResult(**{key: value for key, value in company_info.items() if key != "has_email_link"})
+            if not company_info["has_email_link"]:
+                duns_results.email_success = False
+        log_event(self._logger, "card_extracted", f"Extracted dnb result #{result_index+1}", result_index=result_index, duns_name=duns_results.duns_name)
         return duns_results
 
     """
@@ -193,31 +557,31 @@ class DBScraper:
     def _find_and_scroll_to_result_div(self, result_index: int) -> WebElement:
         all_results_divs = self._driver.find_elements(By.CLASS_NAME, "search-results-card-container")
         nth_results_div = all_results_divs[result_index]  # Find the nth result div
-        time.sleep(0.5)
+        self._clock.sleep(0.5)
         self._center_element(nth_results_div)  # Scroll results div into view
         return nth_results_div
 
     def _request_email_for_result(self, result_div: WebElement):
         email_duns_button = result_div.find_element(By.XPATH, ".//a[contains(text(), 'Email D-U-N-S')]")  # Find 'Email D-U-N-S number' element'
         email_duns_button.click()
-        time.sleep(1)
+        self._clock.sleep(1)
 
         email_request_div = self._driver.find_element(By.CLASS_NAME, "requestform")
         
         # Fill in the email form fields 
         email_request_div.find_element(By.NAME, 'FIRST_NAME').send_keys('Ally Boy') 
-        time.sleep(0.5)
+        self._clock.sleep(0.5)
         email_request_div.find_element(By.NAME, 'LAST_NAME').send_keys('Barese')
-        time.sleep(0.5)
+        self._clock.sleep(0.5)
         email_request_div.find_element(By.NAME, 'EMAIL_ADDRESS').send_keys('thomasapyncheon@gmail.com') 
-        time.sleep(0.5)
+        self._clock.sleep(0.5)
 
         # Submit email request form
         final_submit_button = email_request_div.find_element(By.CLASS_NAME, "requestform__submit")
         self._center_element(final_submit_button)
-        time.sleep(1)
+        self._clock.sleep(1)
         final_submit_button.click()
-        time.sleep(5)
+        self._clock.sleep(5)
 
         
     """
@@ -263,30 +627,49 @@ class DBScraper:
         # selenium.common.exceptions.ElementClickInterceptedException: Message: element click intercepted: Element <button class="requestform__close" aria-label="Request Form close button">...</button> is not clickable at point (12
         # 63, 351). Other element would receive the click: <span class="full-screen-loader"></span>
         #   (Session info: chrome=127.0.6533.120)Message: no such element: Unable to locate element: {"method":"css selector","selector":".full-screen-loader"}
-        time.sleep(4) # ???????????????
+        self._clock.sleep(4) # ???????????????
         close_button = self._driver.find_element(By.CLASS_NAME, "requestform__close")
         self._center_element(close_button)
         close_button.click()
-        time.sleep(1.5)
+        self._clock.sleep(1.5)
+
+    """
+    Close the email request modal from JavaScript, skipping the button's clickability and the loader overlay that can intercept clicks.
+    Best effort: gives up quietly if there's no modal or the page is gone
+    """
+    def _force_close_modal(self) -> None:
+        try:
+            self._driver.execute_script(FORCE_CLOSE_MODAL_SCRIPT)
+            self._clock.sleep(1.5)
+        except WebDriverException as e:
+            self._logger.warn(f"Could not force the modal closed: {e!r}")
 
     """
     Extract company data from result div
-    Return: dict containing company data
+    Return: DunsResult holding the company data
     """
-    def _extract_company_info(self, result_div: WebElement) -> dict:
+    def _extract_company_info(self, result_div: WebElement) -> DunsResult:
         company_name = result_div.find_element(By.CLASS_NAME, "name").text
         company_address = result_div.find_element(By.CLASS_NAME, "address").text
         company_phone = result_div.find_element(By.CLASS_NAME, "phone").text
         company_type = result_div.find_element(By.CLASS_NAME, "type").text
         company_status = result_div.find_element(By.CLASS_NAME, "status").text
 
-        return {
-            "duns_name": company_name,
-            "duns_address": company_address,
-            "duns_phone": company_phone,
-            "duns_type": company_type,
-            "company_status": company_status
-        }
+        return DunsResult(
+            duns_name=company_name,
+            duns_address=company_address,
+            duns_phone=company_phone,
+            duns_type=company_type,
+            company_status=company_status,
+        )
+
+
+    """
+    Extract company data from every result card on the page with a single script call
+    Return: list of dicts containing company data, in page order. Each also has a "has_email_link" flag
+    """
+    def _extract_all_company_info(self) -> list[dict]:
+        return self._driver.execute_script(EXTRACT_ALL_CARDS_SCRIPT)
 
 
     """
@@ -308,8 +691,5 @@ class DBScraper:
     Return true if that mesage appears
     """
     def _check_for_error(self) -> bool:
-        try:
-            error_elem = self._driver.find_element(By.CLASS_NAME, "direct-plus-search-error-text")
-            return True
-        except NoSuchElementException:
-            return False
+        with self._implicit_wait_disabled():
+            return len(self._driver.find_elements(By.CLASS_NAME, "direct-plus-search-error-text")) > 0
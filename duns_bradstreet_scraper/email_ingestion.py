@@ -0,0 +1,192 @@
+import csv
+import email
+import mailbox
+import os
+import re
+from email.parser import BytesHeaderParser
+from email.policy import default
+from email.utils import parsedate_to_datetime
+from multiprocessing import Pool
+
+import html2text
+
+
+EMAIL_FIELDS = ["sent_at", "company_name", "duns_code"]
+CHECKPOINT_PREFIX = "#csv_size "
+
+# D&B's notification reads like "...the D-U-N-S® Number for ACME LLC is 12-345-6789..."
+DUNS_NUMBER_RE = re.compile(r"D-U-N-S(?:®|\(R\))?\s*(?:Number)?.{0,120}?\b(\d{2}-?\d{3}-?\d{4})\b", re.IGNORECASE | re.DOTALL)
+COMPANY_NAME_RES = [
+    re.compile(r"(?:Company|Business)\s+Name\s*:?\s*\**\s*(.+?)\s*\**\s*$", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"D-U-N-S(?:®|\(R\))?\s*Number\s+for\s+\**(.+?)\**\s+is\b", re.IGNORECASE),
+]
+
+
+def _message_body_text(message) -> str:
+    html_part = message.get_body(preferencelist=("html",))
+    if html_part is not None:
+        converter = html2text.HTML2Text()
+        converter.ignore_links = True
+        converter.ignore_images = True
+        converter.body_width = 0  # don't wrap lines, so names and numbers stay on one line
+        return converter.handle(html_part.get_content())
+    text_part = message.get_body(preferencelist=("plain",))
+    return text_part.get_content() if text_part is not None else ""
+
+
+"""
+Pull sent_at, company_name and duns_code out of one raw D&B notification email
+Return: dict with EMAIL_FIELDS, or None if the message doesn't contain a DUNS number
+"""
+def parse_dnb_email(raw_message: bytes) -> dict | None:
+    message = email.message_from_bytes(raw_message, policy=default)
+    body = _message_body_text(message)
+
+    duns_match = DUNS_NUMBER_RE.search(body)
+    if duns_match is None:
+        return None
+
+    company_name = ""
+    for company_name_re in COMPANY_NAME_RES:
+        company_match = company_name_re.search(body)
+        if company_match:
+            company_name = company_match.group(1).strip()
+            break
+
+    sent_at = parsedate_to_datetime(message["Date"]).isoformat() if message["Date"] else ""
+    return {
+        "sent_at": sent_at,
+        "company_name": company_name,
+        "duns_code": duns_match.group(1).replace("-", ""),
+    }
+
+
+def _parse_keyed_message(keyed_message: tuple[str, bytes]) -> tuple[str, dict | None]:
+    message_id, raw_message = keyed_message
+    return message_id, parse_dnb_email(raw_message)
+
+
+def open_mailbox(path: str) -> mailbox.Mailbox:
+    if os.path.isdir(path):
+        return mailbox.Maildir(path, factory=None, create=False)
+    return mailbox.mbox(path, factory=None, create=False)
+
+
+"""
+Message-IDs that have already been ingested, persisted as one ID per line so re-runs only parse new mail
+
+Each batch of IDs ends with a checkpoint line holding the emails CSV's size once that batch's rows were flushed. A batch
+only counts once its checkpoint is written, and CSV rows past the last checkpoint are truncated away on the next run
+(see ingest_mailbox), so a crash between the two writes can't duplicate or lose rows. Files from before checkpoints
+count every ID
+"""
+class Watermark:
+    def __init__(self, path: str):
+        self.path = path
+        self.seen = set()
+        self.csv_size = None  # emails CSV size at the last checkpoint
+        if os.path.exists(path):
+            batch = set()
+            with open(path, "r") as infile:
+                for line in infile:
+                    line = line.rstrip("\n")
+                    if line.startswith(CHECKPOINT_PREFIX):
+                        self.seen.update(batch)
+                        batch = set()
+                        self.csv_size = int(line[len(CHECKPOINT_PREFIX):])
+                    elif line.strip():
+                        batch.add(line)
+            if self.csv_size is None:
+                self.seen = batch
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self.seen
+
+    """
+    Commit a batch of message IDs whose rows are already flushed to the emails CSV, which is now csv_size bytes
+    """
+    def extend(self, message_ids: list[str], csv_size: int) -> None:
+        with open(self.path, "a") as outfile:
+            for message_id in message_ids:
+                outfile.write(message_id + "\n")
+            outfile.write(f"{CHECKPOINT_PREFIX}{csv_size}\n")
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        self.seen.update(message_ids)
+        self.csv_size = csv_size
+
+
+"""
+Read just a stored message's header block, without loading its body
+"""
+def _read_headers(mbox: mailbox.Mailbox, key: str) -> bytes:
+    header_lines = []
+    message_file = mbox.get_file(key)
+    try:
+        for line in message_file:
+            if not line.strip():
+                break
+            header_lines.append(line)
+    finally:
+        message_file.close()
+    return b"".join(header_lines)
+
+
+def _new_messages(mailbox_path: str, watermark: Watermark):
+    mbox = open_mailbox(mailbox_path)
+    header_parser = BytesHeaderParser()
+    seen_this_run = set()
+    for key in mbox.iterkeys():
+        headers = header_parser.parsebytes(_read_headers(mbox, key))
+        message_id = (headers["Message-ID"] or f"<{key}@{os.path.basename(mailbox_path)}>").strip()
+        if message_id in watermark or message_id in seen_this_run:
+            continue
+        seen_this_run.add(message_id)
+        yield message_id, mbox.get_bytes(key)  # Only new messages get read in full. Bodies get parsed in the pool
+
+
+"""
+Make a batch's rows durable, then commit its message IDs to the watermark
+"""
+def _commit_batch(outfile, watermark: Watermark, message_ids: list[str]) -> None:
+    outfile.flush()
+    os.fsync(outfile.fileno())
+    watermark.extend(message_ids, os.fstat(outfile.fileno()).st_size)
+
+
+"""
+Convert new D&B emails in an mbox file or Maildir directory into rows of the emails CSV (sent_at, company_name, duns_code)
+
+Messages are streamed from the mailbox and parsed in a process pool. Only the headers of already-ingested messages are
+read. Rows and the watermark are flushed every `flush_every` messages, so an interrupted run loses little work and a
+re-run picks up where it stopped, dropping any rows written after the last watermark checkpoint
+Return: (messages parsed, rows written)
+"""
+def ingest_mailbox(mailbox_path: str, output_path: str = "dnb_emails.csv", watermark_path: str | None = None,
+                   processes: int | None = None, chunksize: int = 32, flush_every: int = 1000) -> tuple[int, int]:
+    watermark = Watermark(watermark_path or f"{output_path}.watermark")
+    if watermark.csv_size is not None and os.path.exists(output_path) and os.path.getsize(output_path) > watermark.csv_size:
+        os.truncate(output_path, watermark.csv_size)  # Rows from a batch whose watermark never got written
+
+    write_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+    num_parsed = 0
+    num_written = 0
+    with open(output_path, "a", newline="") as outfile, Pool(processes) as pool:
+        writer = csv.DictWriter(outfile, fieldnames=EMAIL_FIELDS)
+        if write_header:
+            writer.writeheader()
+
+        pending_ids = []
+        for message_id, row in pool.imap(_parse_keyed_message, _new_messages(mailbox_path, watermark), chunksize=chunksize):
+            num_parsed += 1
+            pending_ids.append(message_id)
+            if row is not None:
+                writer.writerow(row)
+                num_written += 1
+            if len(pending_ids) >= flush_every:
+                _commit_batch(outfile, watermark, pending_ids)
+                pending_ids = []
+
+        _commit_batch(outfile, watermark, pending_ids)
+
+    return num_parsed, num_written
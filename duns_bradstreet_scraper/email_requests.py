@@ -0,0 +1,73 @@
+import hashlib
+import heapq
+import re
+from dataclasses import dataclass, field
+
+from duns_bradstreet_scraper.fuzzy_matching import canonicalize_company_name
+
+
+ADDRESS_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+"""
+Dedup key for a DUNS email request: the card's canonical company name and its address with case, punctuation and
+spacing dropped. The same card found through two different searches (or listed twice on one page) has one key
+params:
+    card: DunsResult, or the dict EXTRACT_ALL_CARDS_SCRIPT returns for a card
+"""
+def email_request_key(card) -> tuple[str, str]:
+    name = canonicalize_company_name(card.get("duns_name") or "")
+    address = " ".join(ADDRESS_NON_ALNUM_RE.sub(" ", (card.get("duns_address") or "").lower()).split())
+    return name, address
+
+
+"""
+Return: stable id for a card's email request, the same across searches and runs
+"""
+def email_request_id(card) -> str:
+    return hashlib.sha1("|".join(email_request_key(card)).encode("utf-8")).hexdigest()[:16]
+
+
+"""
+One company to request a DUNS email for, and every case it's requested on behalf of
+    searches: (company_name, city, state) searches whose results list the company. Any of them can be re-run to reach its card
+    email_success: None until the email stage has tried it
+"""
+@dataclass
+class EmailRequest:
+    request_id: str
+    duns_name: str
+    duns_address: str | None = None
+    searches: list[tuple[str, str, str]] = field(default_factory=list)
+    case_numbers: list[str] = field(default_factory=list)
+    email_success: bool | None = None
+    time_email_requested: str | None = None
+
+
+"""
+Group pending requests into the searches the email stage re-runs. Every pending request on a search's results page is
+made from that one page, so searches are picked greedily by how many still-unplanned requests they cover
+Return: list of (search, requests to make from its results page), biggest first
+"""
+def plan_email_searches(requests: list[EmailRequest]) -> list[tuple[tuple[str, str, str], list[EmailRequest]]]:
+    by_search = {}
+    for request in requests:
+        for search in request.searches:
+            by_search.setdefault(tuple(search), []).append(request)
+
+    # Lazy greedy set cover: a search's count only ever drops, so re-check it when it reaches the top of the heap
+    heap = [(-len(search_requests), order, search) for order, (search, search_requests) in enumerate(by_search.items())]
+    heapq.heapify(heap)
+    planned_ids = set()
+    planned = []
+    while heap:
+        neg_count, order, search = heapq.heappop(heap)
+        remaining = [request for request in by_search[search] if request.request_id not in planned_ids]
+        if not remaining:
+            continue
+        if len(remaining) < -neg_count:
+            heapq.heappush(heap, (-len(remaining), order, search))
+            continue
+        planned.append((search, remaining))
+        planned_ids.update(request.request_id for request in remaining)
+    return planned
@@ -0,0 +1,189 @@
+import argparse
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+
+from duns_bradstreet_scraper.instrumentation import SEARCH_PHASES, _percentile
+
+
+# Event types the scraper and toy_doover.py emit. Anything logged without an event type is written as a plain "log" event
+EVENT_TYPES = [
+    "search_started",
+    "cache_hit",
+    "card_extracted",
+    "email_requested",
+    "card_failed",
+    "search_retry",
+    "server_error",
+    "search_done",
+    "case_done",
+]
+
+
+"""
+Log a structured event. The message is what shows up on the console; JsonFormatter also writes the event type and fields
+params:
+    logger(logging.Logger)
+    event(str): one of EVENT_TYPES
+    message(str): human-readable line
+    level(int): logging level
+    fields: event data, e.g. case_number, result_index, duration_s, outcome. Must be JSON-serializable (or str()-able)
+"""
+def log_event(logger: logging.Logger, event: str, message: str, level: int = logging.INFO, **fields) -> None:
+    logger.log(level, message, extra={"event": event, "event_fields": fields})
+
+
+"""
+Formats every record as one JSON object per line: ts (epoch seconds), time, level, event, message and the event's fields
+"""
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": record.created,
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "event": getattr(record, "event", "log"),
+            "message": record.getMessage(),
+        }
+        event |= getattr(record, "event_fields", {})
+        if record.exc_info:
+            event["exception"] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str)
+
+
+"""
+Route a logger's records through a queue, so the calling thread only pays for a queue put. A background thread hands
+the records to `handlers` (file writes, console output)
+params:
+    log_queue: queue to use. Pass a multiprocessing queue if forked worker processes log through the same logger
+Return: the started QueueListener. Call its stop() at the end of a run to flush what's left
+"""
+def start_queue_logging(logger: logging.Logger, handlers: list[logging.Handler], log_queue=None) -> logging.handlers.QueueListener:
+    log_queue = log_queue if log_queue is not None else queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+"""
+Keeps a bounded uniform sample of a stream of durations, so percentiles of an arbitrarily long log fit in memory
+"""
+class _Reservoir:
+    def __init__(self, size: int = 10_000, seed: int = 0):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sample = []
+        self._rng = random.Random(seed)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if len(self.sample) < self.size:
+            self.sample.append(value)
+        else:
+            slot = self._rng.randrange(self.count)
+            if slot < self.size:
+                self.sample[slot] = value
+
+
+"""
+Stream a JSONL event log and roll it up into run metrics
+params:
+    path(str): event log written through JsonFormatter
+    bucket_minutes(float): width of the time buckets for the error-rate timeline
+Return: dict with cases, cases_per_hour, case_outcomes, email success rate, an error-rate timeline and phase timings (seconds)
+"""
+def summarize_events(path: str, bucket_minutes: float = 60) -> dict:
+    bucket_seconds = bucket_minutes * 60
+    first_ts = last_ts = None
+    case_outcomes = {}
+    emails_requested = emails_succeeded = 0
+    timeline = {}  # bucket start -> [searches, server errors]
+    phases = {}
+    search_durations = _Reservoir()
+
+    with open(path, "r") as infile:
+        for line in infile:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # free-text lines from older runs
+            ts = event.get("ts")
+            if ts is None:
+                continue
+            first_ts = ts if first_ts is None else min(first_ts, ts)
+            last_ts = ts if last_ts is None else max(last_ts, ts)
+            bucket = timeline.setdefault(int(ts // bucket_seconds * bucket_seconds), [0, 0])
+
+            event_type = event.get("event")
+            if event_type == "case_done":
+                outcome = event.get("outcome", "unknown")
+                case_outcomes[outcome] = case_outcomes.get(outcome, 0) + 1
+            elif event_type == "email_requested":
+                emails_requested += 1
+                emails_succeeded += bool(event.get("email_success"))
+            elif event_type == "search_started":
+                bucket[0] += 1
+            elif event_type == "server_error":
+                bucket[1] += 1
+            elif event_type == "search_done":
+                if event.get("duration_s") is not None:
+                    search_durations.add(event["duration_s"])
+                for phase, duration in (event.get("phases") or {}).items():
+                    phases.setdefault(phase, _Reservoir()).add(duration)
+
+    num_cases = sum(case_outcomes.values())
+    elapsed_hours = (last_ts - first_ts) / 3600 if first_ts is not None and last_ts > first_ts else None
+    phase_order = [p for p in SEARCH_PHASES if p in phases] + [p for p in phases if p not in SEARCH_PHASES]
+    return {
+        "cases": num_cases,
+        "cases_per_hour": num_cases / elapsed_hours if elapsed_hours else None,
+        "case_outcomes": case_outcomes,
+        "emails_requested": emails_requested,
+        "email_success_rate": emails_succeeded / emails_requested if emails_requested else None,
+        "error_rate_timeline": [
+            {
+                "bucket_start": datetime.fromtimestamp(bucket_start, tz=timezone.utc).isoformat(),
+                "searches": searches,
+                "server_errors": errors,
+                "error_rate": errors / searches if searches else None,
+            }
+            for bucket_start, (searches, errors) in sorted(timeline.items()) if searches or errors
+        ],
+        "search_duration": _reservoir_stats(search_durations),
+        "phases": {phase: _reservoir_stats(phases[phase]) for phase in phase_order},
+    }
+
+
+def _reservoir_stats(reservoir: _Reservoir) -> dict | None:
+    if not reservoir.count:
+        return None
+    sample = sorted(reservoir.sample)
+    return {
+        "count": reservoir.count,
+        "total": reservoir.total,
+        "mean": reservoir.total / reservoir.count,
+        "p50": _percentile(sample, 50),
+        "p95": _percentile(sample, 95),
+        "max": reservoir.max,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Summarize a JSONL scrape event log: throughput, email success, error rate over time, phase timings")
+    parser.add_argument("path", help="Event log, e.g. toy_outputs/doover_events.jsonl")
+    parser.add_argument("--bucket-minutes", type=float, default=60, help="Width of the error-rate timeline buckets")
+    args = parser.parse_args(argv)
+
+    print(json.dumps(summarize_events(args.path, args.bucket_minutes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+STATE_NAMES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+    "District Of Columbia", "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas",
+    "Kentucky", "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
+    "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico", "New York",
+    "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania", "Puerto Rico", "Rhode Island",
+    "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Virgin Islands",
+    "Washington", "West Virginia", "Wisconsin", "Wyoming",
+]
+
+COMPANY_TYPES = ["Single Location", "Headquarters", "Branch"]
+
+
+"""
+Knobs for the fixture server. Latencies are in seconds, rates are probabilities in [0, 1]
+"""
+@dataclass
+class FixtureConfig:
+    page_latency: float = 0.2            # delay before serving the lookup page
+    search_latency: float = 0.5          # delay before answering a search
+    email_latency: float = 1.0           # delay before answering an email request (the loader is visible meanwhile)
+    min_results: int = 0
+    max_results: int = 6
+    server_error_rate: float = 0.0       # searches answered with the "unexpected system error" message
+    access_denied_rate: float = 0.0      # page loads answered with D&B's "Access Denied" page
+    email_failure_rate: float = 0.0      # email requests that never show the success state
+    show_cookie_popup: bool = True
+    seed: int = 0
+
+
+"""
+Counters for what the fixture has served, so benchmarks can cross-check the scraper's view of a run
+"""
+@dataclass
+class FixtureStats:
+    page_loads: int = 0
+    access_denied: int = 0
+    searches: int = 0
+    server_errors: int = 0
+    results_served: int = 0
+    email_requests: int = 0
+    email_failures: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def incr(self, **counts) -> None:
+        with self.lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+
+ACCESS_DENIED_PAGE = """<html><head><title>Access Denied</title></head>
+<body><h1>Access Denied</h1>
+<p>You don't have permission to access "http&#58;&#47;&#47;www&#46;dnb&#46;com&#47;duns&#45;number&#47;lookup&#46;html" on this server.</p>
+</body></html>"""
+
+
+LOOKUP_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<title>D-U-N-S Number Lookup</title>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  .full-screen-loader { position: fixed; top: 0; left: 0; width: 100%; height: 100%; background: rgba(255,255,255,0.6); z-index: 100; }
+  .requestform { position: fixed; top: 10%; left: 25%; width: 50%; background: white; border: 1px solid #999; padding: 20px; z-index: 50; }
+  .search-results-card-container { border: 1px solid #ccc; margin: 20px; padding: 10px; min-height: 150px; }
+  #truste-consent-required { position: fixed; bottom: 0; z-index: 200; }
+  .hidden { display: none; }
+</style>
+</head>
+<body>
+<h1>D-U-N-S Number Lookup</h1>
+__COOKIE_POPUP__
+<form id="lookup-form" class="search-form">
+  <select name="primary-reason-dropdown-select-component" id="primary-reason">
+    <option value="">Select a reason</option>
+    <option value="own">My company</option>
+    <option value="other">Other company</option>
+  </select>
+  <div class="container-search hidden" id="container-search">
+    <div class="search-form-row__row"><input type="text" name="businessName" placeholder="Business name"></div>
+    <div class="search-form-row__row"><input type="text" name="city" placeholder="City"></div>
+    <div class="search-form-row__row"><input type="text" name="zip" placeholder="ZIP"></div>
+    <div class="search-form-row__row"><select name="state"><option value="">State</option>__STATE_OPTIONS__</select></div>
+    <div class="search-form-row__row"><button type="submit" id="submit-search">Search</button></div>
+  </div>
+</form>
+<div id="search-error"></div>
+<div id="search-results"></div>
+<div id="modal-root"></div>
+
+<script>
+  var reasonSelect = document.getElementById("primary-reason");
+  reasonSelect.addEventListener("change", function () {
+    document.getElementById("container-search").classList.toggle("hidden", reasonSelect.value !== "other");
+  });
+
+  var cookiePopup = document.getElementById("truste-consent-required");
+  if (cookiePopup) {
+    cookiePopup.addEventListener("click", function () { cookiePopup.remove(); });
+  }
+
+  function showLoader() {
+    var loader = document.createElement("span");
+    loader.className = "full-screen-loader";
+    document.body.appendChild(loader);
+    return loader;
+  }
+
+  function escapeHtml(text) {
+    var div = document.createElement("div");
+    div.textContent = text;
+    return div.innerHTML;
+  }
+
+  function renderCard(result, index) {
+    var card = document.createElement("div");
+    card.className = "search-results-card-container";
+    card.innerHTML =
+      '<div class="name">' + escapeHtml(result.name) + '</div>' +
+      '<div class="address">' + escapeHtml(result.address) + '</div>' +
+      '<div class="phone">' + escapeHtml(result.phone) + '</div>' +
+      '<div class="type">' + escapeHtml(result.type) + '</div>' +
+      '<div class="status">' + escapeHtml(result.status) + '</div>' +
+      '<a href="#" class="email-duns-link">Email D-U-N-S Number</a>';
+    card.querySelector(".email-duns-link").addEventListener("click", function (event) {
+      event.preventDefault();
+      openRequestForm(result);
+    });
+    return card;
+  }
+
+  function openRequestForm(result) {
+    var modalRoot = document.getElementById("modal-root");
+    modalRoot.innerHTML =
+      '<div class="requestform">' +
+      '  <button class="requestform__close" aria-label="Request Form close button">X</button>' +
+      '  <div class="requestform__body">' +
+      '    <input type="text" name="FIRST_NAME"><input type="text" name="LAST_NAME"><input type="text" name="EMAIL_ADDRESS">' +
+      '    <button class="requestform__submit">Submit</button>' +
+      '  </div>' +
+      '</div>';
+    var form = modalRoot.querySelector(".requestform");
+    form.querySelector(".requestform__close").addEventListener("click", function () { modalRoot.innerHTML = ""; });
+    form.querySelector(".requestform__submit").addEventListener("click", function () {
+      var loader = showLoader();
+      var params = new URLSearchParams({
+        duns_name: result.name,
+        first_name: form.querySelector("[name=FIRST_NAME]").value,
+        last_name: form.querySelector("[name=LAST_NAME]").value,
+        email: form.querySelector("[name=EMAIL_ADDRESS]").value
+      });
+      fetch("/api/email-request?" + params.toString(), { method: "POST" })
+        .then(function (response) { return response.json(); })
+        .then(function (body) {
+          if (body.success) {
+            form.querySelector(".requestform__body").innerHTML =
+              '<div class="requestform__background--success">Your D-U-N-S Number is on its way</div>';
+          }
+        })
+        .finally(function () { loader.remove(); });
+    });
+  }
+
+  document.getElementById("lookup-form").addEventListener("submit", function (event) {
+    event.preventDefault();
+    var form = event.target;
+    var params = new URLSearchParams({
+      name: form.querySelector("[name=businessName]").value,
+      city: form.querySelector("[name=city]").value,
+      state: form.querySelector("[name=state]").value
+    });
+    document.getElementById("search-error").innerHTML = "";
+    document.getElementById("search-results").innerHTML = "";
+    var loader = showLoader();
+    fetch("/api/search?" + params.toString())
+      .then(function (response) { return response.json(); })
+      .then(function (body) {
+        if (body.error) {
+          document.getElementById("search-error").innerHTML =
+            '<p class="direct-plus-search-error-text">An unexpected system error has been encountered. If the issue persists please contact support@dnb.com</p>';
+          return;
+        }
+        var resultsDiv = document.getElementById("search-results");
+        body.results.forEach(function (result, index) { resultsDiv.appendChild(renderCard(result, index)); });
+      })
+      .finally(function () { loader.remove(); });
+  });
+</script>
+</body>
+</html>"""
+
+COOKIE_POPUP = '<button id="truste-consent-required">Accept cookies</button>'
+
+
+"""
+Fake but repeatable search results for a query. The same query always yields the same companies
+"""
+def generate_results(config: FixtureConfig, name: str, city: str, state: str) -> list[dict]:
+    rng = random.Random(f"{config.seed}|{name.lower()}|{city.lower()}|{state.lower()}")
+    num_results = rng.randint(config.min_results, config.max_results)
+    results = []
+    for result_index in range(num_results):
+        suffix = "" if result_index == 0 else f" {rng.choice(['LLC', 'INC', 'CORP', 'CO'])}"
+        results.append({
+            "name": f"{name.upper()}{suffix}" if result_index < 2 else f"{name.upper()} {rng.choice(['GROUP', 'SERVICES', 'HOLDINGS'])}{suffix}",
+            "address": f"{rng.randint(1, 9999)} {rng.choice(['Main', 'Oak', 'Elm', 'Park', 'Mill'])} St,{city or 'Springfield'},{state[:2].upper()} {rng.randint(10000, 99999)}-{rng.randint(1000, 9999)}",
+            "phone": "" if rng.random() < 0.3 else f"{rng.randint(200, 999)} {rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+            "type": rng.choice(COMPANY_TYPES),
+            "status": "Active" if rng.random() < 0.9 else "Inactive",
+        })
+    return results
+
+
+def _make_handler(config: FixtureConfig, stats: FixtureStats, rng: random.Random, rng_lock: threading.Lock):
+    state_options = "".join(f'<option value="{state}">{state}</option>' for state in STATE_NAMES)
+    lookup_page = LOOKUP_PAGE.replace("__STATE_OPTIONS__", state_options) \
+                             .replace("__COOKIE_POPUP__", COOKIE_POPUP if config.show_cookie_popup else "")
+
+    def roll(rate: float) -> bool:
+        with rng_lock:
+            return rng.random() < rate
+
+    class FixtureRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: str, content_type: str = "text/html; charset=utf-8") -> None:
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+            if url.path == "/api/search":
+                time.sleep(config.search_latency)
+                if roll(config.server_error_rate):
+                    stats.incr(searches=1, server_errors=1)
+                    self._send(200, json.dumps({"error": True}), "application/json")
+                    return
+                results = generate_results(config, query.get("name", ""), query.get("city", ""), query.get("state", ""))
+                stats.incr(searches=1, results_served=len(results))
+                self._send(200, json.dumps({"error": False, "results": results}), "application/json")
+                return
+
+            if url.path in ["/", "/duns-number/lookup.html"]:
+                time.sleep(config.page_latency)
+                if roll(config.access_denied_rate):
+                    stats.incr(page_loads=1, access_denied=1)
+                    self._send(403, ACCESS_DENIED_PAGE)
+                    return
+                stats.incr(page_loads=1)
+                self._send(200, lookup_page)
+                return
+
+            self._send(404, "not found", "text/plain")
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/api/email-request":
+                self._send(404, "not found", "text/plain")
+                return
+
+            time.sleep(config.email_latency)
+            failed = roll(config.email_failure_rate)
+            stats.incr(email_requests=1, email_failures=int(failed))
+            self._send(200, json.dumps({"success": not failed}), "application/json")
+
+    return FixtureRequestHandler
+
+
+"""
+Local HTTP stand-in for the D&B D-U-N-S lookup page, for running DBScraper without network access
+
+Usage:
+    with DNBFixtureServer(FixtureConfig(search_latency=1.0)) as server:
+        scraper = DBScraper(dnb_url=server.url)
+"""
+class DNBFixtureServer:
+    def __init__(self, config: FixtureConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FixtureConfig()
+        self.stats = FixtureStats()
+        handler = _make_handler(self.config, self.stats, random.Random(self.config.seed), threading.Lock())
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/duns-number/lookup.html"
+
+    def start(self) -> "DNBFixtureServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "DNBFixtureServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the D&B lookup page")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--search-latency", type=float, default=FixtureConfig.search_latency)
+    parser.add_argument("--email-latency", type=float, default=FixtureConfig.email_latency)
+    parser.add_argument("--server-error-rate", type=float, default=FixtureConfig.server_error_rate)
+    parser.add_argument("--access-denied-rate", type=float, default=FixtureConfig.access_denied_rate)
+    parser.add_argument("--email-failure-rate", type=float, default=FixtureConfig.email_failure_rate)
+    args = parser.parse_args()
+
+    server = DNBFixtureServer(FixtureConfig(
+        search_latency=args.search_latency,
+        email_latency=args.email_latency,
+        server_error_rate=args.server_error_rate,
+        access_denied_rate=args.access_denied_rate,
+        email_failure_rate=args.email_failure_rate,
+    ), port=args.port)
+    print(f"Serving D&B fixture at {server.url}")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
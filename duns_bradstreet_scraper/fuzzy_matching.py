@@ -0,0 +1,117 @@
+import math
+import re
+from collections import Counter
+
+
+NON_ALNUM_RE = re.compile(r"[^a-z0-9& ]+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Corporate suffixes that D&B and the NLRB data add or drop freely
+COMPANY_SUFFIXES = frozenset([
+    "inc", "incorporated", "llc", "llp", "lp", "ltd", "limited", "corp", "corporation", "co", "company",
+    "pc", "pllc", "plc", "the",
+])
+
+
+"""
+Lowercase, drop punctuation and corporate suffixes, collapse whitespace. "Fallon Service, LLC" -> "fallon service"
+"""
+def canonicalize_company_name(company_name: str) -> str:
+    name = NON_ALNUM_RE.sub(" ", company_name.lower().replace(".", ""))
+    tokens = [token for token in WHITESPACE_RE.split(name) if token and token not in COMPANY_SUFFIXES]
+    return " ".join(tokens)
+
+
+def char_ngrams(name: str, n: int = 3) -> frozenset[str]:
+    padded = f" {name} "
+    if len(padded) <= n:
+        return frozenset([padded])
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+"""
+Fuzzy company-name matcher backed by a blocking index
+
+Every indexed name is canonicalized and split into blocks (its tokens, or its character n-grams). A query is only scored
+against names that share at least min_shared_blocks blocks with it, so the work per query grows with the number of
+plausible candidates instead of the number of indexed names. Blocks shared by more than max_block_size names (e.g. "the",
+"services") carry no signal and are skipped.
+
+Scores are the Dice coefficient of the two names' character n-gram sets, in [0, 1]
+"""
+class FuzzyNameMatcher:
+    def __init__(self, names: list[str], threshold: float = 0.8, blocking: str = "token", ngram_size: int = 3,
+                 max_block_size: int = 500, min_shared_blocks: int = 1):
+        if blocking not in ["token", "ngram"]:
+            raise ValueError(f"Unknown blocking scheme '{blocking}'. Use 'token' or 'ngram'")
+        self.names = names
+        self.threshold = threshold
+        self.blocking = blocking
+        self.ngram_size = ngram_size
+        self.min_shared_blocks = min_shared_blocks
+
+        self._canonical_names = [canonicalize_company_name(name) for name in names]
+        self._ngrams = [char_ngrams(name, ngram_size) for name in self._canonical_names]
+
+        blocks = {}
+        for name_ind, canonical_name in enumerate(self._canonical_names):
+            for block in self._blocks(canonical_name, self._ngrams[name_ind]):
+                blocks.setdefault(block, []).append(name_ind)
+        self._blocks_index = {block: name_inds for block, name_inds in blocks.items() if len(name_inds) <= max_block_size}
+
+    def _blocks(self, canonical_name: str, ngrams: frozenset[str]):
+        if self.blocking == "token":
+            return set(canonical_name.split(" ")) if canonical_name else set()
+        return ngrams
+
+    """
+    Indexed names sharing enough blocks with the query to be worth scoring
+
+    With n-gram blocking, a name can only reach a Dice score of `threshold` if it shares at least threshold * |query n-grams| / 2
+    n-grams with the query. Shared n-grams that were pruned for being too common can't be counted, so each of the query's
+    pruned n-grams lowers that bound by one. Anything sharing fewer indexed n-grams is dropped before scoring
+    """
+    def candidates(self, name: str, threshold: float | None = None) -> list[int]:
+        threshold = self.threshold if threshold is None else threshold
+        canonical_name = canonicalize_company_name(name)
+        return self._candidates(canonical_name, char_ngrams(canonical_name, self.ngram_size), threshold)
+
+    def _candidates(self, canonical_name: str, query_ngrams: frozenset[str], threshold: float) -> list[int]:
+        min_shared_blocks = self.min_shared_blocks
+        if self.blocking == "ngram":
+            num_pruned = sum(ngram not in self._blocks_index for ngram in query_ngrams)
+            min_shared_blocks = max(min_shared_blocks, math.ceil(threshold * len(query_ngrams) / 2) - num_pruned)
+
+        shared_blocks = Counter()
+        for block in self._blocks(canonical_name, query_ngrams):
+            shared_blocks.update(self._blocks_index.get(block, ()))
+        return [name_ind for name_ind, count in shared_blocks.items() if count >= min_shared_blocks]
+
+    """
+    Score candidates against one query: one intersection of the query's n-gram set with each candidate's, precomputed
+    when the names were indexed
+    Return: list of (name index, score), same order as name_inds
+    """
+    def score_candidates(self, name: str, name_inds: list[int]) -> list[tuple[int, float]]:
+        return self._score(char_ngrams(canonicalize_company_name(name), self.ngram_size), name_inds)
+
+    def _score(self, query_ngrams: frozenset[str], name_inds: list[int]) -> list[tuple[int, float]]:
+        query_size = len(query_ngrams)
+        candidate_ngrams = self._ngrams
+        return [
+            (name_ind, 2 * len(query_ngrams & candidate_ngrams[name_ind]) / (query_size + len(candidate_ngrams[name_ind])))
+            for name_ind in name_inds
+        ]
+
+    """
+    Return: list of (name index, score) for indexed names scoring at least the threshold, best first
+    """
+    def match(self, name: str, threshold: float | None = None) -> list[tuple[int, float]]:
+        threshold = self.threshold if threshold is None else threshold
+        canonical_name = canonicalize_company_name(name)
+        query_ngrams = char_ngrams(canonical_name, self.ngram_size)  # shared by blocking and scoring
+        scored = self._score(query_ngrams, self._candidates(canonical_name, query_ngrams, threshold))
+        return sorted([(name_ind, score) for name_ind, score in scored if score >= threshold], key=lambda match: -match[1])
+
+    def match_many(self, names: list[str], threshold: float | None = None) -> list[list[tuple[int, float]]]:
+        return [self.match(name, threshold) for name in names]
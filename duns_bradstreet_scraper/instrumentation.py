@@ -0,0 +1,140 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+
+
+# Phases DBScraper reports timings for, in the order they happen during a search
+SEARCH_PHASES = [
+    "page_load",
+    "form_reset",
+    "form_fill",
+    "submit",
+    "result_extraction",
+    "email_request",
+    "success_modal",
+    "modal_close",
+]
+
+
+"""
+Nearest-rank percentile of an already sorted list of durations
+"""
+def _percentile(sorted_durations: list[float], pct: float) -> float:
+    if not sorted_durations:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_durations)), 1)
+    return sorted_durations[rank - 1]
+
+
+"""
+Records timing spans for each phase of a DBScraper search and rolls them up into per-phase latency histograms
+
+Every span is tagged with the result index (for per-card phases) and the search retry number, so slow retries and slow cards can be told apart
+
+clock should be the one the timed DBScraper runs on: anything with time() and perf_counter(), the time module by default.
+With simulation.SimClock, spans measure simulated time rather than the Python running the simulation
+"""
+class PhaseTimer:
+    enabled = True
+
+    def __init__(self, clock=time):
+        self.spans = []
+        self._durations = {}
+        self._clock = clock
+
+    @contextmanager
+    def span(self, phase: str, result_index: int | None = None, retry: int | None = None):
+        started_at = self._clock.time()
+        start = self._clock.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, self._clock.perf_counter() - start, started_at=started_at, result_index=result_index, retry=retry)
+
+    def record(self, phase: str, duration: float, started_at: float | None = None, result_index: int | None = None, retry: int | None = None) -> None:
+        self.spans.append({
+            "phase": phase,
+            "started_at": started_at,
+            "duration": duration,
+            "result_index": result_index,
+            "retry": retry,
+        })
+        self._durations.setdefault(phase, []).append(duration)
+
+    """
+    Return: {phase: {"count", "total", "mean", "p50", "p95", "p99", "max"}} with durations in seconds
+    """
+    def histograms(self) -> dict[str, dict]:
+        stats = {}
+        phases = [p for p in SEARCH_PHASES if p in self._durations] + [p for p in self._durations if p not in SEARCH_PHASES]
+        for phase in phases:
+            durations = sorted(self._durations[phase])
+            stats[phase] = {
+                "count": len(durations),
+                "total": sum(durations),
+                "mean": sum(durations) / len(durations),
+                "p50": _percentile(durations, 50),
+                "p95": _percentile(durations, 95),
+                "p99": _percentile(durations, 99),
+                "max": durations[-1],
+            }
+        return stats
+
+    """
+    Write one JSON object per recorded span
+    """
+    def dump_jsonl(self, path: str) -> None:
+        with open(path, "w") as outfile:
+            for span in self.spans:
+                outfile.write(json.dumps(span) + "\n")
+
+    """
+    Append the per-phase histogram rows to a JSONL file, one object per phase
+    """
+    def dump_histograms_jsonl(self, path: str) -> None:
+        with open(path, "a") as outfile:
+            for phase, stats in self.histograms().items():
+                outfile.write(json.dumps({"phase": phase} | stats) + "\n")
+
+    """
+    Return: fixed-width table of per-phase latencies (milliseconds), for printing at the end of a run
+    """
+    def summary_table(self) -> str:
+        header = f"{'phase':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>10}"
+        rows = [header, "-" * len(header)]
+        for phase, stats in self.histograms().items():
+            rows.append(
+                f"{phase:<20}{stats['count']:>8}"
+                f"{stats['p50'] * 1000:>10.0f}{stats['p95'] * 1000:>10.0f}{stats['p99'] * 1000:>10.0f}"
+                f"{stats['max'] * 1000:>10.0f}{stats['total']:>10.1f}"
+            )
+        return "\n".join(rows)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+"""
+Drop-in PhaseTimer that records nothing. DBScraper uses it when instrumentation is off
+"""
+class NullPhaseTimer:
+    enabled = False
+    spans = ()
+
+    def span(self, phase: str, result_index: int | None = None, retry: int | None = None):
+        return _NULL_SPAN
+
+    def record(self, *args, **kwargs) -> None:
+        pass
+
+    def histograms(self) -> dict[str, dict]:
+        return {}
@@ -0,0 +1,170 @@
+import re
+from functools import lru_cache
+
+
+# All patterns are compiled once at import. clean_employer_name used to rebuild them on every call
+DBA_RE = re.compile(r"(.*)d[^a-z]?b[^a-z]?a(.*)", re.IGNORECASE)
+
+# Cut the name at the first match of each of these, in order
+PARTITION_RES = [
+    re.compile(r",? inc\.?", re.IGNORECASE),  # inc
+    re.compile(r",? ?l\.?l\.?c\.?", re.IGNORECASE),  # llc
+    re.compile(r"a subsidiary", re.IGNORECASE),
+    re.compile(r"an affiliate", re.IGNORECASE),
+    re.compile(r"a division", re.IGNORECASE),
+    re.compile(r" -|- ", re.IGNORECASE),  # space dash or dash space
+    re.compile(r"/", re.IGNORECASE),
+
+    # I think DUNS shoudl be okay with "corp", "corporation", "etc.". They fuzzy search
+
+    # re.compile("co\.", re.IGNORECASE),  # co.
+    # re.compile(r"corporation", re.IGNORECASE),  # corporation
+    # re.compile("corp\.", re.IGNORECASE),  # corp.
+    # re.compile(r"company", re.IGNORECASE),  # company
+]
+
+# Then delete every match of these
+REPLACEMENT_RES = [
+    re.compile("-TV", re.IGNORECASE),
+    re.compile("ltd", re.IGNORECASE),
+    re.compile(r"\(.*?\)"),  # text in parentheses
+]
+
+NORMALIZED_FIELDS = ("clean_name_1", "clean_name_2", "truncated_name")
+
+# D&B truncates company-name searches, so long names get cut to this many characters
+SEARCH_CHAR_LIMIT = 30
+
+
+"""
+Strip corporate suffixes, subsidiary/division notes and parentheticals from a cleaned-up name. No d/b/a handling
+"""
+@lru_cache(maxsize=65536)
+def _strip_name(emp_name: str) -> str:
+    for partition_re in PARTITION_RES:
+        match = partition_re.search(emp_name)
+        if match:
+            emp_name = emp_name[:match.start()]
+
+    for replace_reg in REPLACEMENT_RES:
+        emp_name = replace_reg.sub("", emp_name)
+
+    # emp_name = emp_name.replace("&", "%26")
+
+    return emp_name.strip()
+
+
+"""
+Split "Legal Name d/b/a Trade Name" into ("Legal Name ", " Trade Name"). Names without a d/b/a come back as (name, "")
+"""
+def split_dba(emp_name: str) -> tuple[str, str]:
+    match = DBA_RE.search(emp_name)
+    if match is None:
+        return emp_name, ""
+    return match.groups()
+
+
+"""
+Clean an NLRB employer name for a D&B search. If the name has a d/b/a, the trade name (after the d/b/a) is used
+"""
+@lru_cache(maxsize=65536)
+def clean_employer_name(emp_name: str) -> str:
+    dba_match = DBA_RE.search(emp_name)
+    if dba_match:
+        emp_name = dba_match.groups()[1]
+    return _strip_name(emp_name)
+
+
+"""
+Cut a name down to whole words fitting in char_limit characters (counting one separator per word)
+"""
+@lru_cache(maxsize=65536)
+def truncate_employer_name(emp_name: str, char_limit: int = SEARCH_CHAR_LIMIT) -> str:
+    if len(emp_name) <= char_limit:
+        return emp_name
+
+    kept_words = []
+    truncated_length = 0
+    for word in emp_name.split(" "):
+        if truncated_length + len(word) + 1 > char_limit:  # If adding the next word would put the name over the character limit...
+            break
+        kept_words.append(word)
+        truncated_length += len(word) + 1
+    return " ".join(kept_words)
+
+
+"""
+Search-name variants for one employer name
+Return: dict with
+    clean_name_1: cleaned legal name (the part before any d/b/a)
+    clean_name_2: cleaned trade name (the part after a d/b/a), or "" if there isn't one
+    truncated_name: clean_name_1 cut to the D&B search limit
+"""
+def normalize_employer_name(emp_name: str, char_limit: int = SEARCH_CHAR_LIMIT) -> dict:
+    return dict(zip(NORMALIZED_FIELDS, _name_variants(emp_name, char_limit)))
+
+
+@lru_cache(maxsize=65536)
+def _name_variants(emp_name: str, char_limit: int) -> tuple[str, str, str]:
+    legal_name, trade_name = split_dba(emp_name)
+    clean_name_1 = _strip_name(legal_name)
+    clean_name_2 = _strip_name(trade_name) if trade_name else ""
+    return clean_name_1, clean_name_2, truncate_employer_name(clean_name_1, char_limit)
+
+
+"""
+Normalize a whole column of employer names. Repeated names are only normalized once
+Return: list of dicts (see normalize_employer_name), one per input name, in order
+"""
+def normalize_employer_names(emp_names, char_limit: int = SEARCH_CHAR_LIMIT) -> list[dict]:
+    seen = {}
+    results = []
+    for emp_name in emp_names:
+        variants = seen.get(emp_name)
+        if variants is None:
+            variants = seen[emp_name] = _name_variants(emp_name, char_limit)
+        results.append({"clean_name_1": variants[0], "clean_name_2": variants[1], "truncated_name": variants[2]})
+    return results
+
+
+"""
+Add clean_name_1, clean_name_2 and truncated_name to each row (in place), from the row's `column` employer name
+"""
+def normalize_rows(rows: list[dict], column: str = "company_name", char_limit: int = SEARCH_CHAR_LIMIT) -> list[dict]:
+    for row, variants in zip(rows, normalize_employer_names((row[column] for row in rows), char_limit)):
+        row.update(variants)
+    return rows
+
+
+def main(argv: list[str] | None = None):
+    import argparse
+    import contextlib
+    import csv
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description="Clean employer names for D&B searches: one JSON line per name, or a whole CSV column")
+    parser.add_argument("names", nargs="*", help="Employer names to normalize")
+    parser.add_argument("--input", help="CSV to normalize instead. clean_name_1, clean_name_2 and truncated_name columns are added")
+    parser.add_argument("--output", help="Where to write the normalized CSV (default: stdout)")
+    parser.add_argument("--column", default="company_name", help="Column holding the employer names")
+    parser.add_argument("--char-limit", type=int, default=SEARCH_CHAR_LIMIT)
+    args = parser.parse_args(argv)
+
+    if args.input is None:
+        for name, variants in zip(args.names, normalize_employer_names(args.names, args.char_limit)):
+            print(json.dumps({"company_name": name} | variants))
+        return
+
+    with open(args.input, "r") as infile:
+        reader = csv.DictReader(infile)
+        fieldnames = list(reader.fieldnames) + [field for field in NORMALIZED_FIELDS if field not in reader.fieldnames]
+        rows = normalize_rows(list(reader), args.column, args.char_limit)
+    with open(args.output, "w", newline="") if args.output else contextlib.nullcontext(sys.stdout) as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import threading
+from dataclasses import dataclass, field
+
+
+# Chrome's Network.setBlockedURLs only matches URLs, so resource types are blocked by their file extensions
+RESOURCE_TYPE_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*", "*.avif*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.m3u8*"],
+}
+
+# Analytics, tag managers and ad pixels the lookup page loads but the scraper never needs.
+# Leave TrustArc (consent.trustarc.com) alone: it draws the cookie popup we click through
+THIRD_PARTY_PATTERNS = [
+    "*googletagmanager.com*",
+    "*google-analytics.com*",
+    "*doubleclick.net*",
+    "*googleadservices.com*",
+    "*facebook.net*",
+    "*connect.facebook.com*",
+    "*hotjar.com*",
+    "*demdex.net*",
+    "*omtrdc.net*",
+    "*everesttech.net*",
+    "*linkedin.com/px*",
+    "*snap.licdn.com*",
+    "*bat.bing.com*",
+    "*qualtrics.com*",
+    "*6sc.co*",
+]
+
+
+"""
+What to keep the browser from downloading
+    resource_types: keys of RESOURCE_TYPE_PATTERNS
+    url_patterns: extra URL patterns, with * wildcards
+"""
+@dataclass
+class BlockList:
+    resource_types: list[str] = field(default_factory=lambda: ["image", "font", "media"])
+    url_patterns: list[str] = field(default_factory=lambda: list(THIRD_PARTY_PATTERNS))
+
+    def patterns(self) -> list[str]:
+        unknown_types = [resource_type for resource_type in self.resource_types if resource_type not in RESOURCE_TYPE_PATTERNS]
+        if unknown_types:
+            raise ValueError(f"Unknown resource types {unknown_types}. Pick from {list(RESOURCE_TYPE_PATTERNS)}")
+        type_patterns = [pattern for resource_type in self.resource_types for pattern in RESOURCE_TYPE_PATTERNS[resource_type]]
+        return list(dict.fromkeys(type_patterns + self.url_patterns))
+
+
+"""
+Blocks BlockList URLs in a Chrome session over the DevTools Protocol and counts what the session downloads and what it
+blocks. The driver has to be an undetected_chromedriver Chrome started with enable_cdp_events=True
+
+Counts accumulate until take_stats is called, so calling it once per search gives per-search numbers
+"""
+class NetworkMonitor:
+    def __init__(self, blocklist: BlockList):
+        self.blocklist = blocklist
+        self._lock = threading.Lock()  # CDP events arrive on undetected_chromedriver's reactor thread
+        self._reset()
+
+    def _reset(self) -> None:
+        self._requests = 0
+        self._bytes_transferred = 0
+        self._blocked = 0
+        self._failed = 0
+
+    def attach(self, driver) -> None:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocklist.patterns()})
+        driver.add_cdp_listener("Network.loadingFinished", self._on_loading_finished)
+        driver.add_cdp_listener("Network.loadingFailed", self._on_loading_failed)
+
+    def _on_loading_finished(self, message: dict) -> None:
+        params = message.get("params", message)
+        with self._lock:
+            self._requests += 1
+            self._bytes_transferred += int(params.get("encodedDataLength", 0))
+
+    def _on_loading_failed(self, message: dict) -> None:
+        params = message.get("params", message)
+        with self._lock:
+            if params.get("blockedReason"):
+                self._blocked += 1
+            else:
+                self._failed += 1
+
+    """
+    Return: counts since the last call, as a dict of requests, bytes_transferred, blocked and failed
+    """
+    def take_stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "requests": self._requests,
+                "bytes_transferred": self._bytes_transferred,
+                "blocked": self._blocked,
+                "failed": self._failed,
+            }
+            self._reset()
+        return stats
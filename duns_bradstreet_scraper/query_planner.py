@@ -0,0 +1,60 @@
+import copy
+from dataclasses import dataclass, field
+
+
+"""
+One D&B search and every worklist case it answers
+"""
+@dataclass
+class PlannedQuery:
+    company_name: str
+    city: str
+    state: str
+    case_inds: list[int] = field(default_factory=list)
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return (self.company_name, self.city, self.state)
+
+
+"""
+Group cases into unique (name, city, state) searches, so each one only hits D&B once per worklist
+
+params:
+    cases: (case index, case dict) pairs to plan
+    name_field(str): case field holding the name to search for ("clean_name_1" or "clean_name_2")
+    state_initial_map(dict): state abbreviation -> state name as D&B's selector shows it
+Return: (queries, unsearchable case indexes)
+    queries are ordered by how many cases they answer (most first), then by worklist position
+    unsearchable cases have no name in name_field or no known state
+"""
+def plan_queries(cases, name_field: str, state_initial_map: dict[str, str]) -> tuple[list[PlannedQuery], list[int]]:
+    queries = {}
+    unsearchable = []
+    for case_ind, case in cases:
+        company_name = case[name_field]
+        company_state = state_initial_map.get(case["emp_1_state"])
+        if not company_name or not company_state:
+            unsearchable.append(case_ind)
+            continue
+
+        key = (company_name, case["emp_1_city"], company_state)
+        if key not in queries:
+            queries[key] = PlannedQuery(*key)
+        queries[key].case_inds.append(case_ind)
+
+    ordered = sorted(queries.values(), key=lambda query: (-len(query.case_inds), query.case_inds[0]))
+    return ordered, unsearchable
+
+
+"""
+Copy a query's result records onto one case
+params:
+    in_place(bool): tag the records themselves instead of copies. Only safe when no other case shares them
+"""
+def fan_out(duns_results: list, case_number: str, from_retry: bool, in_place: bool = False) -> list:
+    case_results = duns_results if in_place else [copy.copy(result) for result in duns_results]
+    for result in case_results:
+        result["case_number"] = case_number
+        result["from_retry"] = from_retry
+    return case_results
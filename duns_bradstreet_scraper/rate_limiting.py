@@ -0,0 +1,65 @@
+import multiprocessing
+import time
+
+
+"""
+Token bucket shared by every process it is handed to (as a Process argument), capping the combined request rate
+
+params:
+    rate(float): tokens added per second, i.e. the steady-state request ceiling across all processes
+    burst(float): most tokens the bucket can hold, i.e. how many requests may go out back to back after a quiet spell
+    mp_context: multiprocessing context to allocate the shared state from. Must match the context the workers are started with
+"""
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1, mp_context=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        mp_context = mp_context or multiprocessing.get_context()
+        self.rate = rate
+        self.burst = burst
+        self._lock = mp_context.Lock()
+        self._tokens = mp_context.Value("d", burst, lock=False)
+        self._last_refill = mp_context.Value("d", time.monotonic(), lock=False)
+
+    def _refill(self, now: float) -> None:
+        if now <= self._last_refill.value:  # paused
+            return
+        elapsed = now - self._last_refill.value
+        self._tokens.value = min(self.burst, self._tokens.value + elapsed * self.rate)
+        self._last_refill.value = now
+
+    """
+    Take a token without waiting
+    Return: True if one was available
+    """
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens.value >= 1:
+                self._tokens.value -= 1
+                return True
+            return False
+
+    """
+    Block until a token is available, then take it
+    Return: seconds spent waiting
+    """
+    def acquire(self) -> float:
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens.value >= 1:
+                    self._tokens.value -= 1
+                    return now - start
+                wait = max(self._last_refill.value - now, 0) + (1 - self._tokens.value) / self.rate
+            time.sleep(wait)
+
+    """
+    Hand out no tokens for the next `seconds`, in every process sharing the bucket. Extends, never shortens, a pause in progress
+    """
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._tokens.value = 0
+            self._last_refill.value = max(self._last_refill.value, time.monotonic() + seconds)
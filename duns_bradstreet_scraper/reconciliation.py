@@ -0,0 +1,276 @@
+import argparse
+import csv
+import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from duns_bradstreet_scraper.fuzzy_matching import FuzzyNameMatcher
+from duns_bradstreet_scraper.records import DunsResult, EmailRecord, iter_records
+
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+"""
+Key used to bucket emails and log entries. Matches check_for_email_log_match's case-insensitive comparison,
+but also ignores runs of whitespace
+"""
+def normalize_company_name(company_name: str) -> str:
+    return WHITESPACE_RE.sub(" ", company_name).strip().lower()
+
+
+"""
+ISO strings from the CSVs, or datetimes from typed tables (see columnar.py)
+"""
+def parse_timestamp(timestamp: str | datetime) -> float:
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+"""
+The scrape logs store email_success as the strings "True"/"False"
+"""
+def parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() == "true"
+
+
+"""
+Emails bucketed by normalized company name. Each bucket keeps its send times as a sorted list of epoch seconds,
+with the matching email rows in the same order
+"""
+class EmailIndex:
+    def __init__(self, emails: list[dict]):
+        self.emails = emails
+        buckets = {}
+        for email_ind, email in enumerate(emails):
+            key = normalize_company_name(email["company_name"])
+            buckets.setdefault(key, []).append((parse_timestamp(email["sent_at"]), email_ind))
+
+        self.sent_at = {}
+        self.email_inds = {}
+        for key, entries in buckets.items():
+            entries.sort()
+            self.sent_at[key] = [sent_at for sent_at, _ in entries]
+            self.email_inds[key] = [email_ind for _, email_ind in entries]
+
+    def keys(self):
+        return self.sent_at.keys()
+
+
+"""
+Match successful log entries to D&B emails
+
+Log entries and emails are joined on normalized company name. Within a name, both sides are sorted by time and merged:
+each log entry takes the unused email nearest to its time_email_requested, as long as the email was sent no more than
+window_before seconds before and window_after seconds after the request. Each email is matched at most once.
+
+If fuzzy_threshold is set, log entries with no exact-name email in their window fall back to emails whose names score at
+least fuzzy_threshold against the log entry's name (see FuzzyNameMatcher)
+
+Log entries that share one email request were all answered by a single email, so they're matched once and share it.
+That's every case a search's results were fanned out to (same card and request time, see query_planner.fan_out), and in
+two-stage runs every case an email request serves (same email_request_id and request time, see email_requests.py)
+
+Return: (matches, unmatched_log_inds, unmatched_email_inds)
+    matches: list of (log_ind, email_ind, seconds from request to email, name match score). Exact name matches score 1.0
+"""
+def reconcile(duns_log: list[dict], emails: list[dict], window_before: float = 120, window_after: float = 3600,
+              email_index: EmailIndex | None = None, fuzzy_threshold: float | None = None,
+              fuzzy_blocking: str = "token") -> tuple[list[tuple[int, int, float, float]], list[int], list[int]]:
+    email_index = email_index or EmailIndex(emails)
+
+    email_keys = list(email_index.keys())
+    name_matcher = None
+    if fuzzy_threshold is not None:
+        name_matcher = FuzzyNameMatcher(email_keys, threshold=fuzzy_threshold, blocking=fuzzy_blocking)
+
+    # Successful log entries, bucketed like the emails and sorted by request time
+    log_buckets = {}
+    shared_requests = {}  # email request -> log_inds, first one matched on behalf of all
+    for log_ind, log_entry in enumerate(duns_log):
+        if not parse_bool(log_entry.get("email_success")) or not log_entry.get("time_email_requested"):
+            continue
+        if log_entry.get("email_request_id"):
+            request_key = (log_entry["email_request_id"], log_entry["time_email_requested"])
+        else:
+            request_key = (log_entry.get("duns_name"), log_entry.get("duns_address"), log_entry["time_email_requested"])
+        sharing_log_inds = shared_requests.setdefault(request_key, [])
+        sharing_log_inds.append(log_ind)
+        if len(sharing_log_inds) > 1:
+            continue
+        key = normalize_company_name(log_entry["duns_name"])
+        log_buckets.setdefault(key, []).append((parse_timestamp(log_entry["time_email_requested"]), log_ind))
+    sharing = {log_inds[0]: log_inds[1:] for log_inds in shared_requests.values() if len(log_inds) > 1}
+
+    matches = []
+    unmatched_log_inds = []
+    used_email_inds = set()
+    for key, log_entries in log_buckets.items():
+        log_entries.sort()
+        fuzzy_keys = None  # only looked up if some entry in this bucket needs them
+
+        for requested_at, log_ind in log_entries:
+            best = _nearest_unused_email(email_index, key, requested_at, window_before, window_after, used_email_inds)
+            score = 1.0
+
+            if best is None and name_matcher is not None:
+                if fuzzy_keys is None:
+                    fuzzy_keys = [(email_keys[key_ind], key_score) for key_ind, key_score in name_matcher.match(key)
+                                  if email_keys[key_ind] != key]
+                for fuzzy_key, key_score in fuzzy_keys:
+                    candidate = _nearest_unused_email(email_index, fuzzy_key, requested_at, window_before, window_after, used_email_inds)
+                    if candidate is not None and (best is None or abs(candidate[1]) < abs(best[1])):
+                        best, score = candidate, key_score
+
+            if best is None:
+                unmatched_log_inds += [log_ind, *sharing.get(log_ind, [])]
+                continue
+            used_email_inds.add(best[0])
+            matches += [(sharing_log_ind, best[0], best[1], score) for sharing_log_ind in [log_ind, *sharing.get(log_ind, [])]]
+
+    unmatched_email_inds = [email_ind for email_ind in range(len(emails)) if email_ind not in used_email_inds]
+    matches.sort()
+    unmatched_log_inds.sort()
+    return matches, unmatched_log_inds, unmatched_email_inds
+
+
+"""
+Return: (email_ind, seconds from request to email) for the unused email in bucket `key` sent nearest to requested_at
+within the window, or None
+"""
+def _nearest_unused_email(email_index: EmailIndex, key: str, requested_at: float, window_before: float, window_after: float,
+                          used_email_inds: set[int]) -> tuple[int, float] | None:
+    sent_at = email_index.sent_at.get(key)
+    if not sent_at:
+        return None
+    email_inds = email_index.email_inds[key]
+    lo = bisect_left(sent_at, requested_at - window_before)
+    hi = bisect_right(sent_at, requested_at + window_after)
+
+    best = None
+    for pos in range(lo, hi):
+        if email_inds[pos] in used_email_inds:
+            continue
+        delta = sent_at[pos] - requested_at
+        if best is None or abs(delta) < abs(best[1]):
+            best = (email_inds[pos], delta)
+        elif delta > abs(best[1]):
+            break  # sorted by time, so everything after this is further away
+    return best
+
+
+"""
+The scrape log with duns_number, email_sent_at, email_delay_s and match_score added to every matched entry
+"""
+def join_reconciliation(duns_log: list[dict], emails: list[dict], matches: list[tuple[int, int, float, float]]) -> list[dict]:
+    matched_emails = {log_ind: (email_ind, delta, score) for log_ind, email_ind, delta, score in matches}
+    joined_log = []
+    for log_ind, log_entry in enumerate(duns_log):
+        joined = dict(log_entry)
+        if log_ind in matched_emails:
+            email_ind, delta, score = matched_emails[log_ind]
+            joined |= {
+                "duns_number": emails[email_ind]["duns_code"],
+                "email_sent_at": emails[email_ind]["sent_at"],
+                "email_delay_s": round(delta, 1),
+                "match_score": round(score, 3),
+            }
+        joined_log.append(joined)
+    return joined_log
+
+
+"""
+Write the scrape log with a duns_number column filled in for every matched entry, plus a report of everything left unmatched
+"""
+def write_reconciliation(duns_log: list[dict], emails: list[dict], matches: list[tuple[int, int, float, float]],
+                         unmatched_log_inds: list[int], unmatched_email_inds: list[int],
+                         output_path: str, unmatched_path: str) -> None:
+    # Records leave None fields out of their keys, so any one row can be missing columns. Take every row's, in the
+    # record type's field order, then extra columns as first seen
+    seen_fields = dict.fromkeys(field for log_entry in duns_log for field in log_entry)
+    record_fields = getattr(type(duns_log[0]), "FIELDS", ()) if duns_log else ()
+    log_fields = [field for field in record_fields if field in seen_fields] + [field for field in seen_fields if field not in record_fields]
+    with open(output_path, "w", newline="") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=log_fields + ["duns_number", "email_sent_at", "email_delay_s", "match_score"], extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(join_reconciliation(duns_log, emails, matches))
+
+    with open(unmatched_path, "w", newline="") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=["source", "row", "company_name", "timestamp", "case_number", "duns_code"])
+        writer.writeheader()
+        for log_ind in unmatched_log_inds:
+            log_entry = duns_log[log_ind]
+            writer.writerow({
+                "source": "log",
+                "row": log_ind,
+                "company_name": log_entry["duns_name"],
+                "timestamp": log_entry["time_email_requested"],
+                "case_number": log_entry.get("case_number", ""),
+            })
+        for email_ind in unmatched_email_inds:
+            email = emails[email_ind]
+            writer.writerow({
+                "source": "email",
+                "row": email_ind,
+                "company_name": email["company_name"],
+                "timestamp": email["sent_at"],
+                "duns_code": email["duns_code"],
+            })
+
+
+"""
+Read a CSV, or a typed Parquet/Arrow table written by columnar.py, as a list of records
+params:
+    record_type: DunsResult for scrape logs, EmailRecord for emails (see records.py)
+"""
+def load_records(path: str, record_type: type = DunsResult) -> list:
+    if path.endswith(".csv"):
+        return list(iter_records(path, record_type))
+
+    from duns_bradstreet_scraper.columnar import read_records
+
+    return [record_type.from_dict(row) for row in read_records(path)]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Match D&B emails to scrape log entries and attach their DUNS numbers")
+    parser.add_argument("--log", default="toy_outputs/duns_company_data.csv", help="Scrape log written by the scraper")
+    parser.add_argument("--emails", default="dnb_emails.csv", help="CSV of D&B emails (sent_at, company_name, duns_code)")
+    parser.add_argument("--output", default="toy_outputs/duns_log_with_duns_numbers.csv")
+    parser.add_argument("--unmatched", default="toy_outputs/unmatched_emails_and_log_entries.csv")
+    parser.add_argument("--window-before", type=float, default=120, help="Seconds an email may precede its request (clock skew)")
+    parser.add_argument("--window-after", type=float, default=3600, help="Seconds an email may arrive after its request")
+    parser.add_argument("--fuzzy-threshold", type=float, default=None,
+                        help="Fall back to fuzzy company-name matches scoring at least this much (0-1). Exact matches only if unset")
+    parser.add_argument("--fuzzy-blocking", choices=["token", "ngram"], default="token")
+    parser.add_argument("--mailbox", default=None,
+                        help="mbox file or Maildir of D&B emails. If given, new messages are appended to --emails before matching")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes for parsing emails")
+    parser.add_argument("--typed-output", default=None,
+                        help="Also write the joined log as a typed table (.parquet or .arrow, needs pyarrow)")
+    args = parser.parse_args(argv)
+
+    if args.mailbox:
+        from duns_bradstreet_scraper.email_ingestion import ingest_mailbox
+
+        num_parsed, num_written = ingest_mailbox(args.mailbox, output_path=args.emails, processes=args.processes)
+        print(f"Parsed {num_parsed} new emails from {args.mailbox}, added {num_written} rows to {args.emails}")
+
+    duns_log = load_records(args.log, DunsResult)
+    emails = load_records(args.emails, EmailRecord)
+
+    matches, unmatched_log_inds, unmatched_email_inds = reconcile(
+        duns_log, emails, window_before=args.window_before, window_after=args.window_after,
+        fuzzy_threshold=args.fuzzy_threshold, fuzzy_blocking=args.fuzzy_blocking)
+    write_reconciliation(duns_log, emails, matches, unmatched_log_inds, unmatched_email_inds, args.output, args.unmatched)
+    if args.typed_output:
+        from duns_bradstreet_scraper.columnar import RECONCILED_SCHEMA, write_records
+
+        write_records(join_reconciliation(duns_log, emails, matches), args.typed_output, RECONCILED_SCHEMA)
+
+    num_successful = len(matches) + len(unmatched_log_inds)
+    print(f"Matched {len(matches)}/{num_successful} successful log entries to emails. "
+          f"{len(unmatched_email_inds)}/{len(emails)} emails unmatched. Wrote {args.output} and {args.unmatched}")
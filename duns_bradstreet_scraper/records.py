@@ -0,0 +1,159 @@
+import csv
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+
+
+"""
+Base for the record types below: a slotted dataclass that also reads like the dict rows it replaces
+(record["duns_name"], record.get("card_error"), "card_error" in record, dict(record), DictWriter rows)
+
+A field set to None counts as absent, the way optional keys used to be missing from the dicts. Columns a record type
+doesn't know about are kept in `extra`, so CSVs round-trip without losing anything
+"""
+class _Record(Mapping):
+    __slots__ = ()
+    FIELDS: tuple[str, ...] = ()
+    FIELD_SET: frozenset = frozenset()
+
+    def __getitem__(self, key: str):
+        if key in self.FIELD_SET:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key in self.FIELD_SET:
+            setattr(self, key, value)
+        elif self.extra is None:
+            self.extra = {key: value}
+        else:
+            self.extra[key] = value
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if getattr(self, name) is not None:
+                yield name
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __or__(self, other: Mapping) -> dict:
+        return dict(self) | dict(other)
+
+    @classmethod
+    def from_dict(cls, row: Mapping) -> "_Record":
+        known = {key: value for key, value in row.items() if key in cls.FIELD_SET}
+        extra = {key: value for key, value in row.items() if key not in cls.FIELD_SET and key != "extra"}
+        return cls(**known, extra=extra or None)
+
+
+def _record(cls):
+    cls = dataclass(slots=True)(cls)
+    cls.FIELDS = tuple(field.name for field in fields(cls) if field.name != "extra")
+    cls.FIELD_SET = frozenset(cls.FIELDS)
+    return cls
+
+
+"""
+One worklist row (duns_to_scrape). Values are kept as read from the CSV (strings), except scrape_status once the run updates it
+"""
+@_record
+class Case(_Record):
+    case_number: str | None = None
+    company_name: str | None = None
+    clean_name_1: str | None = None
+    clean_name_2: str | None = None
+    emp_1_city: str | None = None
+    emp_1_state: str | None = None
+    emp_1_zip: str | None = None
+    scrape_status: str | int | None = None
+    extra: dict | None = None
+
+
+"""
+One D&B result card, as the scraper yields it and duns_log stores it. The scraper sets the search term, and the scraping
+loop sets case_number/from_retry, on the record itself. email_request_id is only set in two-stage runs (see email_requests.py)
+"""
+@_record
+class DunsResult(_Record):
+    duns_name: str | None = None
+    duns_address: str | None = None
+    duns_phone: str | None = None
+    duns_type: str | None = None
+    company_status: str | None = None
+    email_success: bool | str | None = None
+    time_email_requested: object = None  # arrow.Arrow from the scraper, ISO string from a CSV
+    company_name_search_term: str | None = None
+    case_number: str | None = None
+    from_retry: bool | str | None = None
+    result_index: int | None = None
+    card_error: str | None = None
+    error_kind: str | None = None
+    email_request_id: str | None = None
+    extra: dict | None = None
+
+
+"""
+One D&B email (dnb_emails.csv)
+"""
+@_record
+class EmailRecord(_Record):
+    sent_at: str | None = None
+    company_name: str | None = None
+    duns_code: str | None = None
+    extra: dict | None = None
+
+
+"""
+Stream a CSV as records, one row at a time. Rows are mapped onto the record's fields by column position, without
+building a dict per row
+"""
+def iter_records(path: str, record_type: type[_Record]):
+    with open(path, "r", newline="") as infile:
+        reader = csv.reader(infile)
+        header = next(reader, None)
+        if header is None:
+            return
+        positions = [record_type.FIELDS.index(name) if name in record_type.FIELD_SET else None for name in header]
+        extra_columns = [(column, name) for column, (name, position) in enumerate(zip(header, positions)) if position is None]
+        num_fields = len(record_type.FIELDS)
+
+        for row in reader:
+            values = [None] * num_fields
+            for value, position in zip(row, positions):
+                if position is not None:
+                    values[position] = value
+            extra = {name: row[column] for column, name in extra_columns if column < len(row)} if extra_columns else None
+            yield record_type(*values, extra=extra)
+
+
+def iter_cases(path: str):
+    return iter_records(path, Case)
+
+
+def iter_duns_results(path: str):
+    return iter_records(path, DunsResult)
+
+
+def iter_emails(path: str):
+    return iter_records(path, EmailRecord)
+
+
+"""
+Stream records (or dicts) to a CSV. Absent fields are written as empty strings
+Return: number of rows written
+"""
+def write_records_csv(path: str, records, fieldnames: list[str]) -> int:
+    num_rows = 0
+    with open(path, "w", newline="") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(fieldnames)
+        for record in records:
+            writer.writerow(["" if (value := record.get(name)) is None else value for name in fieldnames])
+            num_rows += 1
+    return num_rows
@@ -0,0 +1,138 @@
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+
+from selenium.common.exceptions import (ElementClickInterceptedException, ElementNotInteractableException, NoSuchElementException,
+                                        StaleElementReferenceException, TimeoutException, WebDriverException)
+
+
+class ErrorKind(Enum):
+    TRANSIENT_DOM = "transient_dom"  # element missing, stale or covered. Usually fine on the next try
+    PAGE_LOAD     = "page_load"      # the page or the browser didn't respond
+    SERVER_ERROR  = "server_error"   # D&B's "unexpected system error" message
+    ACCESS_DENIED = "access_denied"  # D&B's "Access Denied" page
+
+
+TRANSIENT_DOM_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException, ElementClickInterceptedException, ElementNotInteractableException)
+
+
+"""
+Sort an exception from a search attempt into an ErrorKind
+Exceptions can name their own kind with a `kind` class attribute (the DNB exceptions do). Anything else from Selenium is a
+transient DOM problem or a page-load failure
+Return: the ErrorKind, or None if the exception isn't one a search should expect
+"""
+def classify_error(exc: BaseException) -> ErrorKind | None:
+    kind = getattr(exc, "kind", None)
+    if isinstance(kind, ErrorKind):
+        return kind
+    if isinstance(exc, TRANSIENT_DOM_EXCEPTIONS):
+        return ErrorKind.TRANSIENT_DOM
+    if isinstance(exc, (TimeoutException, WebDriverException)):
+        return ErrorKind.PAGE_LOAD
+    return None
+
+
+"""
+Which errors a search retries, how often, and how long it waits in between
+
+Waits grow exponentially (base_delay, 2x, 4x, ... up to max_delay) and are randomly shortened by up to `jitter` of their length,
+so parallel scrapers that fail together don't retry in lockstep
+"""
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    jitter: float = 0.5
+    retry_kinds: frozenset = field(default_factory=lambda: frozenset([ErrorKind.TRANSIENT_DOM, ErrorKind.PAGE_LOAD]))
+
+    def should_retry(self, kind: ErrorKind | None, attempt: int) -> bool:
+        return kind in self.retry_kinds and attempt < self.max_attempts
+
+    """
+    Seconds to wait after failed attempt number `attempt` (1-based)
+    """
+    def delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+"""
+Pauses a run when too many recent searches end in D&B server errors
+
+Keeps the outcomes of searches from the last window_seconds. Once at least min_searches are in the window and the share of
+failures reaches failure_rate, the breaker opens for cooldown_seconds. After that it lets searches through again ("half open"):
+the next success closes it and clears the window, the next failure reopens it for twice as long (up to max_cooldown_seconds)
+
+clock and sleep default to the real ones. Pass a simulated clock's (see simulation.py) to run cooldowns in simulated time
+"""
+class CircuitBreaker:
+    def __init__(self, window_seconds: float = 600, failure_rate: float = 0.5, min_searches: int = 4,
+                 cooldown_seconds: float = 180, max_cooldown_seconds: float = 1800, clock=time.monotonic, sleep=time.sleep):
+        self.window_seconds = window_seconds
+        self.failure_rate = failure_rate
+        self.min_searches = min_searches
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.times_opened = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._outcomes = deque()  # (time, failed)
+        self._opened_until = None
+        self._next_cooldown = cooldown_seconds
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def _half_open(self, now: float) -> bool:
+        return self._opened_until is not None and now >= self._opened_until
+
+    def record_success(self) -> None:
+        now = self._clock()
+        if self._half_open(now):
+            self._opened_until = None
+            self._next_cooldown = self.cooldown_seconds
+            self._outcomes.clear()
+        self._outcomes.append((now, False))
+        self._trim(now)
+
+    def record_failure(self) -> None:
+        now = self._clock()
+        if self._half_open(now):
+            self._open(now)
+            return
+        self._outcomes.append((now, True))
+        self._trim(now)
+        num_failures = sum(failed for _, failed in self._outcomes)
+        if self._opened_until is None and len(self._outcomes) >= self.min_searches and num_failures / len(self._outcomes) >= self.failure_rate:
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._opened_until = now + self._next_cooldown
+        self._next_cooldown = min(self._next_cooldown * 2, self.max_cooldown_seconds)
+        self.times_opened += 1
+
+    def is_open(self) -> bool:
+        return self._opened_until is not None and self._clock() < self._opened_until
+
+    """
+    Return: seconds until searches may resume (0 if they may resume now)
+    """
+    def seconds_until_resume(self) -> float:
+        if self._opened_until is None:
+            return 0.0
+        return max(self._opened_until - self._clock(), 0.0)
+
+    """
+    Block until the breaker lets searches through again
+    Return: seconds spent waiting
+    """
+    def wait_until_closed(self) -> float:
+        waited = self.seconds_until_resume()
+        if waited:
+            self._sleep(waited)
+        return waited
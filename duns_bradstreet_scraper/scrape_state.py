@@ -0,0 +1,335 @@
+import csv
+import json
+import os
+import sqlite3
+
+import arrow
+
+from duns_bradstreet_scraper.email_requests import EmailRequest
+from duns_bradstreet_scraper.records import Case, DunsResult
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    row_order     INTEGER PRIMARY KEY,
+    case_number   TEXT NOT NULL,
+    scrape_status TEXT NOT NULL DEFAULT '',
+    data          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cases_case_number ON cases (case_number);
+
+CREATE TABLE IF NOT EXISTS status_transitions (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    row_order     INTEGER NOT NULL,
+    old_status    TEXT,
+    new_status    TEXT NOT NULL,
+    changed_at    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS duns_results (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    case_number   TEXT,
+    data          TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS searched_queries (
+    company_name  TEXT NOT NULL,
+    city          TEXT NOT NULL,
+    state         TEXT NOT NULL,
+    searched_at   TEXT,
+    PRIMARY KEY (company_name, city, state)
+);
+
+CREATE TABLE IF NOT EXISTS search_cards (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_name  TEXT NOT NULL,
+    city          TEXT NOT NULL,
+    state         TEXT NOT NULL,
+    data          TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS email_requests (
+    request_id            TEXT PRIMARY KEY,
+    duns_name             TEXT NOT NULL,
+    duns_address          TEXT,
+    searches              TEXT NOT NULL,
+    case_numbers          TEXT NOT NULL,
+    email_success         INTEGER,
+    time_email_requested  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key           TEXT PRIMARY KEY,
+    value         TEXT NOT NULL
+);
+"""
+
+
+"""
+Stream a CSV's rows as dicts without reading the whole file in
+Return: (column names, row generator). No columns and no rows if the file doesn't exist
+"""
+def _stream_csv(path: str) -> tuple[list[str], object]:
+    if not os.path.exists(path):
+        return [], iter(())
+    with open(path, "r", newline="") as infile:
+        fieldnames = next(csv.reader(infile), [])
+
+    def rows():
+        with open(path, "r", newline="") as infile:
+            yield from csv.DictReader(infile)
+    return fieldnames, rows()
+
+
+"""
+Write rows to a temp file next to `path`, then swap it in, so a crash never leaves a half-written CSV behind
+"""
+def _write_csv_atomically(path: str, fieldnames: list[str], rows) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(tmp_path, path)
+
+
+"""
+Durable state for a scraping run, kept in SQLite (WAL mode)
+
+Replaces rewriting duns_to_scrape/duns_log/already_scraped CSVs after every case: each case's status change, its DUNS
+results and the searches it made are committed in one transaction, so a crash loses at most the case in flight.
+Result cards of a search in flight can be committed one by one (record_search_card), so a crash mid-search loses at most one card.
+The CSV layouts can still be exported on demand with export_csvs
+
+In two-stage runs, the email requests the search stage found are kept too, one per company however many cases' searches
+listed it (see email_requests.py). The email stage records each one's outcome with record_email_outcome
+"""
+class ScrapeStateStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "ScrapeStateStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_meta(self, key: str, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def is_empty(self) -> bool:
+        return self._conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0] == 0
+
+    """
+    Seed an empty store from the existing CSVs. Does nothing if the store already holds cases
+    """
+    def import_csvs(self, cases_path: str, duns_log_path: str, already_scraped_path: str) -> None:
+        if not self.is_empty():
+            return
+
+        case_fields, cases = _stream_csv(cases_path)
+        result_fields, duns_results = _stream_csv(duns_log_path)
+        _, already_scraped = _stream_csv(already_scraped_path)
+        with self._conn:
+            self._set_meta("case_fields", case_fields)
+            self._set_meta("duns_result_fields", result_fields)
+            self._conn.executemany(
+                "INSERT INTO cases (row_order, case_number, scrape_status, data) VALUES (?, ?, ?, ?)",
+                ((row_order, case["case_number"], case.get("scrape_status", ""), json.dumps(case)) for row_order, case in enumerate(cases)))
+            self._conn.executemany(
+                "INSERT INTO duns_results (case_number, data) VALUES (?, ?)",
+                ((result.get("case_number"), json.dumps(result)) for result in duns_results))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO searched_queries (company_name, city, state) VALUES (?, ?, ?)",
+                ((row["company_name"], row["city"], row["state"]) for row in already_scraped))
+
+    """
+    Yield (row_order, Case) in worklist order. The case's scrape_status reflects the latest committed status
+    """
+    def iter_cases(self):
+        for row_order, scrape_status, data in self._conn.execute("SELECT row_order, scrape_status, data FROM cases ORDER BY row_order"):
+            case = Case.from_dict(json.loads(data))
+            case.scrape_status = scrape_status
+            yield row_order, case
+
+    """
+    Yield every DUNS result logged so far as a DunsResult, oldest first
+    """
+    def iter_duns_results(self):
+        for (data,) in self._conn.execute("SELECT data FROM duns_results ORDER BY id"):
+            yield DunsResult.from_dict(json.loads(data))
+
+    def num_cases(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+
+    def searched_queries(self) -> set[tuple[str, str, str]]:
+        return set(self._conn.execute("SELECT company_name, city, state FROM searched_queries"))
+
+    def _set_status(self, row_order: int, scrape_status) -> None:
+        scrape_status = str(scrape_status)
+        old_status = self._conn.execute("SELECT scrape_status FROM cases WHERE row_order = ?", (row_order,)).fetchone()
+        self._conn.execute("UPDATE cases SET scrape_status = ? WHERE row_order = ?", (scrape_status, row_order))
+        self._conn.execute(
+            "INSERT INTO status_transitions (row_order, old_status, new_status, changed_at) VALUES (?, ?, ?, ?)",
+            (row_order, old_status[0] if old_status else None, scrape_status, arrow.now().isoformat()))
+
+    def _add_searched_queries(self, searched_queries: list[tuple[str, str, str]]) -> None:
+        searched_at = arrow.now().isoformat()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO searched_queries (company_name, city, state, searched_at) VALUES (?, ?, ?, ?)",
+            [(company_name, city, state, searched_at) for company_name, city, state in searched_queries])
+
+    """
+    Commit a case's status change, along with any searches it made and DUNS results it produced, in one transaction
+    params:
+        row_order(int): position of the case in the worklist, from iter_cases
+        scrape_status: new status (a ScrapeStatus value)
+        duns_results(list[DunsResult]): DUNS result records to append to the log
+        searched_queries(list[tuple]): (company_name, city, state) searches made while processing the case
+    """
+    def record_case(self, row_order: int, scrape_status, duns_results: list[dict] = (), searched_queries: list[tuple[str, str, str]] = ()) -> None:
+        self.record_cases([(row_order, scrape_status, duns_results)], searched_queries)
+
+    """
+    Commit several cases' status changes and DUNS results in one transaction, e.g. every case sharing one search
+    params:
+        case_records(list[tuple]): (row_order, scrape_status, duns_results) per case
+        searched_queries(list[tuple]): (company_name, city, state) searches made for these cases
+        finished_search(tuple): (company_name, city, state) search whose cards (see record_search_card) these results replace.
+            Results with an email_request_id and no email outcome yet are registered as email requests reachable from it
+    """
+    def record_cases(self, case_records: list[tuple], searched_queries: list[tuple[str, str, str]] = (),
+                     finished_search: tuple[str, str, str] | None = None) -> None:
+        with self._conn:
+            self._add_searched_queries(searched_queries)
+            for row_order, scrape_status, duns_results in case_records:
+                self._set_status(row_order, scrape_status)
+                if duns_results:
+                    self._record_result_fields(duns_results)
+                    self._conn.executemany(
+                        "INSERT INTO duns_results (case_number, data) VALUES (?, ?)",
+                        [(result.get("case_number"), json.dumps(dict(result), default=str)) for result in duns_results])
+                    for result in duns_results:
+                        if result.get("email_request_id") and result.get("email_success") is None:
+                            self._add_email_request(result, finished_search)
+            if finished_search is not None:
+                self._conn.execute("DELETE FROM search_cards WHERE company_name = ? AND city = ? AND state = ?", finished_search)
+
+    """
+    Commit one result card of a search that's still running. Cleared once the search's cases are recorded (see record_cases)
+    """
+    def record_search_card(self, query: tuple[str, str, str], duns_result: DunsResult) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO search_cards (company_name, city, state, data) VALUES (?, ?, ?, ?)",
+                (*query, json.dumps(dict(duns_result), default=str)))
+
+    """
+    Cards left behind by searches that never finished (the run crashed mid-search). Their emails may still have gone out
+    Return: dict of (company_name, city, state) -> card records, in the order they were committed
+    """
+    def unfinished_search_cards(self) -> dict[tuple[str, str, str], list[DunsResult]]:
+        cards = {}
+        for company_name, city, state, data in self._conn.execute("SELECT company_name, city, state, data FROM search_cards ORDER BY id"):
+            cards.setdefault((company_name, city, state), []).append(DunsResult.from_dict(json.loads(data)))
+        return cards
+
+    def _add_email_request(self, duns_result: DunsResult, search: tuple[str, str, str] | None) -> None:
+        row = self._conn.execute("SELECT searches, case_numbers FROM email_requests WHERE request_id = ?", (duns_result.email_request_id,)).fetchone()
+        searches, case_numbers = (json.loads(row[0]), json.loads(row[1])) if row else ([], [])
+        if search is not None and list(search) not in searches:
+            searches.append(list(search))
+        if duns_result.case_number is not None and duns_result.case_number not in case_numbers:
+            case_numbers.append(duns_result.case_number)
+
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO email_requests (request_id, duns_name, duns_address, searches, case_numbers) VALUES (?, ?, ?, ?, ?)",
+                (duns_result.email_request_id, duns_result.duns_name, duns_result.duns_address, json.dumps(searches), json.dumps(case_numbers)))
+        else:
+            self._conn.execute("UPDATE email_requests SET searches = ?, case_numbers = ? WHERE request_id = ?",
+                               (json.dumps(searches), json.dumps(case_numbers), duns_result.email_request_id))
+
+    def _email_requests(self, where: str = "") -> list[EmailRequest]:
+        rows = self._conn.execute(
+            "SELECT request_id, duns_name, duns_address, searches, case_numbers, email_success, time_email_requested "
+            f"FROM email_requests {where} ORDER BY rowid")
+        return [EmailRequest(request_id, duns_name, duns_address, [tuple(search) for search in json.loads(searches)], json.loads(case_numbers),
+                             None if email_success is None else bool(email_success), time_email_requested)
+                for request_id, duns_name, duns_address, searches, case_numbers, email_success, time_email_requested in rows]
+
+    """
+    Return: email requests the email stage hasn't tried yet, in the order they were found
+    """
+    def pending_email_requests(self) -> list[EmailRequest]:
+        return self._email_requests("WHERE email_success IS NULL")
+
+    """
+    Commit the outcome of one email request. Every case it serves picks it up in export_csvs
+    """
+    def record_email_outcome(self, request_id: str, email_success: bool, time_email_requested=None) -> None:
+        with self._conn:
+            self._conn.execute("UPDATE email_requests SET email_success = ?, time_email_requested = ? WHERE request_id = ?",
+                               (int(bool(email_success)), None if time_email_requested is None else str(time_email_requested), request_id))
+
+    def _with_email_outcome(self, result: dict, email_outcomes: dict[str, EmailRequest]) -> dict:
+        request = email_outcomes.get(result.get("email_request_id"))
+        if request is not None and result.get("email_success") is None:
+            result |= {"email_success": request.email_success, "time_email_requested": request.time_email_requested}
+        return result
+
+    def _record_result_fields(self, duns_results: list[DunsResult]) -> None:
+        fields = self._get_meta("duns_result_fields", [])
+        new_fields = [field for result in duns_results for field in result if field not in fields]
+        if any("email_request_id" in result for result in duns_results):
+            # Filled in from the email request once the email stage has run (see export_csvs)
+            new_fields += [field for field in ["email_success", "time_email_requested"] if field not in fields]
+        if new_fields:
+            self._set_meta("duns_result_fields", fields + list(dict.fromkeys(new_fields)))
+
+    """
+    Write the store back out in the original CSV layouts. Results waiting on an email request get its outcome
+    params:
+        email_requests_path(str): if given, also write one row per email request, with the cases it serves
+    """
+    def export_csvs(self, cases_path: str, duns_log_path: str, already_scraped_path: str, email_requests_path: str | None = None) -> None:
+        case_fields = self._get_meta("case_fields", [])
+        if case_fields:
+            _write_csv_atomically(cases_path, case_fields, (case for _, case in self.iter_cases()))
+
+        result_fields = self._get_meta("duns_result_fields", [])
+        if result_fields:
+            email_outcomes = {request.request_id: request for request in self._email_requests("WHERE email_success IS NOT NULL")}
+            results = (self._with_email_outcome(json.loads(data), email_outcomes) for (data,) in self._conn.execute("SELECT data FROM duns_results ORDER BY id"))
+            _write_csv_atomically(duns_log_path, result_fields, results)
+
+        if email_requests_path is not None:
+            requests = ({
+                "request_id": request.request_id,
+                "duns_name": request.duns_name,
+                "duns_address": request.duns_address,
+                "email_success": "" if request.email_success is None else request.email_success,
+                "time_email_requested": request.time_email_requested or "",
+                "case_numbers": ";".join(request.case_numbers),
+                "searches": ";".join("|".join(search) for search in request.searches),
+            } for request in self._email_requests())
+            _write_csv_atomically(email_requests_path, ["request_id", "duns_name", "duns_address", "email_success", "time_email_requested",
+                                                        "case_numbers", "searches"], requests)
+
+        queries = self._conn.execute("SELECT company_name, city, state FROM searched_queries ORDER BY rowid")
+        _write_csv_atomically(already_scraped_path, ["company_name", "city", "state"],
+                              ({"company_name": name, "city": city, "state": state} for name, city, state in queries))
@@ -0,0 +1,105 @@
+import json
+import re
+import sqlite3
+import time
+
+from duns_bradstreet_scraper.fuzzy_matching import canonicalize_company_name
+
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    query_key     TEXT PRIMARY KEY,
+    results       TEXT NOT NULL,
+    created_at    REAL NOT NULL,
+    last_access   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS search_cache_last_access ON search_cache (last_access);
+"""
+
+
+"""
+Cache key for a search. Case, punctuation, whitespace and corporate suffixes don't change what D&B returns,
+so "Acme, Inc." in "Boston " and "ACME INC" in "boston" share a key. Searches that only extracted the cards
+(emails_requested False, see DBScraper.iter_search) are cached apart from ones that requested every card's email
+"""
+def normalize_query(company_name: str, company_city: str, company_state: str, emails_requested: bool = True) -> str:
+    city = WHITESPACE_RE.sub(" ", company_city).strip().lower()
+    state = WHITESPACE_RE.sub(" ", company_state).strip().lower()
+    parts = [canonicalize_company_name(company_name), city, state]
+    if not emails_requested:
+        parts.append("no-emails")
+    return "|".join(parts)
+
+
+"""
+On-disk memo of execute_search results, keyed by normalized (company name, city, state)
+
+Entries older than ttl_seconds are treated as misses and dropped. Once the cache holds more than max_entries,
+the least recently used entries are evicted
+"""
+class SearchCache:
+    def __init__(self, db_path: str, ttl_seconds: float = 90 * 24 * 3600, max_entries: int = 100_000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    """
+    Return: cached result records for the query, or None on a miss
+    """
+    def get(self, company_name: str, company_city: str, company_state: str, emails_requested: bool = True) -> list[dict] | None:
+        query_key = normalize_query(company_name, company_city, company_state, emails_requested)
+        now = time.time()
+        row = self._conn.execute("SELECT results, created_at FROM search_cache WHERE query_key = ?", (query_key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        results, created_at = row
+        with self._conn:
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM search_cache WHERE query_key = ?", (query_key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE search_cache SET last_access = ? WHERE query_key = ?", (now, query_key))
+        self.hits += 1
+        return json.loads(results)
+
+    def put(self, company_name: str, company_city: str, company_state: str, results: list[dict], emails_requested: bool = True) -> None:
+        query_key = normalize_query(company_name, company_city, company_state, emails_requested)
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (query_key, results, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (query_key, json.dumps([dict(result) for result in results], default=str), now, now))
+            self._evict()
+
+    def _evict(self) -> None:
+        num_entries = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        if num_entries <= self.max_entries:
+            return
+        self._conn.execute(
+            "DELETE FROM search_cache WHERE query_key IN (SELECT query_key FROM search_cache ORDER BY last_access LIMIT ?)",
+            (num_entries - self.max_entries,))
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
@@ -0,0 +1,641 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import random
+import re
+import statistics
+from collections import deque
+from dataclasses import dataclass, field
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+
+from duns_bradstreet_scraper.duns_bradstreet_scraper import (EXTRACT_ALL_CARDS_SCRIPT, FORCE_CLOSE_MODAL_SCRIPT, SCROLL_TO_CARD_SCRIPT, DBScraper,
+                                                             DNBRejectionException, DNBServerException, TimingProfile)
+from duns_bradstreet_scraper.fixture_server import STATE_NAMES, FixtureConfig, FixtureStats, generate_results
+from duns_bradstreet_scraper.instrumentation import PhaseTimer
+from duns_bradstreet_scraper.name_normalization import normalize_employer_name
+from duns_bradstreet_scraper.query_planner import plan_queries
+from duns_bradstreet_scraper.retry_policy import CircuitBreaker, RetryPolicy
+from duns_bradstreet_scraper.variant_planner import VariantPlanner, candidate_variants
+
+
+"""
+Simulated time. sleep() returns immediately and moves the clock forward, so a run that would take days takes seconds
+"""
+class SimClock:
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(seconds, 0)
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+"""
+Latency distribution: median * e^N(0, sigma). sigma 0 always gives the median
+"""
+@dataclass
+class LogNormal:
+    median: float
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        return self.median * math.exp(rng.gauss(0, self.sigma)) if self.sigma else self.median
+
+    """
+    Fit to observed durations (seconds). Non-positive durations are dropped
+    """
+    @classmethod
+    def fit(cls, durations: list[float]) -> "LogNormal | None":
+        logs = [math.log(duration) for duration in durations if duration > 0]
+        if not logs:
+            return None
+        return cls(math.exp(statistics.fmean(logs)), statistics.pstdev(logs))
+
+
+"""
+How the simulated D&B site behaves. Latencies are in seconds, rates are probabilities in [0, 1]
+
+The server error rate rises with load: each search D&B saw in the last load_window seconds adds load_error_rate to
+server_error_rate. That is what makes pacing policies differ in the simulation
+"""
+@dataclass
+class SimulationProfile:
+    page_load: LogNormal = field(default_factory=lambda: LogNormal(2.0, 0.4))
+    search: LogNormal = field(default_factory=lambda: LogNormal(2.5, 0.5))         # submit until the results show up
+    email_request: LogNormal = field(default_factory=lambda: LogNormal(1.0, 0.5))  # email form submit until D&B answers
+    driver_call: float = 0.02          # round trip for every other WebDriver command
+    result_counts: list[int] = field(default_factory=lambda: [0, 0, 1, 1, 1, 2, 2, 3, 4, 6])  # sampled uniformly
+    email_success_rate: float = 0.9
+    server_error_rate: float = 0.02
+    load_error_rate: float = 0.0
+    load_window: float = 600
+    access_denied_rate: float = 0.0
+    # The fake page settles at once, so the scraper's waits never time out. A real page with no results makes the scraper
+    # wait out TimingProfile.results_timeout, so that's charged to the clock instead
+    empty_search_wait: float = TimingProfile.results_timeout
+    seed: int = 0
+
+
+# Lines of the free-text doover.log that earlier runs wrote, e.g. "2024-11-13 10:12:31 INFO:  found 1 results divs"
+LEGACY_LOG_LINE_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} \w+:\s+(.*)$")
+LEGACY_RESULTS_RE = re.compile(r"^found (\d+) results divs")
+
+
+"""
+The event-log event a line of the legacy doover.log stands for, or None
+"""
+def _legacy_event(line: str) -> dict | None:
+    log_line = LEGACY_LOG_LINE_RE.match(line)
+    if log_line is None:
+        return None
+    message = log_line.group(1)
+    if message.startswith("Scraping for company w/ following details"):
+        return {"event": "search_started"}
+    if message.lower().startswith("dnb server error"):
+        return {"event": "server_error"}
+    if message.startswith("Succesfully triggered email"):
+        return {"event": "email_requested", "email_success": True}
+    if message.startswith("Could not trigger email"):
+        return {"event": "email_requested", "email_success": False}
+    results = LEGACY_RESULTS_RE.match(message)
+    if results is not None:
+        return {"event": "search_done", "num_results": int(results.group(1))}
+    return None
+
+
+"""
+Fit a SimulationProfile to a toy_doover.py event log (see event_log.py), or to the free-text doover.log of runs from before
+the event log. Anything the log has no data for keeps its default. The free-text log has no per-phase timings (and only
+one-second timestamps), so fitting to it leaves page load and search times at their defaults
+"""
+def fit_profile(event_log_path: str, **overrides) -> SimulationProfile:
+    page_loads, searches, result_counts = [], [], []
+    num_started = num_server_errors = num_emails = num_email_successes = 0
+    with open(event_log_path, "r") as infile:
+        for line in infile:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                event = _legacy_event(line)
+            if not isinstance(event, dict):
+                continue
+            event_type = event.get("event")
+            if event_type == "search_started":
+                num_started += 1
+            elif event_type == "server_error":
+                num_server_errors += 1
+            elif event_type == "email_requested":
+                num_emails += 1
+                num_email_successes += bool(event.get("email_success"))
+            elif event_type == "search_done":
+                result_counts.append(event.get("num_results", 0))
+                phases = event.get("phases") or {}
+                if "page_load" in phases:
+                    page_loads.append(phases["page_load"])
+                if "submit" in phases:
+                    searches.append(phases["submit"])
+
+    profile = SimulationProfile()
+    profile.page_load = LogNormal.fit(page_loads) or profile.page_load
+    profile.search = LogNormal.fit(searches) or profile.search
+    if result_counts:
+        profile.result_counts = result_counts
+    if num_emails:
+        profile.email_success_rate = num_email_successes / num_emails
+    if num_started:
+        profile.server_error_rate = num_server_errors / num_started
+    for name, value in overrides.items():
+        setattr(profile, name, value)
+    return profile
+
+
+# Select.select_by_visible_text looks options up by exact text, then (for texts with spaces) by their longest word
+OPTION_EXACT_XPATH = re.compile(r"""^\.//option\[normalize-space\(\.\) = (["'])(.*)\1\]$""")
+OPTION_CONTAINS_XPATH = re.compile(r"""^\.//option\[contains\(\.,(["'])(.*)\1\)\]$""")
+EMAIL_LINK_XPATH = ".//a[contains(text(), 'Email D-U-N-S')]"
+SEARCH_REASONS = ["Select a reason", "My company", "Other company"]
+CARD_FIELDS = {"name": "name", "address": "address", "phone": "phone", "type": "type", "status": "status"}
+NUM_FORM_ROWS = 5  # name, city, zip, state, submit button
+WINDOW_HEIGHT = 800
+
+
+"""
+An element on the FakeDriver's page. Which one is given by `kind` (and `index`, for cards and select options).
+Elements go stale like real ones: page elements when the page reloads, cards when a new search renders, modal elements
+when the modal closes
+"""
+class FakeElement(WebElement):
+    def __init__(self, driver: "FakeDriver", kind: str, index: int | None = None, text: str = "", tag_name: str = "div", scope: str = "page"):
+        super().__init__(driver, f"{kind}-{index}-{driver._generations[scope]}")
+        self._driver = driver
+        self.kind = kind
+        self.index = index
+        self._text = text
+        self._tag_name = tag_name
+        self._scope = scope
+        self._generation = driver._generations[scope]
+
+    def _check(self) -> None:
+        self._driver._charge()
+        if self._driver._generations[self._scope] != self._generation:
+            raise StaleElementReferenceException(f"{self.kind} is no longer attached to the page")
+
+    @property
+    def text(self) -> str:
+        self._check()
+        return self._text
+
+    @property
+    def tag_name(self) -> str:
+        return self._tag_name
+
+    @property
+    def size(self) -> dict:
+        self._check()
+        return {"height": 150 if self.kind == "card" else 40, "width": 800}
+
+    @property
+    def location(self) -> dict:
+        self._check()
+        return {"x": 0, "y": 400 + 170 * self.index if self.kind == "card" else 200}
+
+    def is_displayed(self) -> bool:
+        self._check()
+        return self._driver._is_displayed(self)
+
+    def is_enabled(self) -> bool:
+        self._check()
+        return True
+
+    def is_selected(self) -> bool:
+        self._check()
+        return self._driver._is_selected(self)
+
+    def get_dom_attribute(self, name: str):
+        return None
+
+    def get_attribute(self, name: str):
+        return None
+
+    def value_of_css_property(self, property_name: str) -> str:
+        return {"visibility": "visible", "display": "block", "opacity": "1"}.get(property_name, "")
+
+    def click(self) -> None:
+        self._check()
+        self._driver._click(self)
+
+    def submit(self) -> None:
+        self._check()
+        self._driver._submit_search()
+
+    def send_keys(self, *value) -> None:
+        self._check()
+        if self.kind == "input":
+            self._driver._form[self.index] += "".join(str(part) for part in value)
+
+    def clear(self) -> None:
+        self._check()
+        if self.kind == "input":
+            self._driver._form[self.index] = ""
+
+    def find_element(self, by=By.ID, value=None) -> "FakeElement":
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No {value!r} ({by}) in {self.kind}")
+        return elements[0]
+
+    def find_elements(self, by=By.ID, value=None) -> list["FakeElement"]:
+        self._check()
+        return self._driver._find_within(self, by, value)
+
+
+"""
+Pure-Python stand-in for the Chrome driver, implementing the parts of Selenium DBScraper uses against the D&B lookup page
+(the same page fixture_server.py serves). Every command moves the SimClock forward by a latency drawn from the profile,
+and search outcomes (result counts, server errors, email failures, access denied pages) are drawn from it too
+
+    clock = SimClock()
+    scraper = DBScraper(driver=FakeDriver(SimulationProfile(), clock), clock=clock, timing_profile=SIMULATION_TIMING)
+"""
+class FakeDriver:
+    def __init__(self, profile: SimulationProfile, clock: SimClock):
+        self.profile = profile
+        self.clock = clock
+        self.stats = FixtureStats()
+        self.session_id = "fake"
+        self.current_url = "about:blank"
+        self._rng = random.Random(profile.seed)
+        self._fixture = FixtureConfig(seed=profile.seed)
+        self._implicit_wait = 0
+        self._recent_searches = deque()
+        self._generations = {"page": 0, "results": 0, "modal": 0}
+        self._page = None  # None, "lookup" or "denied"
+        self._cookies_accepted = False
+        self._scroll_y = 0
+        self._reset_page()
+
+    def _reset_page(self) -> None:
+        self._reason = 0
+        self._form = {"businessName": "", "city": "", "zip": ""}
+        self._state = None
+        self._results = []
+        self._error_shown = False
+        self._modal = None  # None, or {"card": index, "success": bool}
+        self._scroll_y = 0
+
+    def _charge(self, seconds: float | None = None) -> None:
+        self.clock.sleep(self.profile.driver_call if seconds is None else seconds)
+
+    def _bump(self, *scopes: str) -> None:
+        for scope in scopes:
+            self._generations[scope] += 1
+
+    def implicitly_wait(self, time_to_wait: float) -> None:
+        self._implicit_wait = time_to_wait
+
+    def get(self, url: str) -> None:
+        self._charge(self.profile.page_load.sample(self._rng))
+        self.current_url = url
+        self._bump("page", "results", "modal")
+        self._reset_page()
+        if self._rng.random() < self.profile.access_denied_rate:
+            self.stats.incr(page_loads=1, access_denied=1)
+            self._page = "denied"
+            return
+        self.stats.incr(page_loads=1)
+        self._page = "lookup"
+
+    @property
+    def page_source(self) -> str:
+        cards = "".join(f'<div class="search-results-card-container"><div class="name">{card["name"]}</div></div>' for card in self._results)
+        return f"<html><body>{cards}</body></html>"
+
+    def quit(self) -> None:
+        pass
+
+    def execute_script(self, script: str, *args):
+        self._charge()
+        if script == EXTRACT_ALL_CARDS_SCRIPT:
+            return [{
+                "duns_name": card["name"],
+                "duns_address": card["address"],
+                "duns_phone": card["phone"],
+                "duns_type": card["type"],
+                "company_status": card["status"],
+                "has_email_link": True,
+            } for card in self._results]
+        if script == SCROLL_TO_CARD_SCRIPT:
+            return self._card(args[0])
+        if script == FORCE_CLOSE_MODAL_SCRIPT:
+            self._close_modal()
+            return None
+        if script == "return window.innerHeight":
+            return WINDOW_HEIGHT
+        if script == "return window.pageYOffset":
+            return self._scroll_y
+        if script.startswith("window.scrollBy"):
+            self._scroll_y = max(self._scroll_y + args[0], 0)
+            return None
+        raise WebDriverException(f"FakeDriver can't run this script: {script[:60]!r}")
+
+    def find_element(self, by=By.ID, value=None) -> FakeElement:
+        elements = self.find_elements(by, value)
+        if not elements:
+            self._charge(self._implicit_wait)  # a real driver waits this long before giving up
+            raise NoSuchElementException(f"No {value!r} ({by}) on the page")
+        return elements[0]
+
+    def find_elements(self, by=By.ID, value=None) -> list[FakeElement]:
+        self._charge()
+        locator = (by, value)
+        if self._page == "denied":
+            return [FakeElement(self, "h1", text="Access Denied", tag_name="h1")] if locator == (By.TAG_NAME, "h1") else []
+        if self._page != "lookup":
+            return []
+
+        if locator == (By.TAG_NAME, "h1"):
+            return [FakeElement(self, "h1", text="D-U-N-S Number Lookup", tag_name="h1")]
+        if locator == (By.ID, "truste-consent-required"):
+            return [] if self._cookies_accepted else [FakeElement(self, "cookie_popup", tag_name="button")]
+        if locator == (By.NAME, "primary-reason-dropdown-select-component"):
+            return [FakeElement(self, "reason_select", tag_name="select")]
+        if locator == (By.CLASS_NAME, "container-search"):
+            return [FakeElement(self, "search_container")]
+        if by == By.NAME and value in self._form:
+            return [FakeElement(self, "input", index=value, tag_name="input")]
+        if locator == (By.ID, "submit-search"):
+            return [FakeElement(self, "submit_button", tag_name="button")]
+        if locator == (By.CLASS_NAME, "full-screen-loader"):
+            return []
+        if locator == (By.CLASS_NAME, "direct-plus-search-error-text"):
+            return [FakeElement(self, "search_error", tag_name="p", scope="results")] if self._error_shown else []
+        if locator == (By.CLASS_NAME, "search-results-card-container"):
+            return [self._card(index) for index in range(len(self._results))]
+        if self._modal is not None:
+            if locator == (By.CLASS_NAME, "requestform"):
+                return [FakeElement(self, "modal", scope="modal")]
+            if locator == (By.CLASS_NAME, "requestform__close"):
+                return [FakeElement(self, "modal_close", tag_name="button", scope="modal")]
+            if locator == (By.CLASS_NAME, "requestform__background--success"):
+                return [FakeElement(self, "modal_success", scope="modal")] if self._modal["success"] else []
+        return []
+
+    def _card(self, index: int) -> FakeElement:
+        return FakeElement(self, "card", index=index, scope="results")
+
+    def _find_within(self, element: FakeElement, by: str, value: str) -> list[FakeElement]:
+        if element.kind == "search_container":
+            if by == By.NAME and value in self._form:
+                return [FakeElement(self, "input", index=value, tag_name="input")]
+            if (by, value) == (By.CLASS_NAME, "search-form-row__row"):
+                return [FakeElement(self, "form_row", index=row) for row in range(NUM_FORM_ROWS)]
+        elif element.kind == "form_row" and element.index == NUM_FORM_ROWS - 2 and (by, value) == (By.TAG_NAME, "select"):
+            return [FakeElement(self, "state_select", tag_name="select")]
+        elif element.kind in ["reason_select", "state_select"] and by == By.XPATH:
+            options = SEARCH_REASONS if element.kind == "reason_select" else STATE_NAMES
+            option_kind = "reason_option" if element.kind == "reason_select" else "state_option"
+            exact, contains = OPTION_EXACT_XPATH.match(value), OPTION_CONTAINS_XPATH.match(value)
+            return [FakeElement(self, option_kind, index=index, text=text, tag_name="option") for index, text in enumerate(options)
+                    if (exact and text == exact.group(2)) or (contains and contains.group(2) in text)]
+        elif element.kind == "card":
+            card = self._results[element.index]
+            if by == By.CLASS_NAME and value in CARD_FIELDS:
+                return [FakeElement(self, "card_field", text=card[CARD_FIELDS[value]], scope="results")]
+            if (by, value) == (By.XPATH, EMAIL_LINK_XPATH):
+                return [FakeElement(self, "email_link", index=element.index, text="Email D-U-N-S Number", tag_name="a", scope="results")]
+        elif element.kind == "modal":
+            if by == By.NAME and value in ["FIRST_NAME", "LAST_NAME", "EMAIL_ADDRESS"]:
+                return [FakeElement(self, "modal_input", tag_name="input", scope="modal")]
+            if (by, value) == (By.CLASS_NAME, "requestform__submit"):
+                return [FakeElement(self, "modal_submit", tag_name="button", scope="modal")]
+        return []
+
+    def _is_displayed(self, element: FakeElement) -> bool:
+        if element.kind == "input":
+            return SEARCH_REASONS[self._reason] == "Other company"
+        return True
+
+    def _is_selected(self, element: FakeElement) -> bool:
+        if element.kind == "reason_option":
+            return element.index == self._reason
+        if element.kind == "state_option":
+            return STATE_NAMES[element.index] == self._state
+        return False
+
+    def _click(self, element: FakeElement) -> None:
+        if element.kind == "cookie_popup":
+            self._cookies_accepted = True
+        elif element.kind == "reason_option":
+            self._reason = element.index
+        elif element.kind == "state_option":
+            self._state = STATE_NAMES[element.index]
+        elif element.kind == "submit_button":
+            self._submit_search()
+        elif element.kind == "email_link":
+            self._bump("modal")
+            self._modal = {"card": element.index, "success": False}
+        elif element.kind == "modal_submit":
+            self._charge(self.profile.email_request.sample(self._rng))
+            failed = self._rng.random() >= self.profile.email_success_rate
+            self.stats.incr(email_requests=1, email_failures=int(failed))
+            self._modal["success"] = not failed
+        elif element.kind == "modal_close":
+            self._close_modal()
+
+    def _close_modal(self) -> None:
+        if self._modal is not None:
+            self._bump("modal")
+            self._modal = None
+
+    """
+    Answer the search form: a server error or a fresh set of result cards
+    """
+    def _submit_search(self) -> None:
+        self._charge(self.profile.search.sample(self._rng))
+        self._bump("results", "modal")
+        self._modal = None
+        now = self.clock.monotonic()
+        while self._recent_searches and self._recent_searches[0] < now - self.profile.load_window:
+            self._recent_searches.popleft()
+        self._recent_searches.append(now)
+
+        server_error_rate = self.profile.server_error_rate + self.profile.load_error_rate * (len(self._recent_searches) - 1)
+        if self._rng.random() < server_error_rate:
+            self.stats.incr(searches=1, server_errors=1)
+            self._results = []
+            self._error_shown = True
+            return
+
+        num_results = self._rng.choice(self.profile.result_counts)
+        self._fixture.min_results = self._fixture.max_results = num_results
+        self._results = generate_results(self._fixture, self._form["businessName"], self._form["city"], self._state or "")
+        self._error_shown = False
+        self.stats.incr(searches=1, results_served=num_results)
+        if not self._results:
+            self._charge(self.profile.empty_search_wait)
+
+
+# Waits return on their first check against a FakeDriver, so nothing needs a timeout (see SimulationProfile.empty_search_wait)
+SIMULATION_TIMING = TimingProfile(page_load_timeout=0, cookie_popup_timeout=0, popup_dismiss_timeout=0, form_ready_timeout=0,
+                                  results_timeout=0, poll_frequency=0.001)
+
+
+"""
+What the simulated run does between searches. The defaults are what toy_doover.py's serial loop does
+    pause_before_search / pause_after_search(float): seconds slept around every search
+    rejection_pause(float): seconds slept after D&B blocks a search outright
+    circuit_breaker(bool): pause after a burst of server errors, like toy_doover.py
+"""
+@dataclass
+class SimulationPolicy:
+    pause_before_search: float = 20
+    pause_after_search: float = 2
+    rejection_pause: float = 120
+    retry_policy: RetryPolicy = field(default_factory=RetryPolicy)
+    circuit_breaker: bool = True
+
+
+"""
+Run the toy_doover.py search loop over a worklist against a FakeDriver: a search for every planned query on each case's first
+name variant, then on the other variant for cases whose first search triggered no emails
+params:
+    cases: (case index, case dict) pairs, as toy_doover.py plans them
+    state_initial_map(dict): state abbreviation -> state name
+    profile(SimulationProfile)
+    policy(SimulationPolicy)
+    order: if given, called with each pass's planned queries and returns them in the order to search them
+    variant_planner(VariantPlanner): if given, decides which name variant each case is searched under first. Otherwise the
+        legal name (clean_name_1) goes first
+Return: dict of run metrics. Times are simulated, in hours
+"""
+def simulate_run(cases, state_initial_map: dict[str, str], profile: SimulationProfile | None = None, policy: SimulationPolicy | None = None,
+                 order=None, variant_planner: VariantPlanner | None = None, logger: logging.Logger | None = None) -> dict:
+    profile = profile or SimulationProfile()
+    policy = policy or SimulationPolicy()
+    if logger is None:
+        logger = logging.getLogger("dnb_simulation")
+        logger.setLevel(logging.CRITICAL)
+
+    clock = SimClock()
+    driver = FakeDriver(profile, clock)
+    # Phase timings in search_done events are in simulated time, like the ones fit_profile fits the driver's latencies to
+    scraper = DBScraper(logger=logger, timing_profile=SIMULATION_TIMING, retry_policy=policy.retry_policy, driver=driver, clock=clock,
+                        phase_timer=PhaseTimer(clock=clock))
+    circuit_breaker = CircuitBreaker(clock=clock.monotonic, sleep=clock.sleep) if policy.circuit_breaker else None
+
+    searches = failed_searches = cases_failed = cases_emailed = 0
+    cases_by_ind = dict(cases)
+    search_order = {case_ind: variant_planner.rank(case) if variant_planner is not None else candidate_variants(case) for case_ind, case in cases}
+    pending_cases = list(cases)
+    for search_pass in range(2):
+        pass_cases = [(case_ind, case | {"search_term": search_order[case_ind][search_pass].term if search_order[case_ind] else ""})
+                      for case_ind, case in pending_cases]
+        queries, _ = plan_queries(pass_cases, "search_term", state_initial_map)
+        if order is not None:
+            queries = order(queries)
+        next_pass = []
+        for query in queries:
+            clock.sleep(policy.pause_before_search)
+            searches += 1
+            try:
+                duns_results = scraper.execute_search(company_name=query.company_name, company_state=query.state, company_city=query.city)
+            except (DNBServerException, DNBRejectionException) as e:
+                failed_searches += 1
+                cases_failed += len(query.case_inds)
+                if isinstance(e, DNBRejectionException):
+                    clock.sleep(policy.rejection_pause)
+                if circuit_breaker is not None:
+                    circuit_breaker.record_failure()
+                    circuit_breaker.wait_until_closed()
+                continue
+
+            if circuit_breaker is not None:
+                circuit_breaker.record_success()
+            clock.sleep(policy.pause_after_search)
+            emailed = any(duns_result["email_success"] for duns_result in duns_results)
+            for case_ind in query.case_inds:
+                if variant_planner is not None:
+                    variant_planner.observe(search_order[case_ind][search_pass], emailed)
+                if emailed:
+                    cases_emailed += 1
+                elif search_pass + 1 < len(search_order[case_ind]):
+                    next_pass.append((case_ind, cases_by_ind[case_ind]))
+        pending_cases = next_pass
+
+    hours = clock.now / 3600
+    return {
+        "cases": len(cases),
+        "searches": searches,
+        "failed_searches": failed_searches,
+        "cases_failed": cases_failed,
+        "cases_emailed": cases_emailed,
+        "simulated_hours": hours,
+        "cases_per_hour": len(cases) / hours if hours else None,
+        "searches_per_hour": searches / hours if hours else None,
+        "search_attempts": driver.stats.searches,
+        "server_errors": driver.stats.server_errors,
+        "emails_requested": driver.stats.email_requests,
+        "email_failures": driver.stats.email_failures,
+        "breaker_openings": circuit_breaker.times_opened if circuit_breaker is not None else None,
+    }
+
+
+ORDERINGS = {
+    "planned": lambda queries: queries,
+    "worklist": lambda queries: sorted(queries, key=lambda query: query.case_inds[0]),
+    "shuffled": lambda queries: random.Random(0).sample(queries, len(queries)),
+    "by_state": lambda queries: sorted(queries, key=lambda query: (query.state, query.case_inds[0])),
+}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Simulate a toy_doover.py run against a fake D&B site, to compare pacing, retry and ordering policies")
+    parser.add_argument("--cases", default="toy_inputs/duns_to_scrape_take_2.csv")
+    parser.add_argument("--fit", help="Fit the simulated site to this event log (e.g. toy_outputs/doover_events.jsonl) or legacy doover.log")
+    parser.add_argument("--pause-before-search", type=float, default=SimulationPolicy.pause_before_search)
+    parser.add_argument("--pause-after-search", type=float, default=SimulationPolicy.pause_after_search)
+    parser.add_argument("--max-attempts", type=int, default=RetryPolicy.max_attempts)
+    parser.add_argument("--no-circuit-breaker", action="store_true")
+    parser.add_argument("--order", choices=list(ORDERINGS), default="planned")
+    parser.add_argument("--server-error-rate", type=float, help="Override the (fitted) base server error rate")
+    parser.add_argument("--load-error-rate", type=float, default=SimulationProfile.load_error_rate)
+    parser.add_argument("--seed", type=int, default=SimulationProfile.seed)
+    args = parser.parse_args(argv)
+
+    overrides = {"load_error_rate": args.load_error_rate, "seed": args.seed}
+    if args.server_error_rate is not None:
+        overrides["server_error_rate"] = args.server_error_rate
+    if args.fit:
+        profile = fit_profile(args.fit, **overrides)
+    else:
+        profile = SimulationProfile(**overrides)
+    policy = SimulationPolicy(pause_before_search=args.pause_before_search, pause_after_search=args.pause_after_search,
+                              retry_policy=RetryPolicy(max_attempts=args.max_attempts), circuit_breaker=not args.no_circuit_breaker)
+
+    with open("toy_inputs/state_identifiers.csv", "r") as infile:
+        state_initial_map = {row["state_abbr"]: row["state_name"] for row in csv.DictReader(infile)}
+    with open(args.cases, "r") as infile:
+        cases = list(enumerate(csv.DictReader(infile)))
+    for _, case in cases:
+        if not case["clean_name_1"]:  # same as toy_doover.py
+            variants = normalize_employer_name(case["company_name"])
+            case["clean_name_1"], case["clean_name_2"] = variants["clean_name_1"], variants["clean_name_2"]
+
+    print(json.dumps(simulate_run(cases, state_initial_map, profile, policy, order=ORDERINGS[args.order]), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import csv
+from multiprocessing import Pool
+
+import lxml.html
+
+from duns_bradstreet_scraper.snapshots import SnapshotArchive
+
+
+RESULT_FIELDS = ["duns_name", "duns_address", "duns_phone", "duns_type", "company_status"]
+SNAPSHOT_FIELDS = ["company_name_search_term", "city", "state", "captured_at"]
+
+# Card field -> class of the element holding it, same as DBScraper._extract_company_info
+CARD_FIELD_CLASSES = {
+    "duns_name": "name",
+    "duns_address": "address",
+    "duns_phone": "phone",
+    "duns_type": "type",
+    "company_status": "status",
+}
+
+
+def _class_xpath(class_name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+CARD_XPATH = f"//div[{_class_xpath('search-results-card-container')}]"
+FIELD_XPATHS = {field: f".//*[{_class_xpath(class_name)}]" for field, class_name in CARD_FIELD_CLASSES.items()}
+
+
+def _element_text(elem) -> str:
+    return " ".join(elem.text_content().split())
+
+
+"""
+Rebuild DUNS result records from the HTML of a results page, without a browser
+Return: one dict per result card, with the same keys as DBScraper._extract_company_info
+"""
+def parse_results_page(html: str) -> list[dict]:
+    if not html:
+        return []
+    tree = lxml.html.fromstring(html)
+    records = []
+    for card in tree.xpath(CARD_XPATH):
+        record = {}
+        for field, field_xpath in FIELD_XPATHS.items():
+            matches = card.xpath(field_xpath)
+            record[field] = _element_text(matches[0]) if matches else ""
+        records.append(record)
+    return records
+
+
+def _parse_snapshot(snapshot: dict) -> list[dict]:
+    snapshot_fields = {
+        "company_name_search_term": snapshot["search_term"],
+        "city": snapshot["city"],
+        "state": snapshot["state"],
+        "captured_at": snapshot["captured_at"],
+    }
+    return [record | snapshot_fields for record in parse_results_page(snapshot["html"])]
+
+
+"""
+Re-extract every snapshot in an archive, parsing pages in a process pool
+Return: number of records written to output_path
+"""
+def reparse_archive(archive_path: str, output_path: str, processes: int | None = None, chunksize: int = 64) -> int:
+    num_records = 0
+    with open(output_path, "w", newline="") as outfile, Pool(processes) as pool:
+        writer = csv.DictWriter(outfile, fieldnames=RESULT_FIELDS + SNAPSHOT_FIELDS)
+        writer.writeheader()
+        for records in pool.imap(_parse_snapshot, SnapshotArchive(archive_path), chunksize=chunksize):
+            writer.writerows(records)
+            num_records += len(records)
+    return num_records
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-extract DUNS result records from a snapshot archive")
+    parser.add_argument("archive", help="Snapshot archive written by DBScraper.execute_search(snapshot_archive=...)")
+    parser.add_argument("output", help="CSV file to write records to")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    num_records = reparse_archive(args.archive, args.output, processes=args.processes)
+    print(f"Wrote {num_records} records to {args.output}")
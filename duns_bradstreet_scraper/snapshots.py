@@ -0,0 +1,130 @@
+import gzip
+import json
+import os
+import zlib
+
+import arrow
+
+
+GZIP_MAGIC = b"\x1f\x8b\x08"  # How every gzip member starts (deflate is the only compression method)
+READ_CHUNK_BYTES = 64 * 1024  # About one compressed results page
+
+
+"""
+Decompress the gzip member starting at `start`
+Return: (member's contents, offset just past it), or (None, None) if the member is damaged or runs off the end of the file
+"""
+def _read_member(infile, start: int) -> tuple[bytes | None, int | None]:
+    infile.seek(start)
+    decompressor = zlib.decompressobj(wbits=31)  # gzip header and trailer, one member
+    parts = []
+    offset = start
+    while not decompressor.eof:
+        chunk = infile.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return None, None
+        try:
+            parts.append(decompressor.decompress(chunk))
+        except zlib.error:
+            return None, None
+        offset += len(chunk)
+    return b"".join(parts), offset - len(decompressor.unused_data)
+
+
+"""
+Return: offset of the next gzip member header after `start`, or None if there isn't one
+"""
+def _find_next_member(infile, start: int) -> int | None:
+    offset = start + 1
+    infile.seek(offset)
+    tail = b""
+    while True:
+        chunk = infile.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return None
+        found = (tail + chunk).find(GZIP_MAGIC)
+        if found != -1:
+            return offset - len(tail) + found
+        tail = chunk[-(len(GZIP_MAGIC) - 1):]
+        offset += len(chunk)
+
+
+"""
+Yield (member's contents, offset just past it) for every complete gzip member in the file. A damaged member (e.g. one
+truncated by a crash, with later appends after it) is skipped by scanning ahead to the next member header
+"""
+def _iter_members(path: str):
+    with open(path, "rb") as infile:
+        start = 0
+        while start is not None:
+            contents, end = _read_member(infile, start)
+            if contents is None:
+                start = _find_next_member(infile, start)
+                continue
+            yield contents, end
+            start = end
+
+
+"""
+Append-only archive of D&B results pages
+
+Each snapshot is written as its own gzip member holding one JSON line, so appending never rewrites earlier snapshots and
+a crash can at worst truncate the last one. The first append of a run cuts a truncated last member off, and reading
+skips over any damaged member, so one bad snapshot never hides the ones after it
+"""
+class SnapshotArchive:
+    def __init__(self, path: str):
+        self.path = path
+        self._tail_checked = False
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    """
+    Truncate the archive back to the end of its last complete snapshot, if a crash left a partial one after it
+    """
+    def _truncate_partial_tail(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        complete_end = 0
+        for _, end in _iter_members(self.path):
+            complete_end = end
+        if complete_end < os.path.getsize(self.path):
+            os.truncate(self.path, complete_end)
+
+    """
+    Append one results page to the archive
+    params:
+        search_term(str): company name that was searched for
+        city(str)
+        state(str)
+        html(str): page source of the results page
+    """
+    def append(self, search_term: str, city: str, state: str, html: str) -> None:
+        snapshot = {
+            "search_term": search_term,
+            "city": city,
+            "state": state,
+            "captured_at": arrow.now().isoformat(),
+            "html": html,
+        }
+        member = gzip.compress((json.dumps(snapshot) + "\n").encode("utf-8"))
+        if not self._tail_checked:
+            self._truncate_partial_tail()
+            self._tail_checked = True
+        with open(self.path, "ab") as outfile:
+            outfile.write(member)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+    """
+    Stream snapshots in the order they were captured. Damaged snapshots (from a crash mid-append) are skipped
+    """
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            return
+        for contents, _ in _iter_members(self.path):
+            try:
+                line = contents.decode("utf-8")
+                if line.endswith("\n"):
+                    yield json.loads(line)
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                continue
@@ -0,0 +1,167 @@
+import csv
+import math
+import os
+from dataclasses import dataclass, field
+
+from duns_bradstreet_scraper.name_normalization import SEARCH_CHAR_LIMIT, _strip_name, split_dba
+from duns_bradstreet_scraper.records import iter_cases, iter_duns_results
+
+
+"""
+One name a case could be searched under, with the features the planner scores it on
+    kind: "legal" (clean_name_1, the part before any d/b/a) or "trade" (clean_name_2, the part after it)
+"""
+@dataclass
+class SearchVariant:
+    kind: str
+    term: str
+    features: dict = field(default_factory=dict)
+
+
+def _word_bucket(term: str) -> str:
+    num_words = len(term.split())
+    return str(num_words) if num_words < 4 else "4+"
+
+
+"""
+A case's search-name variants, legal name first (the order toy_doover.py has always searched them in)
+Uses the case's clean_name_1/clean_name_2 when it has them, since those are the terms earlier runs searched
+"""
+def candidate_variants(case: dict) -> list[SearchVariant]:
+    legal_part, trade_part = split_dba(case["company_name"])
+    has_dba = bool(trade_part)
+    terms = {
+        "legal": case.get("clean_name_1") or _strip_name(legal_part),
+        "trade": case.get("clean_name_2") or (_strip_name(trade_part) if has_dba else ""),
+    }
+    raw_parts = {"legal": legal_part, "trade": trade_part}
+
+    variants = []
+    for kind, term in terms.items():
+        if not term or any(variant.term == term for variant in variants):
+            continue
+        variants.append(SearchVariant(kind, term, {
+            "kind": kind,
+            "has_dba": has_dba,
+            "suffix_stripped": _strip_name(raw_parts[kind]) != raw_parts[kind].strip(),
+            "over_char_limit": len(term) > SEARCH_CHAR_LIMIT,  # D&B only matches on the first SEARCH_CHAR_LIMIT characters
+            "words": _word_bucket(term),
+        }))
+    return variants
+
+
+def _logit(p: float) -> float:
+    return math.log(p / (1 - p))
+
+
+"""
+Scores search-name variants by how often searches with the same features triggered an email
+
+Keeps (hits, searches) per feature value. A variant's expected yield combines its features' hit rates naive-Bayes style:
+each feature shifts the overall hit rate's log-odds by how much its own (smoothed) rate differs. Rates are smoothed
+toward the overall rate with `prior_strength` pseudo-searches, so rare feature values don't swing the ranking
+"""
+class VariantPlanner:
+    def __init__(self, prior_strength: float = 10.0):
+        self.prior_strength = prior_strength
+        self.hits = 0
+        self.searches = 0
+        self._feature_counts = {}  # (feature, value) -> [hits, searches]
+
+    """
+    Record one search's outcome. Call it from the scraping loop, so a run learns from its own searches too
+    """
+    def observe(self, variant: SearchVariant, hit: bool) -> None:
+        self.hits += hit
+        self.searches += 1
+        for feature in variant.features.items():
+            counts = self._feature_counts.setdefault(feature, [0, 0])
+            counts[0] += hit
+            counts[1] += 1
+
+    def fit(self, examples) -> "VariantPlanner":
+        for variant, hit in examples:
+            self.observe(variant, hit)
+        return self
+
+    def _base_rate(self) -> float:
+        return (self.hits + 1) / (self.searches + 2)
+
+    def _feature_rate(self, feature: tuple, base_rate: float) -> float:
+        hits, searches = self._feature_counts.get(feature, (0, 0))
+        return (hits + self.prior_strength * base_rate) / (searches + self.prior_strength)
+
+    """
+    Return: estimated probability that searching this variant triggers at least one email
+    """
+    def expected_yield(self, variant: SearchVariant) -> float:
+        base_rate = self._base_rate()
+        log_odds = _logit(base_rate)
+        for feature in variant.features.items():
+            log_odds += _logit(self._feature_rate(feature, base_rate)) - _logit(base_rate)
+        return 1 / (1 + math.exp(-log_odds))
+
+    """
+    A case's variants, most likely to trigger an email first. Ties keep the legal name first
+    """
+    def rank(self, case: dict) -> list[SearchVariant]:
+        variants = candidate_variants(case)
+        return sorted(variants, key=lambda variant: -self.expected_yield(variant))
+
+    """
+    Return: {feature: {value: {"hits", "searches", "hit_rate"}}}, for eyeballing what the planner has learned
+    """
+    def feature_stats(self) -> dict:
+        stats = {}
+        for (feature, value), (hits, searches) in sorted(self._feature_counts.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            stats.setdefault(feature, {})[str(value)] = {"hits": hits, "searches": searches, "hit_rate": hits / searches}
+        return stats
+
+
+"""
+Label every variant the scrape history shows was searched. A hit belongs to the search (term, city, state), not to the
+case it was logged under: cases that share a search share its results, so every case that issued it is labeled a hit
+params:
+    cases: worklist rows (duns_to_scrape). Any iterable of Case records or dicts, e.g. records.iter_cases
+    duns_log: scrape log rows, or a reconciliation output (see reconciliation.py). With a reconciliation output,
+        a hit is a result whose email actually arrived (duns_number filled in) instead of one whose request succeeded
+    already_scraped: company_name/city/state of every search run so far
+    state_initial_map(dict): state abbreviation -> state name, as already_scraped stores it
+Return: generator of (SearchVariant, hit)
+"""
+def training_examples(cases, duns_log, already_scraped, state_initial_map: dict[str, str]):
+    cases = list(cases)
+    case_locations = {case["case_number"]: (case["emp_1_city"], state_initial_map.get(case["emp_1_state"])) for case in cases}
+    hit_searches = set()  # (search term, city, state)
+    for log_entry in duns_log:
+        if "duns_number" in log_entry:  # reconciliation output
+            hit = bool(log_entry["duns_number"])
+        else:
+            hit = str(log_entry.get("email_success")).strip().lower() == "true"
+        if hit and log_entry["case_number"] in case_locations:
+            hit_searches.add((log_entry["company_name_search_term"], *case_locations[log_entry["case_number"]]))
+    searched = {(row["company_name"], row["city"], row["state"]) for row in already_scraped}
+
+    for case in cases:
+        company_city, company_state = case_locations[case["case_number"]]
+        for variant in candidate_variants(case):
+            search = (variant.term, company_city, company_state)
+            if search in searched:
+                yield variant, search in hit_searches
+
+
+def _iter_csv(path: str):
+    with open(path, "r", newline="") as infile:
+        yield from csv.DictReader(infile)
+
+
+"""
+Fit a VariantPlanner on a scrape's CSVs. Pass reconciled_path (a write_reconciliation output) to learn from emails that
+arrived rather than from email requests that looked successful. Until it's been written, the scrape log is used instead
+"""
+def load_planner(cases_path: str, duns_log_path: str, already_scraped_path: str, state_initial_map: dict[str, str],
+                 reconciled_path: str | None = None, prior_strength: float = 10.0) -> VariantPlanner:
+    use_reconciled = reconciled_path is not None and os.path.exists(reconciled_path)
+    duns_log = iter_duns_results(reconciled_path if use_reconciled else duns_log_path)
+    examples = training_examples(iter_cases(cases_path), duns_log, _iter_csv(already_scraped_path), state_initial_map)
+    return VariantPlanner(prior_strength).fit(examples)
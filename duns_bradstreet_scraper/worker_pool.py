@@ -0,0 +1,237 @@
+import collections
+import logging
+import multiprocessing
+import queue
+import time
+
+from duns_bradstreet_scraper.duns_bradstreet_scraper import DBScraper, DNBRejectionException, DNBServerException
+from duns_bradstreet_scraper.query_planner import PlannedQuery
+from duns_bradstreet_scraper.rate_limiting import TokenBucket
+from duns_bradstreet_scraper.retry_policy import classify_error
+from duns_bradstreet_scraper.search_cache import SearchCache
+from duns_bradstreet_scraper.snapshots import SnapshotArchive
+
+
+REJECTION_BACKOFF_SECONDS = 120  # how long a worker sits out after D&B blocks it outright
+
+
+"""
+Stands in for a SnapshotArchive in a worker: each results page goes back to the parent, which appends it to the real
+archive, so only one process ever writes to it
+"""
+class _QueuedSnapshotArchive:
+    def __init__(self, result_queue, task_id: int):
+        self._result_queue = result_queue
+        self._task_id = task_id
+
+    def append(self, search_term: str, city: str, state: str, html: str) -> None:
+        self._result_queue.put((self._task_id, "snapshot", (search_term, city, state, html)))
+
+
+"""
+Body of one worker process: own a DBScraper (and Chrome), run searches off its task queue until it hands us None
+
+Messages go back on the result queue as (task id, kind, payload):
+    ("snapshot", (search term, city, state, html)) for each results page, if the pool keeps snapshots
+    ("card", record) for each result card as soon as it's done
+    ("done", None) once a search has finished
+    ("error", exception) if a search failed: the DNB exception (same class) if D&B pushed back, or a RuntimeError
+        describing anything else, with the original error's ErrorKind as its `kind` (see retry_policy.classify_error)
+"""
+def _worker_main(worker_id: int, task_queue, result_queue, rate_limiter: TokenBucket, scraper_kwargs: dict, search_cache_path: str | None,
+                 keep_snapshots: bool = False) -> None:
+    logger = logging.getLogger(f"dnb_worker_{worker_id}")
+    search_cache = SearchCache(search_cache_path) if search_cache_path else None
+    try:
+        scraper = DBScraper(**scraper_kwargs, search_cache=search_cache, rate_limiter=rate_limiter)
+    except Exception as e:
+        logger.error(f"Worker {worker_id} could not start a scraper: {e!r}")
+        result_queue.put((None, "error", RuntimeError(f"worker {worker_id} failed to start: {e!r}")))
+        return
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, company_name, city, state, request_emails, request_ids = task
+        try:
+            if request_ids is not None:
+                cards = scraper.iter_email_requests(company_name=company_name, company_state=state, company_city=city, request_ids=request_ids)
+            else:
+                snapshot_archive = _QueuedSnapshotArchive(result_queue, task_id) if keep_snapshots else None
+                cards = scraper.iter_search(company_name=company_name, company_state=state, company_city=city, request_emails=request_emails,
+                                            snapshot_archive=snapshot_archive)
+            for duns_result in cards:
+                result_queue.put((task_id, "card", duns_result))
+        except DNBRejectionException as e:
+            logger.error(f"Worker {worker_id} is being blocked by DNB. Sitting out for {REJECTION_BACKOFF_SECONDS}s")
+            result_queue.put((task_id, "error", type(e)(str(e))))
+            time.sleep(REJECTION_BACKOFF_SECONDS)
+        except DNBServerException as e:  # DNBAccessDeniedException included, keeping its class
+            result_queue.put((task_id, "error", type(e)(str(e))))
+        except Exception as e:
+            # Selenium exceptions don't always survive pickling, so only send their description and kind back
+            error = RuntimeError(f"worker {worker_id}: {e!r}")
+            error.kind = classify_error(e)
+            result_queue.put((task_id, "error", error))
+        else:
+            result_queue.put((task_id, "done", None))
+
+    if search_cache is not None:
+        search_cache.close()
+
+
+"""
+N worker processes, each driving its own DBScraper. The parent hands each worker one search at a time on the worker's own
+queue, so it always knows which search a worker is in the middle of
+
+All workers draw from one TokenBucket, so their combined search rate stays under `rate` searches per second no matter
+how many there are. Results come back to the parent process, which should be the only one writing them anywhere.
+
+A worker that dies mid-search (Chrome taking the process down, the OOM killer) fails that search and is replaced, up to
+max_restarts times per pool. A worker that exits cleanly without running its search (its scraper couldn't start) is
+dropped, and the search goes to another worker
+
+params:
+    num_workers(int): worker processes (and Chrome instances) to run
+    rate(float): global ceiling on live searches per second, across all workers
+    burst(float): searches that may go out back to back after a quiet spell
+    scraper_kwargs(dict): extra DBScraper arguments. Must be picklable under the "spawn" start method
+    search_cache_path(str): if given, each worker opens a SearchCache on this SQLite file
+    snapshot_archive(SnapshotArchive): if given, every search's results page is saved to it (by the parent process)
+    start_method(str): multiprocessing start method. "spawn" re-imports the calling script, so it needs a `__main__` guard
+    max_restarts(int): workers that died mid-search to replace over the pool's lifetime
+"""
+class ScraperPool:
+    def __init__(self, num_workers: int, rate: float, burst: float = 1, scraper_kwargs: dict | None = None,
+                 search_cache_path: str | None = None, start_method: str = "fork", max_restarts: int = 3,
+                 snapshot_archive: SnapshotArchive | None = None):
+        self.num_workers = num_workers
+        self.max_restarts = max_restarts
+        self.num_restarts = 0
+        self._context = multiprocessing.get_context(start_method)
+        self.rate_limiter = TokenBucket(rate, burst, mp_context=self._context)
+        self._scraper_kwargs = scraper_kwargs or {}
+        self._search_cache_path = search_cache_path
+        self._snapshot_archive = snapshot_archive
+        self._result_queue = self._context.Queue()
+        self._workers = {}  # worker id -> (process, its task queue)
+
+    def start(self) -> None:
+        for worker_id in range(self.num_workers):
+            self._start_worker(worker_id)
+
+    def _start_worker(self, worker_id: int) -> None:
+        task_queue = self._context.Queue()  # A fresh one: a worker that died mid-get can leave its queue's lock held
+        worker = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, task_queue, self._result_queue, self.rate_limiter, self._scraper_kwargs, self._search_cache_path,
+                  self._snapshot_archive is not None),
+            daemon=True)
+        worker.start()
+        self._workers[worker_id] = (worker, task_queue)
+
+    """
+    Tell every worker to finish its current search and exit, then wait for them
+    """
+    def close(self) -> None:
+        for worker, task_queue in self._workers.values():
+            if worker.exitcode is None:
+                task_queue.put(None)
+        for worker, _ in self._workers.values():
+            worker.join()
+        self._workers = {}
+
+    def __enter__(self) -> "ScraperPool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    """
+    Run a batch of planned searches across the pool
+    params:
+        queries(list[PlannedQuery]): searches to run
+        on_card: if given, called as on_card(query, record) for each result card as soon as a worker finishes it
+        request_emails(bool): if False, only extract the cards (see DBScraper.iter_search)
+        request_ids(dict): for the email stage of a two-stage run: query key -> email_request_ids to request from its
+            results page (see DBScraper.iter_email_requests). Searches run this way only yield the requested cards
+    Return: generator of (query, duns results, error) in the order searches finish. error is None, or the exception
+        the search failed with (see _worker_main), or a RuntimeError if its worker died. A failed search's duns results
+        are the cards it finished
+    """
+    def search(self, queries: list[PlannedQuery], on_card=None, request_emails: bool = True, request_ids: dict | None = None):
+        pending = dict(enumerate(queries))
+        cards = {task_id: [] for task_id in pending}
+        undispatched = collections.deque(pending)
+        in_flight = {}  # worker id -> task id
+
+        def dispatch(worker_id: int) -> None:
+            if not undispatched:
+                return
+            task_id = undispatched.popleft()
+            query = pending[task_id]
+            query_request_ids = request_ids[query.key] if request_ids is not None else None
+            self._workers[worker_id][1].put((task_id, query.company_name, query.city, query.state, request_emails, query_request_ids))
+            in_flight[worker_id] = task_id
+
+        for worker_id in list(self._workers):
+            dispatch(worker_id)
+
+        while pending:
+            try:
+                task_id, kind, payload = self._result_queue.get(timeout=5)
+            except queue.Empty:
+                for task_id, error in self._reap_dead_workers(in_flight, undispatched):
+                    yield pending.pop(task_id), cards.pop(task_id), error
+                for worker_id in self._workers:
+                    if worker_id not in in_flight:
+                        dispatch(worker_id)
+                if not self._workers:
+                    raise RuntimeError(f"All scraper workers exited with {len(pending)} searches outstanding")
+                continue
+            if task_id is None:  # a worker that never got going. It's dropped once it has exited
+                logging.getLogger().error(str(payload))
+                continue
+            if task_id not in pending:  # from a search already failed because its worker died
+                continue
+
+            if kind == "snapshot":
+                self._snapshot_archive.append(*payload)
+                continue
+            if kind == "card":
+                cards[task_id].append(payload)
+                if on_card is not None:
+                    on_card(pending[task_id], payload)
+                continue
+            worker_id = next(worker_id for worker_id, worker_task_id in in_flight.items() if worker_task_id == task_id)
+            del in_flight[worker_id]
+            dispatch(worker_id)
+            yield pending.pop(task_id), cards.pop(task_id), payload
+
+    """
+    Drop workers that have exited, replacing the ones that died abnormally while the restart budget lasts. A search whose
+    worker exited cleanly never ran and goes back on the front of `undispatched`. One whose worker died may have sent
+    some emails, so it isn't retried
+    Return: list of (task id, error) for the searches that failed
+    """
+    def _reap_dead_workers(self, in_flight: dict[int, int], undispatched: collections.deque) -> list[tuple[int, Exception]]:
+        failed = []
+        for worker_id, (worker, _) in list(self._workers.items()):
+            if worker.exitcode is None:
+                continue
+            del self._workers[worker_id]
+            task_id = in_flight.pop(worker_id, None)
+            if worker.exitcode == 0:
+                if task_id is not None:
+                    undispatched.appendleft(task_id)
+                continue
+
+            logging.getLogger().error(f"Scraper worker {worker_id} died with exit code {worker.exitcode}")
+            if task_id is not None:
+                failed.append((task_id, RuntimeError(f"worker {worker_id} died mid-search (exit code {worker.exitcode})")))
+            if self.num_restarts < self.max_restarts:
+                self.num_restarts += 1
+                self._start_worker(worker_id)
+        return failed
@@ -9,6 +9,12 @@ setup(
   url='https://github.com/oneroyalace/duns_bradstreet_scraper',
   packages=['duns_bradstreet_scraper'],
   install_requires=[],
+  extras_require={
+    'columnar': ['pyarrow'],
+  },
+  entry_points={
+    'console_scripts': ['dnb=duns_bradstreet_scraper.cli:main'],
+  },
   classifiers=[
     'Programming Language :: Python :: 3',
     'License :: OSI Approved :: MIT License',
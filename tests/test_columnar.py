@@ -0,0 +1,34 @@
+import csv
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from duns_bradstreet_scraper import columnar  # noqa: E402
+from duns_bradstreet_scraper.records import EmailRecord  # noqa: E402
+from duns_bradstreet_scraper.reconciliation import load_records  # noqa: E402
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow"])
+def test_duns_code_keeps_leading_zeros(tmp_path, extension):
+    csv_path = tmp_path / "dnb_emails.csv"
+    with open(csv_path, "w", newline="") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(["sent_at", "company_name", "duns_code"])
+        writer.writerow(["2024-08-19T14:24:28-07:00", "Fallon Service, LLC", "025960874"])
+
+    output_path = str(tmp_path / f"emails{extension}")
+    columnar.convert_csv(str(csv_path), output_path, "emails")
+
+    assert columnar.read_records(output_path)[0]["duns_code"] == "025960874"
+    assert load_records(output_path, EmailRecord)[0]["duns_code"] == "025960874"
+
+
+def test_int_duns_numbers_are_padded(tmp_path):
+    path = str(tmp_path / "legacy.arrow")
+    table = pa.table({"duns_number": pa.array([25960874, None], type=pa.int64())})
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    assert [record["duns_number"] for record in columnar.read_records(path)] == ["025960874", None]
+    assert columnar.to_table([{"duns_number": 25960874}], columnar.RECONCILED_SCHEMA)["duns_number"].to_pylist() == ["025960874"]
@@ -0,0 +1,29 @@
+import pytest
+
+from duns_bradstreet_scraper.fuzzy_matching import FuzzyNameMatcher
+
+
+# Enough "... Services" names that the blocks they share ("services", " se", "ser", "erv", ...) get pruned
+NAMES = [f"{prefix} Services Corporation" for prefix in ["AAI", "ACM", "A.V.T.", "Able", "Apex", "Baker", "Coastal", "Delta"]] + [
+    "Fallon Service, LLC",
+    "Live Nation",
+]
+
+
+@pytest.mark.parametrize("blocking", ["token", "ngram"])
+def test_names_match_themselves_despite_pruned_blocks(blocking):
+    matcher = FuzzyNameMatcher(NAMES, threshold=0.8, blocking=blocking, max_block_size=3)
+    for name_ind, name in enumerate(NAMES):
+        assert (name_ind, 1.0) in matcher.match(name)
+
+
+@pytest.mark.parametrize("blocking", ["token", "ngram"])
+@pytest.mark.parametrize("variant, name_ind", [
+    ("ACM SERVICES INC.", 1),
+    ("avt services corp", 2),
+    ("Fallon Service LLC", 8),
+    ("FALLON SERVICE", 8),
+])
+def test_punctuation_and_suffix_variants_match(blocking, variant, name_ind):
+    matcher = FuzzyNameMatcher(NAMES, threshold=0.8, blocking=blocking, max_block_size=3)
+    assert matcher.match(variant)[0] == (name_ind, 1.0)
@@ -0,0 +1,28 @@
+from duns_bradstreet_scraper.query_planner import fan_out
+from duns_bradstreet_scraper.reconciliation import reconcile
+from duns_bradstreet_scraper.records import DunsResult, EmailRecord
+
+
+def test_cases_sharing_a_search_share_its_email():
+    card = DunsResult(duns_name="LIVE NATION", duns_address="885 S Main St,Mansfield,MA 02048-3148", email_success=True,
+                      time_email_requested="2024-11-22T10:23:32-05:00", company_name_search_term="Live Nation")
+    duns_log = fan_out([card], "01-RC-022162", False) + fan_out([card], "01-RC-022170", False)
+    emails = [EmailRecord(sent_at="2024-11-22T10:25:02-05:00", company_name="Live Nation", duns_code="025960874")]
+
+    matches, unmatched_log_inds, unmatched_email_inds = reconcile(duns_log, emails)
+
+    assert [(log_ind, email_ind) for log_ind, email_ind, _, _ in matches] == [(0, 0), (1, 0)]
+    assert unmatched_log_inds == []
+    assert unmatched_email_inds == []
+
+
+def test_separate_requests_for_one_company_need_separate_emails():
+    duns_log = [DunsResult(duns_name="LIVE NATION", duns_address="885 S Main St,Mansfield,MA 02048-3148", email_success=True,
+                           time_email_requested=requested_at, case_number=case_number)
+                for case_number, requested_at in [("01-RC-022162", "2024-11-22T10:23:32-05:00"), ("01-RC-022170", "2024-11-22T11:40:00-05:00")]]
+    emails = [EmailRecord(sent_at="2024-11-22T10:25:02-05:00", company_name="Live Nation", duns_code="025960874")]
+
+    matches, unmatched_log_inds, _ = reconcile(duns_log, emails)
+
+    assert [log_ind for log_ind, _, _, _ in matches] == [0]
+    assert unmatched_log_inds == [1]
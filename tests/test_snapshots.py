@@ -0,0 +1,38 @@
+import gzip
+import json
+import os
+
+import pytest
+
+pytest.importorskip("arrow")
+
+from duns_bradstreet_scraper.snapshots import SnapshotArchive  # noqa: E402
+
+
+def _search_terms(archive: SnapshotArchive) -> list[str]:
+    return [snapshot["search_term"] for snapshot in archive]
+
+
+def test_append_after_truncated_snapshot(tmp_path):
+    path = str(tmp_path / "results_pages.jsonl.gz")
+    archive = SnapshotArchive(path)
+    for search_term in ["Acme", "Live Nation", "Fallon Service"]:
+        archive.append(search_term, "Boston", "Massachusetts", "<html>" + search_term * 200 + "</html>")
+    complete_size = os.path.getsize(path)
+    os.truncate(path, complete_size - 40)  # Crash mid-append
+
+    archive = SnapshotArchive(path)  # The next run
+    archive.append("Medical Care Development", "Augusta", "Maine", "<html></html>")
+    archive.append("Apex", "Brockton", "Massachusetts", "<html></html>")
+
+    assert _search_terms(archive) == ["Acme", "Live Nation", "Medical Care Development", "Apex"]
+
+
+def test_damaged_snapshot_mid_archive_is_skipped(tmp_path):
+    path = str(tmp_path / "results_pages.jsonl.gz")
+    members = [gzip.compress((json.dumps({"search_term": search_term, "html": search_term * 200}) + "\n").encode("utf-8"))
+               for search_term in ["Acme", "Live Nation", "Fallon Service"]]
+    with open(path, "wb") as outfile:  # Written before appends cut damaged tails off
+        outfile.write(members[0] + members[1][:len(members[1]) // 2] + members[2])
+
+    assert _search_terms(SnapshotArchive(path)) == ["Acme", "Fallon Service"]
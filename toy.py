@@ -1,69 +1,14 @@
 import csv
 import math
 import random
-import re
 import time
 
 import pyautogui
 
 from duns_bradstreet_scraper.duns_bradstreet_scraper import DBScraper, DNBServerException
+from duns_bradstreet_scraper.name_normalization import clean_employer_name, truncate_employer_name
 
 
-def clean_employer_name(emp_name):
-    re_dba = re.compile(r"(.*)d[^a-z]?b[^a-z]?a(.*)", re.IGNORECASE)
-    if re.search(re_dba, emp_name):
-        emp_name = re_dba.search(emp_name).groups()[1]
-
-    
-
-    partitions = [re.compile(r",? inc\.?", re.IGNORECASE), # inc
-                  re.compile(r",? ?l\.?l\.?c\.?", re.IGNORECASE), # llc
-                  re.compile(r"a subsidiary", re.IGNORECASE),
-                  re.compile(r"an affiliate", re.IGNORECASE),
-                  re.compile(r"a division", re.IGNORECASE),
-                  re.compile(r" -|- ", re.IGNORECASE), # space dash or dash space
-                  re.compile(r"/", re.IGNORECASE),
-
-                  # I think DUNS shoudl be okay with "corp", "corporation", "etc.". They fuzzy search
-                  
-                  # re.compile("co\.", re.IGNORECASE),  # co. 
-                  # re.compile(r"corporation", re.IGNORECASE),  # corporation
-                  # re.compile("corp\.", re.IGNORECASE),  # corp.
-                  # re.compile(r"company", re.IGNORECASE),  # company
-                  ]
-
-    for partition_re in partitions:
-        match = partition_re.search(emp_name)
-        if match:
-            emp_name = emp_name[:match.start()]
-
-    replacements = [
-            re.compile("-TV", re.IGNORECASE),
-            re.compile("ltd", re.IGNORECASE),
-            re.compile(r"\(.*?\)")  # text in parentheses
-            ]
-
-    for replace_reg in replacements:
-        emp_name = replace_reg.sub("", emp_name)
-
-    # emp_name = emp_name.replace("&", "%26")
-
-    emp_name = emp_name.strip()
-    return emp_name
-
-def truncate_employer_name(emp_name: str, char_limit: int) -> str:
-    words = emp_name.split(" ")
-    truncated_name = ""
-
-    if len(emp_name) <= char_limit:
-        return emp_name
-
-    for word in words:
-        if (len(truncated_name) + len(word)) + 1 > char_limit:  # If adding the next word would put the name over the character limit...
-            break
-        truncated_name = " ".join([truncated_name, word])  # Add next word to name
-    return truncated_name
-
 """
 Use pyautogui to switch to a new ProtonVPN server and hopefully juke anti-scraping tech
 """
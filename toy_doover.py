@@ -1,73 +1,31 @@
 import csv
 import logging
 import math
+import multiprocessing
 import random
-import re
 import time
-from datetime import timedelta
 from enum import Enum
 
-import arrow
 # import pyautogui
 
+from duns_bradstreet_scraper.company_index import CompanyIndex
 from duns_bradstreet_scraper.duns_bradstreet_scraper import DBScraper, DNBServerException, DNBRejectionException
+from duns_bradstreet_scraper.email_requests import plan_email_searches
+from duns_bradstreet_scraper.event_log import JsonFormatter, log_event, start_queue_logging
+from duns_bradstreet_scraper.instrumentation import PhaseTimer
+from duns_bradstreet_scraper.name_normalization import normalize_employer_name
+from duns_bradstreet_scraper.network_blocking import BlockList
+from duns_bradstreet_scraper.query_planner import PlannedQuery, fan_out, plan_queries
+from duns_bradstreet_scraper.reconciliation import parse_bool
+from duns_bradstreet_scraper.records import DunsResult
+from duns_bradstreet_scraper.retry_policy import CircuitBreaker
+from duns_bradstreet_scraper.scrape_state import ScrapeStateStore
+from duns_bradstreet_scraper.search_cache import SearchCache
+from duns_bradstreet_scraper.snapshots import SnapshotArchive
+from duns_bradstreet_scraper.variant_planner import load_planner
+from duns_bradstreet_scraper.worker_pool import ScraperPool
 
 
-def clean_employer_name(emp_name):
-    re_dba = re.compile(r"(.*)d[^a-z]?b[^a-z]?a(.*)", re.IGNORECASE)
-    if re.search(re_dba, emp_name):
-        emp_name = re_dba.search(emp_name).groups()[1]
-
-    
-
-    partitions = [re.compile(r",? inc\.?", re.IGNORECASE), # inc
-                  re.compile(r",? ?l\.?l\.?c\.?", re.IGNORECASE), # llc
-                  re.compile(r"a subsidiary", re.IGNORECASE),
-                  re.compile(r"an affiliate", re.IGNORECASE),
-                  re.compile(r"a division", re.IGNORECASE),
-                  re.compile(r" -|- ", re.IGNORECASE), # space dash or dash space
-                  re.compile(r"/", re.IGNORECASE),
-
-                  # I think DUNS shoudl be okay with "corp", "corporation", "etc.". They fuzzy search
-                  
-                  # re.compile("co\.", re.IGNORECASE),  # co. 
-                  # re.compile(r"corporation", re.IGNORECASE),  # corporation
-                  # re.compile("corp\.", re.IGNORECASE),  # corp.
-                  # re.compile(r"company", re.IGNORECASE),  # company
-                  ]
-
-    for partition_re in partitions:
-        match = partition_re.search(emp_name)
-        if match:
-            emp_name = emp_name[:match.start()]
-
-    replacements = [
-            re.compile("-TV", re.IGNORECASE),
-            re.compile("ltd", re.IGNORECASE),
-            re.compile(r"\(.*?\)")  # text in parentheses
-            ]
-
-    for replace_reg in replacements:
-        emp_name = replace_reg.sub("", emp_name)
-
-    # emp_name = emp_name.replace("&", "%26")
-
-    emp_name = emp_name.strip()
-    return emp_name
-
-def truncate_employer_name(emp_name: str, char_limit: int) -> str:
-    words = emp_name.split(" ")
-    truncated_name = ""
-
-    if len(emp_name) <= char_limit:
-        return emp_name
-
-    for word in words:
-        if (len(truncated_name) + len(word)) + 1 > char_limit:  # If adding the next word would put the name over the character limit...
-            break
-        truncated_name = " ".join([truncated_name, word])  # Add next word to name
-    return truncated_name
-
 """
 Use pyautogui to switch to a new ProtonVPN server and hopefully juke anti-scraping tech
 """
@@ -103,200 +61,420 @@ def switch_focus_back_to_chrome() -> None:
     pyautogui.write("chrome")
     pyautogui.press("enter")
 
-def set_up_logger(logfile):
+"""
+Log free text to the console and one JSON event per line to `event_logfile`. Both handlers run on a background thread
+behind a queue, so logging never blocks the scraping loop. Pass a multiprocessing queue as `log_queue` if worker
+processes log too
+Return: (logger, listener). Stop the listener at the end of the run to flush the queue
+"""
+def set_up_logger(event_logfile, log_queue=None):
     # Create a custom logger
     logger = logging.getLogger("toy_do_over_log")
 
-    logger.setLevel(logging.INFO)  
+    logger.setLevel(logging.DEBUG)  
     console_handler = logging.StreamHandler()  # Handler for stdout
-    file_handler = logging.FileHandler(logfile)  # Handler for file output
+    file_handler = logging.FileHandler(event_logfile)  # Handler for file output
 
     console_handler.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(logging.DEBUG)  # per-case and per-card events are DEBUG, so they stay off the console
 
-    formatter = logging.Formatter(fmt='%(asctime)s %(levelname)s:  %(message)s', datefmt="%Y-%m-%d %H:%M:%S")
-    console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
+    console_handler.setFormatter(logging.Formatter(fmt='%(asctime)s %(levelname)s:  %(message)s', datefmt="%Y-%m-%d %H:%M:%S"))
+    file_handler.setFormatter(JsonFormatter())
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    return logger
+    listener = start_queue_logging(logger, [console_handler, file_handler], log_queue=log_queue)
+    return logger, listener
 
 
-with open("toy_inputs/duns_to_scrape_take_2.csv", "r") as infile:
-    reader = csv.DictReader(infile)
-    cases_for_scraping = [row for row in reader]
+CASES_CSV = "toy_inputs/duns_to_scrape_take_2.csv"
+DUNS_LOG_CSV = "toy_outputs/duns_log_take_2.csv"
+ALREADY_SCRAPED_CSV = "toy_outputs/already_scraped.csv"
+SEARCH_CACHE_DB = "toy_outputs/search_cache.sqlite3"
 
-with open("toy_outputs/duns_log_take_2.csv", "r") as infile:
-    reader = csv.DictReader(infile)
-    all_duns_results = [row for row in reader]
+# Every D&B record harvested so far (scrape logs, reconciled logs, D&B emails), indexed for lookup. A new search whose
+# company the index already holds in the same city, with a DUNS number, is resolved without opening D&B
+COMPANY_INDEX_DB = "toy_outputs/company_index.sqlite3"
+RECONCILED_LOG_CSV = "toy_outputs/duns_log_with_duns_numbers.csv"
+EMAILS_CSV = "dnb_emails.csv"
+INDEX_MATCH_THRESHOLD = 0.9
+
+# Two-stage runs search and extract every case first, without requesting any emails. An email stage then requests each
+# company once, however many cases' searches listed it, re-running one search per batch of companies on the same results page.
+# EMAIL_REQUESTS_CSV lists every request with the cases it serves
+TWO_STAGE_EMAILS = False
+EMAIL_REQUESTS_CSV = "toy_outputs/email_requests.csv"
+
+# With more than one worker, searches run in a ScraperPool of that many Chrome processes instead of this one.
+# SEARCH_RATE caps the pool's combined searches per second. 1/22 matches the serial loop's 20s + 2s of sleeps per search
+NUM_WORKERS = 1
+SEARCH_RATE = 1 / 22
+
+# Progress is committed to the state store after every case. The CSVs are only rewritten at the end of the run
+# (or with `state_store.export_csvs(...)`). The first run seeds the store from the CSVs
+state_store = ScrapeStateStore("toy_outputs/scrape_state.sqlite3")
+state_store.import_csvs(CASES_CSV, DUNS_LOG_CSV, ALREADY_SCRAPED_CSV)
+cases_for_scraping = [case for _, case in state_store.iter_cases()]
 
 with open("toy_inputs/state_identifiers.csv", "r") as infile:
     reader = csv.DictReader(infile)
     state_initial_map = {row["state_abbr"]: row["state_name"] for row in reader}
 
-with open("toy_outputs/already_scraped.csv") as infile:
-    reader = csv.DictReader(infile)
-    already_scraped = [(row["company_name"], row["city"], row["state"]) for row in reader]
-
-logger = set_up_logger(logfile = "toy_outputs/doover.log")
-
-scraper = DBScraper(logger=logger)
+already_scraped = state_store.searched_queries()
+
+# Summarize with `python -m duns_bradstreet_scraper.event_log toy_outputs/doover_events.jsonl`
+logger, log_listener = set_up_logger(event_logfile="toy_outputs/doover_events.jsonl",
+                                     log_queue=multiprocessing.get_context("fork").Queue() if NUM_WORKERS > 1 else None)
+
+phase_timer = PhaseTimer()
+search_cache = SearchCache(SEARCH_CACHE_DB)
+company_index = CompanyIndex(COMPANY_INDEX_DB)
+num_indexed = company_index.update(log_paths=[DUNS_LOG_CSV, RECONCILED_LOG_CSV], email_paths=[EMAILS_CSV])
+logger.info(f"Indexed {num_indexed} new D&B rows. Company index: {company_index.stats()}")
+snapshot_archive = SnapshotArchive("toy_outputs/results_pages.jsonl.gz")
+if NUM_WORKERS > 1:
+    scraper = None
+    pool = ScraperPool(NUM_WORKERS, rate=SEARCH_RATE, scraper_kwargs={"logger": logger, "blocklist": BlockList()}, search_cache_path=SEARCH_CACHE_DB,
+                       snapshot_archive=snapshot_archive)
+    pool.start()
+else:
+    scraper = DBScraper(logger=logger, phase_timer=phase_timer, search_cache=search_cache, blocklist=BlockList())
+    pool = None
 # rotate_vpn_server()
 scrapes_until_server_switch = 10
 
 class ScrapeStatus(Enum):
     SUCCESSFULLY_SCRAPED    = 1
+    NO_COMPANY_NAME         = 2
     NO_COMPANY_GEOGRAPHY    = 3
     DNB_SERVER_EXCEPTION    = 4
     MATCHES_EXISTING_SCRAPE = 5
+    RESOLVED_FROM_INDEX     = 6
+    SEARCH_FAILED           = 7  # anything else that ended a search: a browser error, a dead pool worker
+
+# Cases whose last search failed. They're searched again, with their results marked from_retry
+RETRY_STATUSES = {str(ScrapeStatus.DNB_SERVER_EXCEPTION.value), str(ScrapeStatus.SEARCH_FAILED.value)}
 
 
 """
-Toss old exceptions out of the exception buffer
+Run planned searches one at a time in this process, pausing between them the way this script always has
+Yields (query, duns results, error) like ScraperPool.search, and hands each result card to on_card as soon as it's done
+params:
+    stage(str): what the searches are for, for the progress log ("pass 1", "email stage")
+    request_ids(dict): email stage only: query key -> email_request_ids to request from its results page
 """
-def flush_exception_buffer(buffer: list[arrow.arrow.Arrow]) -> list[arrow.arrow.Arrow]:
-    ten_minutes_ago = arrow.now() - timedelta(minutes=10)
-    buffer = [e for e in buffer if e < ten_minutes_ago]
-    return buffer
-
-recent_exception_buffer = []
-# Note: Code below might search for a company multiple times. Fix that
-dnb_searches_since_last_sleep = 0
-for case_ind, case_details in enumerate(cases_for_scraping):
-    if case_details["scrape_status"] and \
-            int(case_details["scrape_status"]) in [ScrapeStatus.SUCCESSFULLY_SCRAPED.value, ScrapeStatus.NO_COMPANY_GEOGRAPHY.value, ScrapeStatus.MATCHES_EXISTING_SCRAPE]:
-        continue
-
-    case_number = case_details["case_number"]
-    company_name = case_details["company_name"]
-    company_city = case_details["emp_1_city"]
-    company_state = state_initial_map.get(case_details["emp_1_state"])
-
-    clean_name_1 = case_details["clean_name_1"]
-    clean_name_2 = case_details["clean_name_2"]
-
-    recent_exception_buffer = flush_exception_buffer(recent_exception_buffer)
-
-    # if len(recent_exception_buffer) >= 5: 
-    #     logger.debug(f"\n*****Seen 5 exceptions in the last ten minutes. Sleeping for 3 minutes. ")
-    #     time.sleep(180)
-    #     scrapes_until_server_switch = 0
-    # elif dnb_searches_since_last_sleep >= 7:
-    #     dnb_searches_since_last_sleep = 0
-    #     logger.info("\n_____Sleeping for ~45 seconds______")
-    #     time.sleep(44)
-
-    if not company_state:
-        cases_for_scraping[case_ind]["scrape_status"] = ScrapeStatus.NO_COMPANY_GEOGRAPHY.value
-        logger.debug(f"\n\n\n*****Skipping case #{case_ind+1}/{len(cases_for_scraping)} ({case_number}: {company_name})*****. No company city/state available")
-        continue
-
-    new_vpn_server = False
-
-    if scrapes_until_server_switch <= 0:
-        # rotate_vpn_server()
-        scrapes_until_server_switch = max(math.floor(random.gauss(13,5)), 3)
-        new_vpn_server = True
-
-    logger.info(f"\n\n\n*****Processing case #{case_ind+1}/{len(cases_for_scraping)} ({case_number}: {company_name})*****")
-    logger.info(f"Scrapes until server switch: {scrapes_until_server_switch}")
-
-
-    try:
-        duns_results_name_1 = []
-        duns_results_name_2 = []
-
-        logger.info("sleep 20 to check sensitivity")
-        if (clean_name_1, company_city, company_state) in already_scraped:
-            logger.info(f"Have already scapped DNB for details matching clean name 1: '{clean_name_1}' in {(company_city, company_state)}")
-            cases_for_scraping[case_ind]["scrape_status"] = ScrapeStatus.MATCHES_EXISTING_SCRAPE.value
-            continue
-        else:
+def search_serially(queries: list[PlannedQuery], stage: str, on_card, request_ids: dict | None = None):
+    global scrapes_until_server_switch, dnb_searches_since_last_sleep
+    for query_ind, query in enumerate(queries):
+        new_vpn_server = False
+        if scrapes_until_server_switch <= 0:
+            # rotate_vpn_server()
+            scrapes_until_server_switch = max(math.floor(random.gauss(13,5)), 3)
+            new_vpn_server = True
+
+        logger.info(f"\n\n\n*****Processing {stage} search #{query_ind+1}/{len(queries)} ({query.company_name}), answering {len(query.case_inds)} case(s)*****")
+        logger.info(f"Scrapes until server switch: {scrapes_until_server_switch}")
+        duns_results = []
+        try:
             time.sleep(20)
             logger.info(f"Scraping for company w/ following details:")
-            logger.info(f"Clean name (1): {clean_name_1}")
-            logger.info(f"Company city: {company_city}")
-            logger.info(f"Company state: {company_state}")
+            logger.info(f"Name: {query.company_name}")
+            logger.info(f"Company city: {query.city}")
+            logger.info(f"Company state: {query.state}")
 
             dnb_searches_since_last_sleep += 1
 
-            duns_results_name_1 = scraper.execute_search(
-                    company_name=clean_name_1,
-                    company_state=company_state,
-                    company_city=company_city,
+            if request_ids is not None:
+                cards = scraper.iter_email_requests(
+                    company_name=query.company_name,
+                    company_state=query.state,
+                    company_city=query.city,
+                    request_ids=request_ids[query.key],
                     new_vpn_server=new_vpn_server
                 )
-            already_scraped.append((clean_name_1, company_city, company_state))
+            else:
+                cards = scraper.iter_search(
+                    company_name=query.company_name,
+                    company_state=query.state,
+                    company_city=query.city,
+                    new_vpn_server=new_vpn_server,
+                    snapshot_archive=snapshot_archive,
+                    request_emails=not TWO_STAGE_EMAILS
+                )
+            for duns_result in cards:
+                duns_results.append(duns_result)
+                on_card(query, duns_result)
+        except DNBServerException as e:
+            scrapes_until_server_switch -= 15
+            yield query, duns_results, e
+            continue
+        except DNBRejectionException as e:
+            yield query, duns_results, e
+            time.sleep(120)
+            scrapes_until_server_switch = 0
+            continue
+        except Exception as e:  # e.g. a WebDriverException the scraper's retries gave up on. The caller records it as a failed search
+            logger.exception(f"Search for '{query.company_name}' failed")
+            yield query, duns_results, e
+            continue
+
+        yield query, duns_results, None
+        time.sleep(2)
+        scrapes_until_server_switch -= 1
+
+
+"""
+Emit a case_done event, which the run summarizer counts by outcome
+"""
+def log_case_done(case_ind: int, status: ScrapeStatus, num_results: int = 0) -> None:
+    case_number = cases_for_scraping[case_ind]["case_number"]
+    log_event(logger, "case_done", f"Case {case_number}: {status.name}", level=logging.DEBUG,
+              case_number=case_number, outcome=status.name, num_results=num_results)
+
 
-        if clean_name_2 and (clean_name_2, company_city, company_state) in already_scraped :
-            logger.info(f"Have already scapped DNB for details matching clean name 2: '{clean_name_2}' in {(company_city, company_state)}")
-            cases_for_scraping[case_ind]["scrape_status"] = ScrapeStatus.MATCHES_EXISTING_SCRAPE.value
+"""
+Fan a search's results out to every case that shares it, and tell the variant planner how the search went. Cases whose
+first search triggered no emails are queued in `next_pass_cases` to be searched under their other name instead
+"""
+def record_search_results(query: PlannedQuery, duns_results: list[DunsResult], search_pass: int, next_pass_cases: list) -> None:
+    search_log[query.key] = duns_results
+    # Results reused from the state store carry email_success as the string from the CSV
+    if TWO_STAGE_EMAILS:
+        hit = any(result.get("email_request_id") or parse_bool(result.get("email_success")) for result in duns_results)  # emails go out in the email stage
+    else:
+        hit = any(parse_bool(result.get("email_success")) for result in duns_results)
+    case_records = []
+    for case_ind in query.case_inds:
+        case_details = cases_for_scraping[case_ind]
+        variant_planner.observe(search_order[case_ind][search_pass], hit)
+        if not hit and search_pass + 1 < len(search_order[case_ind]):
+            first_search_results[case_ind] = duns_results
+            next_pass_cases.append((case_ind, case_details))
             continue
-        if clean_name_2 and (clean_name_2, company_city, company_state) not in already_scraped :
-            if not any([result["email_success"] for result in duns_results_name_1]):
-                logger.info(f"Scraping for company w/ following details:")
-                logger.info(f"Clean name (2): {clean_name_2}")
-                logger.info(f"Company city: {company_city}")
-                logger.info(f"Company state: {company_state}")
-
-                dnb_searches_since_last_sleep += 1
-
-                duns_results_name_2 = scraper.execute_search(
-                        company_name=clean_name_2,
-                        company_state=company_state,
-                        company_city=company_city,
-                        new_vpn_server=new_vpn_server
-                )
-                already_scraped.append((clean_name_2, company_city, company_state))
-
-    except DNBServerException:
-        logging.error("DNB Server error!!!!!!")
-        cases_for_scraping[case_ind]["scrape_status"] = ScrapeStatus.DNB_SERVER_EXCEPTION.value
-        recent_exception_buffer.append(arrow.now())
-        scrapes_until_server_switch -= 15 
-        continue
-    except DNBRejectionException:
-        logging.error("DNB is totally blocking access. Sleeping for 2 minutes, then switching VPN servers")
-        cases_for_scraping[case_ind]["scrape_status"] = ScrapeStatus.DNB_SERVER_EXCEPTION.value
-        time.sleep(120)
-        scrapes_until_server_switch = 0
-        continue
 
+        case_results = duns_results or first_search_results.get(case_ind, [])  # If a second search came up empty, keep the first search's results
+        from_retry = str(case_details["scrape_status"]) in RETRY_STATUSES
+        # A search that answers one case can tag its records directly instead of copying them
+        case_results = fan_out(case_results, case_details["case_number"], from_retry, in_place=len(query.case_inds) == 1 and bool(duns_results))
+
+        # Mark election as scraped
+        cases_for_scraping[case_ind]["scrape_status"] = ScrapeStatus.SUCCESSFULLY_SCRAPED.value
+        case_records.append((case_ind, ScrapeStatus.SUCCESSFULLY_SCRAPED.value, case_results))
+        log_case_done(case_ind, ScrapeStatus.SUCCESSFULLY_SCRAPED, num_results=len(case_results))
+
+    # One transaction for every case, which also drops the search's per-card records
+    state_store.record_cases(case_records, searched_queries=[query.key], finished_search=query.key)
+
+
+"""
+Resolve a query's cases from the company index instead of searching D&B. Only a DUNS-numbered record whose name scores
+at least INDEX_MATCH_THRESHOLD in the case's own city counts. Its DUNS number goes in the log's duns_number_from_index column
+Return: whether the cases were resolved
+"""
+def resolve_from_index(query: PlannedQuery) -> bool:
+    company_state = cases_for_scraping[query.case_inds[0]]["emp_1_state"]
+    matches = company_index.lookup(query.company_name, query.city, company_state, limit=1)
+    if not matches or matches[0]["score"] < INDEX_MATCH_THRESHOLD or matches[0]["duns_number"] is None:
+        return False
+
+    match = matches[0]
+    logger.info(f"Resolved '{query.company_name}' in {(query.city, query.state)} from the company index: {match['name']} ({match['duns_number']})")
+    index_result = DunsResult(duns_name=match["name"], duns_address=match["address"], duns_phone=match["phone"], duns_type=match["company_type"],
+                              company_status=match["company_status"], email_success=False, company_name_search_term=query.company_name,
+                              extra={"duns_number_from_index": match["duns_number"]})
+    case_records = []
+    for case_ind in query.case_inds:
+        case_details = cases_for_scraping[case_ind]
+        from_retry = str(case_details["scrape_status"]) in RETRY_STATUSES
+        case_results = fan_out([index_result], case_details["case_number"], from_retry)
+        cases_for_scraping[case_ind]["scrape_status"] = ScrapeStatus.RESOLVED_FROM_INDEX.value
+        case_records.append((case_ind, ScrapeStatus.RESOLVED_FROM_INDEX.value, case_results))
+        log_case_done(case_ind, ScrapeStatus.RESOLVED_FROM_INDEX, num_results=1)
+    state_store.record_cases(case_records)
+    return True
+
+
+"""
+Results that earlier searches logged, keyed by search (company_name_search_term, city, state). The log doesn't record a
+result's city and state, so they come from the case it was logged under. Cases that shared a search each logged a copy
+of its results, so only the first such case's copy is kept
+"""
+def logged_search_results() -> dict[tuple[str, str, str], list[DunsResult]]:
+    case_locations = {case["case_number"]: (case["emp_1_city"], state_initial_map.get(case["emp_1_state"])) for case in cases_for_scraping}
+    results = {}
+    logged_under = {}  # search -> case number whose copy is kept
+    for duns_result in state_store.iter_duns_results():
+        location = case_locations.get(duns_result.case_number)
+        if location is None:
+            continue
+        search = (duns_result.company_name_search_term, *location)
+        if logged_under.setdefault(search, duns_result.case_number) == duns_result.case_number:
+            results.setdefault(search, []).append(duns_result)
+    return results
+
+
+"""
+Commit a result card the moment it's done, so a crash mid-search loses at most the card in flight
+"""
+def persist_card(query: PlannedQuery, duns_result: DunsResult) -> None:
+    if "card_error" in duns_result:
+        logger.warning(f"Result #{duns_result['result_index']+1} for '{query.company_name}' failed: {duns_result['card_error']}")
+    state_store.record_search_card(query.key, duns_result)
+
+
+# Pauses searching when most recent searches end in DNB server errors, instead of burning through the worklist
+circuit_breaker = CircuitBreaker(window_seconds=600, failure_rate=0.5, min_searches=4, cooldown_seconds=180)
+dnb_searches_since_last_sleep = 0
 
 
-    duns_results = duns_results_name_2 or duns_results_name_1  # If we made a second search, use its results. Else use first search's. 
-    # Add NLRB election case number
-    duns_results = [result | {"case_number": case_number} for result in duns_results]
+"""
+Log a failed search and count it against the circuit breaker, pausing searches if it trips. Failures that aren't D&B
+pushing back (browser errors, a pool worker dying) count too, so a run that keeps failing pauses instead of grinding on
+"""
+def handle_search_error(error: Exception) -> None:
+    if isinstance(error, DNBRejectionException):
+        logging.error("DNB is totally blocking access. Sleeping for 2 minutes, then switching VPN servers")
+    elif isinstance(error, DNBServerException):
+        logging.error(f"DNB Server error!!!!!! ({type(error).__name__})")
+    else:
+        logging.error(f"Search failed: {error!r}")
+
+    circuit_breaker.record_failure()
+    if circuit_breaker.is_open():
+        resume_in = circuit_breaker.seconds_until_resume()
+        logger.warning(f"Too many recent DNB server errors. Pausing searches for {resume_in:.0f}s")
+        if pool is not None:
+            pool.rate_limiter.pause(resume_in)
+        else:
+            circuit_breaker.wait_until_closed()
+
 
-    if cases_for_scraping[case_ind]["scrape_status"] == ScrapeStatus.DNB_SERVER_EXCEPTION.value:
-        duns_results = [ result | {"from_retry": True} for result in duns_results]
+"""
+Email stage of a two-stage run: request every email the searches found and the email stage hasn't tried yet (including
+ones a crashed run left behind), one request per company, each from one re-run of a search that lists it
+"""
+def request_pending_emails() -> None:
+    email_searches = plan_email_searches(state_store.pending_email_requests())
+    queries = [PlannedQuery(*search) for search, _ in email_searches]
+    request_ids = {search: {request.request_id for request in requests} for search, requests in email_searches}
+    num_cases = len({case_number for _, requests in email_searches for request in requests for case_number in request.case_numbers})
+    logger.info(f"Email stage: {sum(map(len, request_ids.values()))} companies to request for {num_cases} cases, from {len(queries)} searches")
+
+    def record_email(query: PlannedQuery, duns_result: DunsResult) -> None:
+        if "card_error" in duns_result:
+            logger.warning(f"Email request for '{duns_result.get('duns_name')}' failed: {duns_result['card_error']}")
+        state_store.record_email_outcome(duns_result.email_request_id, duns_result.email_success, duns_result.time_email_requested)
+
+    if pool is not None:
+        searches = pool.search(queries, on_card=record_email, request_ids=request_ids)
     else:
-        duns_results = [ result | {"from_retry": False} for result in duns_results]
+        searches = search_serially(queries, "email stage", on_card=record_email, request_ids=request_ids)
+    for query, duns_results, error in searches:
+        if error is not None:
+            handle_search_error(error)  # Its unrequested companies stay pending for the next run
+            continue
+        circuit_breaker.record_success()
+        for request_id in request_ids[query.key] - {duns_result.email_request_id for duns_result in duns_results}:
+            logger.warning(f"Email request {request_id} wasn't on the results page for '{query.company_name}' anymore")
+            state_store.record_email_outcome(request_id, False)
+
+
+unfinished_searches = state_store.unfinished_search_cards()
+if unfinished_searches:
+    logger.warning(f"{sum(map(len, unfinished_searches.values()))} result cards from {len(unfinished_searches)} searches that never finished "
+                   "are in the state store (state_store.unfinished_search_cards()). Their emails may have gone out")
+
+# Earlier runs left MATCHES_EXISTING_SCRAPE cases without results. They stay pending, and get the results logged for
+# their search below
+done_statuses = [ScrapeStatus.SUCCESSFULLY_SCRAPED.value, ScrapeStatus.NO_COMPANY_NAME.value, ScrapeStatus.NO_COMPANY_GEOGRAPHY.value,
+                 ScrapeStatus.RESOLVED_FROM_INDEX.value]
+pending_cases = [(case_ind, case) for case_ind, case in enumerate(cases_for_scraping)
+                 if not (case["scrape_status"] and int(case["scrape_status"]) in done_statuses)]
+for _, case in pending_cases:
+    if not case["clean_name_1"]:  # Rows added to the worklist without cleaned names
+        variants = normalize_employer_name(case["company_name"])
+        case["clean_name_1"], case["clean_name_2"] = variants["clean_name_1"], variants["clean_name_2"]
+
+# Search each case under the name (legal or d/b/a trade name) that has triggered emails most often in earlier scrapes,
+# then under its other name if the first search triggered none. The planner keeps learning from this run's searches
+variant_planner = load_planner(CASES_CSV, DUNS_LOG_CSV, ALREADY_SCRAPED_CSV, state_initial_map, reconciled_path=RECONCILED_LOG_CSV)
+search_order = {case_ind: variant_planner.rank(case) for case_ind, case in pending_cases}
+logger.info(f"Searching {sum(order[0].kind == 'trade' for order in search_order.values() if order)} cases by trade name first")
+first_search_results = {}  # case index -> first search's results, for cases that go on to a second search
+search_log = {}  # search -> its results: this run's searches, plus logged_search_results() once a search needs them
+search_log_loaded = False
+
+for search_pass in range(2):
+    pass_cases = [(case_ind, case | {"search_term": search_order[case_ind][search_pass].term if search_order[case_ind] else ""})
+                  for case_ind, case in pending_cases]
+    queries, unsearchable = plan_queries(pass_cases, "search_term", state_initial_map)
+    logger.info(f"Planned {len(queries)} pass {search_pass+1} searches for {len(pending_cases)} cases")
+    for case_ind in unsearchable:
+        case_details = cases_for_scraping[case_ind]
+        if state_initial_map.get(case_details["emp_1_state"]):
+            status = ScrapeStatus.NO_COMPANY_NAME
+        else:
+            status = ScrapeStatus.NO_COMPANY_GEOGRAPHY
+        cases_for_scraping[case_ind]["scrape_status"] = status.value
+        state_store.record_case(case_ind, status.value)
+        log_case_done(case_ind, status)
+        logger.debug(f"Skipping case #{case_ind+1}/{len(cases_for_scraping)} ({case_details['case_number']}: {case_details['company_name']}). {status.name}")
+
+    next_pass_cases = []
+    queries_to_search = []
+    for query in queries:
+        if query.key not in already_scraped:
+            if not resolve_from_index(query):
+                queries_to_search.append(query)
+            continue
 
-    # Mark election as scraped
-    cases_for_scraping[case_ind]["scrape_status"] = ScrapeStatus.SUCCESSFULLY_SCRAPED.value
+        # Searched on an earlier run. Reuse its results from the search cache, or else from the results logged for it.
+        # A search that isn't in the log found nothing
+        duns_results = search_cache.get(*query.key, emails_requested=not TWO_STAGE_EMAILS)
+        if duns_results is None:
+            logger.info(f"Have already scraped DNB for '{query.company_name}' in {(query.city, query.state)}. Reusing its logged results")
+            if query.key not in search_log and not search_log_loaded:
+                search_log = logged_search_results() | search_log
+                search_log_loaded = True
+            duns_results = search_log.get(query.key, [])
+        duns_results = [DunsResult.from_dict(duns_result) for duns_result in duns_results]
+        for duns_result in duns_results:
+            duns_result.company_name_search_term = query.company_name
+        record_search_results(query, duns_results, search_pass, next_pass_cases)
+
+    # Only this process writes to the state store, whichever way the searches run
+    if pool is not None:
+        searches = pool.search(queries_to_search, on_card=persist_card, request_emails=not TWO_STAGE_EMAILS)
+    else:
+        searches = search_serially(queries_to_search, f"pass {search_pass+1}", on_card=persist_card)
+    for query, duns_results, error in searches:
+        if error is not None:
+            if isinstance(error, (DNBRejectionException, DNBServerException)):
+                status = ScrapeStatus.DNB_SERVER_EXCEPTION
+            else:
+                status = ScrapeStatus.SEARCH_FAILED
+            for case_ind in query.case_inds:
+                cases_for_scraping[case_ind]["scrape_status"] = status.value
+                state_store.record_case(case_ind, status.value)
+                log_case_done(case_ind, status)
+            handle_search_error(error)
+            continue
 
-    time.sleep(2)
-    scrapes_until_server_switch -= 1
+        circuit_breaker.record_success()
+        already_scraped.add(query.key)
+        record_search_results(query, duns_results, search_pass, next_pass_cases)
 
-    all_duns_results.extend(duns_results)
+    pending_cases = next_pass_cases
 
-    # if case_ind % 5 == 1:
-    logger.info("((((((((Saving progress to disk))))))")
-    with open("toy_outputs/duns_log_take_2.csv", "w+", newline="") as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=all_duns_results[0].keys())
-        writer.writeheader()
-        writer.writerows(all_duns_results)
+if TWO_STAGE_EMAILS:
+    request_pending_emails()
 
-    with open("toy_inputs/duns_to_scrape_take_2.csv", "w+", newline="") as outfile:
-        writer = csv.DictWriter(outfile, fieldnames = cases_for_scraping[0].keys())
-        writer.writeheader()
-        writer.writerows(cases_for_scraping)
+if pool is not None:
+    pool.close()
 
-    already_scraped_rows = [{"company_name": row[0], "city": row[1], "state": row[2]} for row in already_scraped]
-    with open("toy_outputs/already_scraped.csv", "w+", newline="") as outfile:
-        writer = csv.DictWriter(outfile, fieldnames = already_scraped_rows[0].keys())
-        writer.writeheader()
-        writer.writerows(already_scraped_rows)
+logger.info("((((((((Saving progress to disk))))))")
+state_store.export_csvs(CASES_CSV, DUNS_LOG_CSV, ALREADY_SCRAPED_CSV, email_requests_path=EMAIL_REQUESTS_CSV if TWO_STAGE_EMAILS else None)
 
+phase_timer.dump_jsonl("toy_outputs/phase_timings.jsonl")
+logger.info("Search phase timings:\n" + phase_timer.summary_table())
+logger.info(f"Search cache: {search_cache.stats()}")
+company_index.close()
+log_listener.stop()